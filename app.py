@@ -3,15 +3,34 @@ EduPortal - Main Flask Application
 Educational Management System Backend
 """
 
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
+from flask import Flask, Response, request, jsonify, render_template, session, redirect, url_for, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+import csv
+import heapq
+import io
 import os
+import re
 import time
 from datetime import datetime, timedelta
 from config import *
 from utils import *
 from logger import Logger
+from locks import lock_manager, LockTimeout
+from passwords import password_hasher, PasswordHasherBusy
+from sessions import get_session_store
+from login_state import login_state
+from repository import get_repository, backup_storage
+from registrations import (
+    get_registration_store, EventCountPublisher, encode_registration_cursor, decode_registration_cursor,
+    REGISTERED, WAITLISTED, DUPLICATE
+)
+from indexes import (
+    UserIndex, ListIndex, SearchIndex, DateIndex, IntervalIndex, TimetableTodayView, sweep_overlaps,
+    encode_list_cursor, decode_list_cursor
+)
+from timetable_import import read_import_rows, normalize_timetable_row
+from timetable_generator import timetable_generator, parse_problem
 
 # Import generate_username
 from utils import generate_username
@@ -20,25 +39,150 @@ app = Flask(__name__, template_folder=TEMPLATES_DIR, static_folder=STATIC_DIR)
 app.secret_key = os.urandom(32)  # Change in production
 CORS(app, supports_credentials=True)
 
-# In-memory session storage (in production, use Redis or database)
-active_sessions = {}
+# Login sessions (store selected by SESSION_STORE in config.py)
+session_store = get_session_store()
+
+# Entity repositories (backend selected by STORAGE_BACKEND in config.py)
+users_repo = get_repository('users')
+academics_repo = get_repository('academics')
+students_repo = get_repository('students')
+events_repo = get_repository('events')
+events_archive_repo = get_repository('events_archive')
+timetable_repo = get_repository('timetable')
+
+# Event sign-ups and waitlists, stored apart from events; the counts are
+# copied onto the event records for listing
+registration_store = get_registration_store()
+registration_counts = EventCountPublisher(registration_store, events_repo)
+
+# Username / id / role lookups over users_repo
+user_index = UserIndex(users_repo)
+
+# Filter/sort indexes behind the paged list endpoints
+users_list_index = ListIndex(
+    users_repo,
+    filters={'role': 'role', 'status': 'status', 'profile_completed': lambda key, user: bool(user.get('profile_completed'))},
+    sorts={'username': lambda key, user: key, 'role': 'role', 'status': 'status', 'created_at': 'created_at'}
+)
+academics_list_index = ListIndex(
+    academics_repo,
+    filters={'status': lambda key, acad: acad.get('status', 'active'), 'department': 'department'},
+    sorts={'name': 'name', 'department': 'department', 'created_at': 'created_at'}
+)
+students_list_index = ListIndex(
+    students_repo,
+    filters={'status': lambda key, stu: stu.get('status', 'active'), 'section': 'section'},
+    sorts={'student_name': 'student_name', 'section': 'section', 'created_at': 'created_at'}
+)
+events_list_index = ListIndex(
+    events_repo,
+    filters={'status': lambda key, evt: evt.get('status', 'active')},
+    sorts={'date': 'date', 'title': 'title', 'created_at': 'created_at'}
+)
+
+# Events by (date, time) behind /api/events/range, for the hot set and the
+# archive of past events
+events_calendar = DateIndex(events_repo, then='time')
+archived_events_calendar = DateIndex(events_archive_repo, then='time')
+
+# Dimensions a class can clash in: its section, its faculty member and its
+# (building, classroom); entries without a faculty or room skip that check
+TIMETABLE_CLASH_DIMENSIONS = ('section', 'faculty', 'room')
+
+def timetable_clash_groups(entry):
+    """{dimension: group} for a timetable entry, None where it has no group"""
+    day = entry.get('day')
+    faculty = (entry.get('faculty_name') or '').strip().lower()
+    room = (entry.get('classroom') or '').strip().lower()
+    return {
+        'section': (day, (entry.get('section') or '').strip().upper()),
+        'faculty': (day, faculty) if faculty else None,
+        'room': (day, (entry.get('building') or '').strip().lower(), room) if room else None
+    }
+
+# Class times in minutes per day and clash dimension
+timetable_intervals = IntervalIndex(
+    timetable_repo,
+    groups={name: (lambda key, entry, name=name: timetable_clash_groups(entry)[name]) for name in TIMETABLE_CLASH_DIMENSIONS},
+    interval=lambda key, entry: (time_to_minutes(entry.get('start_time')), time_to_minutes(entry.get('end_time'))),
+    display=lambda key, entry: {
+        'id': key,
+        'class_name': entry.get('class_name', 'Unknown'),
+        'day': entry.get('day'),
+        'section': entry.get('section'),
+        'faculty_name': entry.get('faculty_name'),
+        'classroom': entry.get('classroom'),
+        'building': entry.get('building'),
+        'time': f"{entry.get('start_time_12', entry.get('start_time'))} - {entry.get('end_time_12', entry.get('end_time'))}"
+    }
+)
+
+# The week as listed: today's finished classes hidden at read time
+timetable_view = TimetableTodayView(timetable_repo)
+
+# Typeahead search indexes behind /api/search; deleted (inactive) students
+# and academics are left out
+search_indexes = {
+    'students': SearchIndex(
+        students_repo,
+        fields={'student_name': 2, 'login_id': 1.5, 'registration_id': 1},
+        display=lambda key, stu: {'title': stu.get('student_name'), 'subtitle': f"{stu.get('login_id') or ''} · Section {stu.get('section') or '-'}"},
+        include=lambda key, stu: stu.get('status', 'active') != 'inactive'
+    ),
+    'academics': SearchIndex(
+        academics_repo,
+        fields={'name': 2, 'department': 1, 'registration_id': 1},
+        display=lambda key, acad: {'title': acad.get('name'), 'subtitle': acad.get('department') or ''},
+        include=lambda key, acad: acad.get('status', 'active') != 'inactive'
+    ),
+    'users': SearchIndex(
+        users_repo,
+        fields={(lambda key, user: key): 2, 'registration_id': 1},
+        display=lambda key, user: {'title': key, 'subtitle': f"{user.get('role')} · {user.get('status', 'active')}"}
+    ),
+    'events': SearchIndex(
+        events_repo,
+        fields={'title': 2, 'club_name': 1.5, 'venue': 1},
+        display=lambda key, evt: {'title': evt.get('title'), 'subtitle': f"{evt.get('club_name') or ''} · {evt.get('date') or ''}"}
+    )
+}
+
+# Which search_indexes each role may query
+SEARCH_TYPES_BY_ROLE = {
+    'Admin': ('students', 'academics', 'users', 'events'),
+    'Faculty': ('students', 'academics', 'events'),
+    'Student': ('academics', 'events')
+}
 
 ALLOWED_PHOTO_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_PHOTO_SIZE_MB = 5
 MAX_PHOTO_SIZE_BYTES = MAX_PHOTO_SIZE_MB * 1024 * 1024
 
 
-def resolve_username_key(users, username):
-    """Return the exact key for a username (case-insensitive)."""
-    if not username:
-        return None
-    if username in users:
-        return username
-    lower = username.lower()
-    for key in users.keys():
-        if key.lower() == lower:
-            return key
-    return None
+def list_page(index, default_sort, range_field):
+    """Resolve request.args into one page of keys from a ListIndex.
+
+    Query params: page_size and cursor (from next_cursor), sort (prefix
+    '-' for descending), any of the index's filters, and date_from/date_to
+    (inclusive, on range_field). Without page_size or cursor every match is
+    returned. Returns (keys, {'total', 'next_cursor'}); raises ValueError
+    for an unknown sort or a bad cursor.
+    """
+    sort = request.args.get('sort') or default_sort
+    sort_name = sort.lstrip('-')
+    if sort_name not in index.sorts:
+        raise ValueError(f"Invalid sort '{sort_name}'")
+    page_size = None
+    if 'page_size' in request.args or 'cursor' in request.args:
+        page_size = max(1, min(request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor')
+    after = decode_list_cursor(cursor, sort) if cursor else None
+    filters = {name: request.args[name] for name in index.filters if request.args.get(name)}
+    ranges = {}
+    if request.args.get('date_from') or request.args.get('date_to'):
+        ranges[range_field] = (request.args.get('date_from'), request.args.get('date_to'))
+    keys, total, last = index.query(filters, ranges, sort_name, sort.startswith('-'), after, page_size)
+    return keys, {'total': total, 'next_cursor': encode_list_cursor(sort, last) if last else None}
 
 
 def get_profile_photo_url(user_record):
@@ -69,10 +213,10 @@ def allowed_photo(filename):
 # Initialize default admin user
 def initialize_default_admin():
     """Create default admin user if not exists"""
-    users = load_json(USERS_FILE)
+    admin = users_repo.get('ADMIN')
     # Always ensure ADMIN user exists and has default password (useful to reset to DEFAULT_ADMIN_PASSWORD)
-    if 'ADMIN' not in users:
-        users['ADMIN'] = {
+    if admin is None:
+        users_repo.put('ADMIN', {
             "id": "ADMIN",
             "username": "ADMIN",
             "password": hash_password(DEFAULT_ADMIN_PASSWORD),
@@ -92,33 +236,24 @@ def initialize_default_admin():
             },
             "created_at": get_current_timestamp(),
             "updated_at": get_current_timestamp(),
-            "last_login": None,
-            "login_count": 0,
-            "failed_login_attempts": 0,
-            "account_locked": False,
-            "locked_until": None
-            ,"password_encrypted": encrypt_password(DEFAULT_ADMIN_PASSWORD),
+            "password_encrypted": encrypt_password(DEFAULT_ADMIN_PASSWORD),
             "password_plain": DEFAULT_ADMIN_PASSWORD
-        }
-        save_json(USERS_FILE, users)
+        })
     else:
         # If ADMIN exists but password isn't the configured default, update it so admin password matches DEFAULT_ADMIN_PASSWORD
         try:
-            expected = hash_password(DEFAULT_ADMIN_PASSWORD)
-            if users.get('ADMIN', {}).get('password') != expected:
-                users['ADMIN']['password'] = expected
-                users['ADMIN']['password_changed'] = False
+            if not verify_password(DEFAULT_ADMIN_PASSWORD, admin.get('password')):
+                admin['password'] = hash_password(DEFAULT_ADMIN_PASSWORD)
+                admin['password_changed'] = False
                 # Update encrypted copy as well
                 try:
-                    users['ADMIN']['password_encrypted'] = encrypt_password(DEFAULT_ADMIN_PASSWORD)
+                    admin['password_encrypted'] = encrypt_password(DEFAULT_ADMIN_PASSWORD)
                 except Exception:
                     pass
-                users['ADMIN']['updated_at'] = get_current_timestamp()
-                users['ADMIN']['account_locked'] = False
-                users['ADMIN']['failed_login_attempts'] = 0
-                users['ADMIN']['locked_until'] = None
-                users['ADMIN']['password_plain'] = DEFAULT_ADMIN_PASSWORD
-                save_json(USERS_FILE, users)
+                admin['updated_at'] = get_current_timestamp()
+                admin['password_plain'] = DEFAULT_ADMIN_PASSWORD
+                users_repo.put('ADMIN', admin)
+                login_state.reset('ADMIN')
         except Exception:
             # If anything goes wrong, don't crash initialization
             pass
@@ -126,63 +261,77 @@ def initialize_default_admin():
 # Initialize timetable structure
 def initialize_timetable():
     """Initialize timetable structure if not exists"""
-    timetable = load_json(TIMETABLE_FILE)
-    if not timetable:
-        timetable = {
-            "Monday": [],
-            "Tuesday": [],
-            "Wednesday": [],
-            "Thursday": [],
-            "Friday": [],
-            "Saturday": []
-        }
-        save_json(TIMETABLE_FILE, timetable)
-    return timetable
+    if not timetable_repo.count():
+        timetable_repo.replace_all({})
+    return timetable_repo.week()
+
+# Move registrations embedded in older event records into registration_store
+def sync_event_registrations():
+    """Import embedded registrations lists, drop them from the event
+    records and bring every event's materialized counts up to date"""
+    for evt_id, event in events_repo.all().items():
+        if event.get('registrations'):
+            registration_store.import_event(evt_id, event['registrations'])
+    with events_repo.transaction():
+        events = events_repo.all()
+        counts = registration_store.counts(events)
+        changed = {}
+        for evt_id, event in events.items():
+            registered, waitlisted = counts[evt_id]
+            if 'registrations' in event or event.get('registered_count') != registered or event.get('waitlisted_count') != waitlisted:
+                event = {key: value for key, value in event.items() if key != 'registrations'}
+                event['registered_count'] = registered
+                event['waitlisted_count'] = waitlisted
+                changed[evt_id] = event
+        if changed:
+            events_repo.put_many(changed)
+
+def event_archive_cutoff():
+    """Events dated before this YYYY-MM-DD belong in events_archive_repo"""
+    return (datetime.now() - timedelta(days=EVENT_ARCHIVE_AFTER_DAYS)).strftime('%Y-%m-%d')
+
+# Keep past events out of the hot set; cheap to call (two bisects) when
+# nothing is due
+def archive_past_events():
+    """Move events dated before event_archive_cutoff() from events_repo to
+    events_archive_repo; returns how many moved"""
+    cutoff = event_archive_cutoff()
+    # The calendar is read before taking the locks; re-checking the dates
+    # under them skips events moved to a later date meanwhile
+    keys = events_calendar.keys_before(cutoff)
+    if not keys:
+        return 0
+    with events_repo.transaction(), events_archive_repo.transaction():
+        due = events_repo.get_many(keys)
+        events = {evt_id: thaw(event) for evt_id, event in due.items() if (event.get('date') or '') < cutoff}
+        if events:
+            events_archive_repo.put_many(events)
+            events_repo.delete_many(list(events))
+    if events:
+        Logger.log_activity('SYSTEM', 'EVENTS_ARCHIVED', 'Event', None, f'{len(events)} past events archived', 'success')
+    return len(events)
 
 # Initialize data files
+login_state.seed_from_users(users_repo.all())
+sync_event_registrations()
+archive_past_events()
 initialize_default_admin()
 initialize_timetable()
 
 # Session management helpers
 def create_session(username, role):
     """Create new session"""
-    token = generate_session_token()
-    now = datetime.now()
-    active_sessions[token] = {
-        'username': username,
-        'role': role,
-        'created_at': now,
-        'last_activity': now,
-        'expires_at': now + timedelta(seconds=SESSION_TIMEOUT_SECONDS)
-    }
-    return token
+    return session_store.create(username, role)
 
 def validate_session(token):
-    """Validate session token"""
-    if token not in active_sessions:
-        return None
-    
-    session_data = active_sessions[token]
-    now = datetime.now()
-    expires_at = session_data.get('expires_at')
-    if not expires_at:
-        created_at = session_data.get('created_at', now)
-        expires_at = created_at + timedelta(seconds=SESSION_TIMEOUT_SECONDS)
-        session_data['expires_at'] = expires_at
-    
-    # Check if session expired
-    if now > expires_at:
-        del active_sessions[token]
+    """Validate session token (None if unknown or expired)"""
+    if not token:
         return None
-    
-    # Update last activity
-    session_data['last_activity'] = now
-    return session_data
+    return session_store.get(token)
 
 def destroy_session(token):
     """Destroy session"""
-    if token in active_sessions:
-        del active_sessions[token]
+    session_store.destroy(token)
 
 def require_auth(f):
     """Decorator to require authentication"""
@@ -266,21 +415,17 @@ def login():
     if not username or not password:
         return jsonify({'success': False, 'message': 'Username and password are required'}), 400
     
-    users = load_json(USERS_FILE)
-
-    user_key = resolve_username_key(users, username)
+    user_key = user_index.resolve(username)
 
     if not user_key:
         # Don't log login attempts
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
-    user = users[user_key]
+    user = users_repo.get(user_key)
     
     # Check if account is locked
-    if user.get('account_locked') and user.get('locked_until'):
-        locked_until = datetime.strptime(user['locked_until'], "%Y-%m-%dT%H:%M:%SZ")
-        if datetime.now() < locked_until:
-            return jsonify({'success': False, 'message': 'Account is locked. Please try again later.'}), 403
+    if login_state.is_locked(user_key):
+        return jsonify({'success': False, 'message': 'Account is locked. Please try again later.'}), 403
     
     # Check status
     if user.get('status') != 'active':
@@ -290,40 +435,40 @@ def login():
     
     # Verify password
     if not verify_password(password, user['password']):
-        # Increment failed attempts
-        user['failed_login_attempts'] = user.get('failed_login_attempts', 0) + 1
-        
-        if user['failed_login_attempts'] >= MAX_LOGIN_ATTEMPTS:
-            user['account_locked'] = True
-            user['locked_until'] = (datetime.now() + timedelta(minutes=LOCKOUT_DURATION_MINUTES)).strftime("%Y-%m-%dT%H:%M:%SZ")
-            # Don't log login attempts
-            # Logger.log_activity(username, 'ACCOUNT_LOCKED', description='Account locked due to multiple failed login attempts', status='warning')
-        
-        save_json(USERS_FILE, users)
+        # Count the failure; MAX_LOGIN_ATTEMPTS within the lockout window locks the account
+        login_state.record_failure(user_key)
         # Don't log login attempts
+        # Logger.log_activity(username, 'ACCOUNT_LOCKED', description='Account locked due to multiple failed login attempts', status='warning')
         # Logger.log_activity(username, 'LOGIN_ATTEMPT', description='Failed login - invalid password', status='failed')
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
     
-    # Check if using default password (first login)
+    # Check if using default password (first login); the password just
+    # matched the stored hash, so comparing plaintext avoids a second hash
     from config import DEFAULT_ACADEMIC_PASSWORD, DEFAULT_STUDENT_PASSWORD
     is_default_password = False
     if user['role'] == 'Faculty':
-        is_default_password = verify_password(DEFAULT_ACADEMIC_PASSWORD, user['password'])
+        is_default_password = password == DEFAULT_ACADEMIC_PASSWORD
     elif user['role'] == 'Student':
-        is_default_password = verify_password(DEFAULT_STUDENT_PASSWORD, user['password'])
-    
-    # Reset failed attempts on successful login
-    user['failed_login_attempts'] = 0
-    user['account_locked'] = False
-    user['locked_until'] = None
-    user['last_login'] = get_current_timestamp()
-    user['login_count'] = user.get('login_count', 0) + 1
-    
-    # Track if password has been changed
-    if 'password_changed' not in user:
-        user['password_changed'] = not is_default_password
-    
-    save_json(USERS_FILE, users)
+        is_default_password = password == DEFAULT_STUDENT_PASSWORD
+    
+    # Reset failed attempts and count the login (batched, users.json is not rewritten)
+    login_state.record_login(user_key, get_current_timestamp())
+    
+    # users.json changes only for first-login tracking or a hash upgrade.
+    # Hash outside the lock; the record is re-read under it and left alone
+    # if its password changed since it was verified (a change or reset)
+    verified_hash = user['password']
+    upgraded_hash = hash_password(password) if password_hasher.needs_upgrade(verified_hash) else None
+    if upgraded_hash or 'password_changed' not in user:
+        with users_repo.transaction():
+            current = users_repo.get(user_key)
+            if current is not None and current['password'] == verified_hash:
+                if 'password_changed' not in current:
+                    current['password_changed'] = not is_default_password
+                if upgraded_hash:
+                    current['password'] = upgraded_hash
+                users_repo.put(user_key, current)
+                user = current
     
     # Create session
     token = create_session(username, user['role'])
@@ -361,12 +506,11 @@ def forgot_password():
     if len(new_password) < PASSWORD_MIN_LENGTH:
         return jsonify({'success': False, 'message': f'New password must be at least {PASSWORD_MIN_LENGTH} characters.'}), 400
     
-    users = load_json(USERS_FILE)
-    user_key = resolve_username_key(users, username)
+    user_key = user_index.resolve(username)
     if not user_key:
         return jsonify({'success': False, 'message': 'Unable to verify the provided details.'}), 404
     
-    user = users[user_key]
+    user = users_repo.get(user_key)
     profile = user.get('profile', {})
     dob = profile.get('dob', '')
     if not dob:
@@ -376,19 +520,21 @@ def forgot_password():
     if profile_year != dob_year:
         return jsonify({'success': False, 'message': 'The provided details do not match our records.'}), 403
     
-    user['password'] = hash_password(new_password)
-    try:
-        user['password_encrypted'] = encrypt_password(new_password)
-    except Exception:
-        pass
-    user['password_plain'] = new_password
-    user['password_changed'] = True
-    user['updated_at'] = get_current_timestamp()
-    user['failed_login_attempts'] = 0
-    user['account_locked'] = False
-    user['locked_until'] = None
-    
-    save_json(USERS_FILE, users)
+    password_hash = hash_password(new_password)
+    with users_repo.transaction():
+        user = users_repo.get(user_key)
+        if user is None:
+            return jsonify({'success': False, 'message': 'Unable to verify the provided details.'}), 404
+        user['password'] = password_hash
+        try:
+            user['password_encrypted'] = encrypt_password(new_password)
+        except Exception:
+            pass
+        user['password_plain'] = new_password
+        user['password_changed'] = True
+        user['updated_at'] = get_current_timestamp()
+        users_repo.put(user_key, user)
+    login_state.reset(user_key)
     Logger.log_activity(user_key, 'PASSWORD_RESET', 'User', user_key, 'Password reset via DOB verification', 'success')
     
     return jsonify({'success': True, 'message': 'Password reset successfully. You can now log in with your new password.'})
@@ -440,14 +586,18 @@ def session_status():
 @app.route('/api/users/list', methods=['GET'])
 @require_auth
 def list_users():
-    """List all users with profile completion status"""
+    """List users with profile completion status (paging/filter params: see list_page)"""
     if request.session_data['role'] != 'Admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    users = load_json(USERS_FILE)
+    try:
+        keys, page = list_page(users_list_index, 'created_at', 'created_at')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
     user_list = []
     
-    for username, user_data in users.items():
+    for username, user_data in users_repo.get_many(keys).items():
         plain_password = user_data.get('password_plain')
         encrypted = user_data.get('password_encrypted')
         if not plain_password:
@@ -464,14 +614,22 @@ def list_users():
             'password_plain': plain_password,
             'status': user_data.get('status'),
             'email': user_data.get('profile', {}).get('email', ''),
-            'last_login': user_data.get('last_login'),
+            'last_login': login_state.get(username)['last_login'],
             'registration_id': user_data.get('registration_id'),
             'profile_completed': user_data.get('profile_completed', False),
             'profile_status': 'Completed' if user_data.get('profile_completed', False) else 'Incomplete',
             'profile_photo_url': photo_url
         })
     
-    return jsonify({'success': True, 'data': user_list, 'total': len(user_list)})
+    return jsonify({'success': True, 'data': user_list, **page})
+
+def claim_username(name, candidate):
+    """Username to store a new user under, called under the users lock with
+    the candidate generate_username() picked from user_index before it"""
+    if users_repo.get(candidate) is None:
+        return candidate
+    # Taken by a concurrent add meanwhile: pick again from the stored keys
+    return generate_username(name, {key.lower() for key in users_repo.keys()})
 
 @app.route('/api/users/add', methods=['POST'])
 @require_auth
@@ -487,20 +645,15 @@ def add_user():
     if not name or not role:
         return jsonify({'success': False, 'message': 'Name and role are required'}), 400
     
-    users = load_json(USERS_FILE)
-    
-    # Auto-generate username (except for admin)
-    existing_usernames = set(users.keys())
-    username = generate_username(name, existing_usernames)
-    
     # Set default password based on role
     default_password = DEFAULT_ACADEMIC_PASSWORD if role == 'Faculty' else DEFAULT_STUDENT_PASSWORD
+    # Hash before taking the lock: PBKDF2 is the slow part
+    password_hash = hash_password(default_password)
     
     user_id = generate_id('USR')
-    users[username] = {
+    new_user = {
         "id": user_id,
-        "username": username,
-        "password": hash_password(default_password),
+        "password": password_hash,
         "password_encrypted": encrypt_password(default_password),
         "password_plain": default_password,
         "role": role,
@@ -510,15 +663,16 @@ def add_user():
         "profile": {},
         "created_at": get_current_timestamp(),
         "updated_at": get_current_timestamp(),
-        "created_by": request.session_data['username'],
-        "last_login": None,
-        "login_count": 0,
-        "failed_login_attempts": 0,
-        "account_locked": False,
-        "locked_until": None
+        "created_by": request.session_data['username']
     }
     
-    save_json(USERS_FILE, users)
+    # Auto-generate username (except for admin) from the index, then claim
+    # it under the lock so concurrent adds cannot pick the same name
+    username = generate_username(name, user_index)
+    with users_repo.transaction():
+        username = claim_username(name, username)
+        new_user['username'] = username
+        users_repo.put(username, new_user)
     Logger.log_activity(request.session_data['username'], 'USER_ADDED', 'User', username, f'User {username} created', 'success')
     
     return jsonify({
@@ -528,7 +682,7 @@ def add_user():
             'id': user_id,
             'username': username,
             'role': role,
-            'registration_id': users[username]['registration_id'],
+            'registration_id': new_user['registration_id'],
             'default_password': default_password
         }
     }), 201
@@ -548,29 +702,37 @@ def change_password():
     if len(new_password) < 6:
         return jsonify({'success': False, 'message': 'New password must be at least 6 characters'}), 400
     
-    users = load_json(USERS_FILE)
+    user = users_repo.get(username)
     
-    if username not in users:
+    if user is None:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    user = users[username]
-    
     # Verify current password
     if not verify_password(current_password, user['password']):
         return jsonify({'success': False, 'message': 'Current password is incorrect'}), 401
     
-    # Update password
-    user['password'] = hash_password(new_password)
-    # Update encrypted copy for admin view (if encryption available)
-    try:
-        user['password_encrypted'] = encrypt_password(new_password)
-    except Exception:
-        pass
-    user['password_plain'] = new_password
-    user['password_changed'] = True  # Mark password as changed
-    user['updated_at'] = get_current_timestamp()
-    
-    save_json(USERS_FILE, users)
+    # Hash outside the lock; the record is re-read and updated under it
+    verified_hash = user['password']
+    password_hash = hash_password(new_password)
+    with users_repo.transaction():
+        user = users_repo.get(username)
+        if user is None:
+            return jsonify({'success': False, 'message': 'User not found'}), 404
+        # The password changed meanwhile: check against the new one
+        if user['password'] != verified_hash and not verify_password(current_password, user['password']):
+            return jsonify({'success': False, 'message': 'Current password is incorrect'}), 401
+        
+        # Update password
+        user['password'] = password_hash
+        # Update encrypted copy for admin view (if encryption available)
+        try:
+            user['password_encrypted'] = encrypt_password(new_password)
+        except Exception:
+            pass
+        user['password_plain'] = new_password
+        user['password_changed'] = True  # Mark password as changed
+        user['updated_at'] = get_current_timestamp()
+        users_repo.put(username, user)
     Logger.log_activity(username, 'PASSWORD_CHANGED', 'User', username, 'Password changed', 'success')
     
     return jsonify({
@@ -583,13 +745,13 @@ def change_password():
 @require_auth
 def get_user_details(username):
     """Get user details (admin sees password, academics don't)"""
-    users = load_json(USERS_FILE)
+    user = users_repo.get(username)
     
-    if username not in users:
+    if user is None:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    user = users[username].copy()
     role = request.session_data['role']
+    activity = login_state.get(username)
     
     # Admin can see password, academics cannot
     if role == 'Admin':
@@ -607,8 +769,8 @@ def get_user_details(username):
             'profile': user_profile,
             'profile_photo_url': get_profile_photo_url(user),
             'created_at': user.get('created_at'),
-            'last_login': user.get('last_login'),
-            'login_count': user.get('login_count', 0)
+            'last_login': activity['last_login'],
+            'login_count': activity['login_count']
         }
     elif role == 'Faculty':
         # Academics can see everything except password
@@ -621,8 +783,8 @@ def get_user_details(username):
             'profile': user.get('profile', {}),
             'profile_photo_url': get_profile_photo_url(user),
             'created_at': user.get('created_at'),
-            'last_login': user.get('last_login'),
-            'login_count': user.get('login_count', 0)
+            'last_login': activity['last_login'],
+            'login_count': activity['login_count']
         }
     else:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -642,16 +804,17 @@ def update_user_status(username):
     if new_status not in ['active', 'inactive']:
         return jsonify({'success': False, 'message': 'Invalid status'}), 400
     
-    users = load_json(USERS_FILE)
-    
-    if username not in users:
-        return jsonify({'success': False, 'message': 'User not found'}), 404
-    
-    old_status = users[username].get('status')
-    users[username]['status'] = new_status
-    users[username]['updated_at'] = get_current_timestamp()
-    
-    save_json(USERS_FILE, users)
+    with users_repo.transaction():
+        user = users_repo.get(username)
+        
+        if user is None:
+            return jsonify({'success': False, 'message': 'User not found'}), 404
+        
+        old_status = user.get('status')
+        user['status'] = new_status
+        user['updated_at'] = get_current_timestamp()
+        
+        users_repo.put(username, user)
     Logger.log_activity(request.session_data['username'], 'USER_STATUS_CHANGED', 'User', username, f'Status changed from {old_status} to {new_status}', 'success')
     
     return jsonify({
@@ -671,13 +834,11 @@ def get_profile():
     username = request.session_data['username']
     role = request.session_data['role']
     
-    users = load_json(USERS_FILE)
+    user = users_repo.get(username)
     
-    if username not in users:
+    if user is None:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    user = users[username]
-    
     # Check if user can view this profile
     if role != 'Admin' and username != request.session_data['username']:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -697,8 +858,7 @@ def get_profile():
 def upload_profile_photo():
     """Upload or replace a profile photo"""
     target_username = request.form.get('username', '').strip() or request.session_data['username']
-    users = load_json(USERS_FILE)
-    target_key = resolve_username_key(users, target_username)
+    target_key = user_index.resolve(target_username)
     
     if not target_key:
         return jsonify({'success': False, 'message': 'User not found'}), 404
@@ -729,19 +889,23 @@ def upload_profile_photo():
     
     os.makedirs(PROFILE_PHOTOS_DIR, exist_ok=True)
     
-    # Delete existing photo if present
-    profile = users[target_key].setdefault('profile', {})
-    old_photo = profile.get('photo')
-    if old_photo:
-        delete_profile_photo_file(old_photo)
-    
-    photo.save(save_path)
-    relative_path = os.path.relpath(save_path, STATIC_DIR).replace('\\', '/')
-    profile['photo'] = relative_path
-    users[target_key]['profile'] = profile
-    users[target_key]['updated_at'] = get_current_timestamp()
-    
-    save_json(USERS_FILE, users)
+    with users_repo.transaction():
+        user = users_repo.get(target_key)
+        if user is None:
+            return jsonify({'success': False, 'message': 'User not found'}), 404
+        # Delete existing photo if present
+        profile = user.setdefault('profile', {})
+        old_photo = profile.get('photo')
+        if old_photo:
+            delete_profile_photo_file(old_photo)
+        
+        photo.save(save_path)
+        relative_path = os.path.relpath(save_path, STATIC_DIR).replace('\\', '/')
+        profile['photo'] = relative_path
+        user['profile'] = profile
+        user['updated_at'] = get_current_timestamp()
+        
+        users_repo.put(target_key, user)
     photo_url = f"/static/{relative_path}"
     Logger.log_activity(request.session_data['username'], 'PROFILE_PHOTO_UPDATED', 'User', target_key, 'Profile photo updated', 'success')
     
@@ -765,67 +929,73 @@ def update_profile():
     if role != 'Admin' and target_username != username:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    users = load_json(USERS_FILE)
-    
-    if target_username not in users:
-        return jsonify({'success': False, 'message': 'User not found'}), 404
-    
-    # Determine if faculty email is immutable for self-service edits
+    # Determine if faculty email is immutable for self-service edits. The
+    # academic record's email is read before taking the users lock:
+    # add_academic locks academics first, then users
     is_self_faculty = role == 'Faculty' and target_username == username
-    immutable_email = None
+    academic_email = ''
     if is_self_faculty:
-        existing_profile = users[target_username].get('profile', {})
-        immutable_email = existing_profile.get('email', '').strip().lower()
-        if not immutable_email:
-            academics = load_json(ACADEMICS_FILE)
-            acad_id = users[target_username].get('id')
-            if acad_id and acad_id in academics:
-                immutable_email = academics[acad_id].get('email', '').strip().lower()
-
-    # Validate required fields
-    required_fields = ['first_name', 'last_name', 'dob', 'gender', 'marital_status', 'father_name', 'mother_name']
-    profile = {}
-    
-    for field in required_fields:
-        value = data.get(field, '').strip()
-        if not value:
-            return jsonify({'success': False, 'message': f'{field.replace("_", " ").title()} is required'}), 400
-        profile[field] = sanitize_input(value)
-    
-    # Handle email separately to keep faculty read-only
-    if is_self_faculty:
-        if not immutable_email:
-            return jsonify({'success': False, 'message': 'Email must be assigned by an administrator before completing your profile.'}), 400
-        profile['email'] = immutable_email
-    else:
-        email_value = data.get('email', '').strip()
-        if not email_value:
-            return jsonify({'success': False, 'message': 'Email is required'}), 400
-        sanitized_email = sanitize_input(email_value).lower()
-        profile['email'] = sanitized_email
-        if not validate_email(profile['email']):
-            return jsonify({'success': False, 'message': 'Invalid email format'}), 400
-    
-    # Validate email format for faculty (immutable value)
-    if is_self_faculty and not validate_email(profile['email']):
-        return jsonify({'success': False, 'message': 'Invalid email format. Please contact an administrator to correct it.'}), 400
-    
-    # Validate date
-    try:
-        dob_date = datetime.strptime(profile['dob'], "%Y-%m-%d")
-        if dob_date > datetime.now():
-            return jsonify({'success': False, 'message': 'Date of birth must be in the past'}), 400
-    except:
-        return jsonify({'success': False, 'message': 'Invalid date format'}), 400
-    
-    existing_profile = users[target_username].get('profile', {}) or {}
-    if existing_profile.get('photo'):
-        profile['photo'] = existing_profile['photo']
-    users[target_username]['profile'] = profile
-    users[target_username]['profile_completed'] = True
-    users[target_username]['updated_at'] = get_current_timestamp()
-    
-    save_json(USERS_FILE, users)
+        target_user = users_repo.get(target_username)
+        acad_id = target_user.get('id') if target_user else None
+        academic = academics_repo.get(acad_id) if acad_id else None
+        if academic:
+            academic_email = academic.get('email', '').strip().lower()
+    
+    with users_repo.transaction():
+        target_user = users_repo.get(target_username)
+        
+        if target_user is None:
+            return jsonify({'success': False, 'message': 'User not found'}), 404
+        
+        immutable_email = None
+        if is_self_faculty:
+            existing_profile = target_user.get('profile', {})
+            immutable_email = existing_profile.get('email', '').strip().lower() or academic_email
+
+        # Validate required fields
+        required_fields = ['first_name', 'last_name', 'dob', 'gender', 'marital_status', 'father_name', 'mother_name']
+        profile = {}
+        
+        for field in required_fields:
+            value = data.get(field, '').strip()
+            if not value:
+                return jsonify({'success': False, 'message': f'{field.replace("_", " ").title()} is required'}), 400
+            profile[field] = sanitize_input(value)
+        
+        # Handle email separately to keep faculty read-only
+        if is_self_faculty:
+            if not immutable_email:
+                return jsonify({'success': False, 'message': 'Email must be assigned by an administrator before completing your profile.'}), 400
+            profile['email'] = immutable_email
+        else:
+            email_value = data.get('email', '').strip()
+            if not email_value:
+                return jsonify({'success': False, 'message': 'Email is required'}), 400
+            sanitized_email = sanitize_input(email_value).lower()
+            profile['email'] = sanitized_email
+            if not validate_email(profile['email']):
+                return jsonify({'success': False, 'message': 'Invalid email format'}), 400
+        
+        # Validate email format for faculty (immutable value)
+        if is_self_faculty and not validate_email(profile['email']):
+            return jsonify({'success': False, 'message': 'Invalid email format. Please contact an administrator to correct it.'}), 400
+        
+        # Validate date
+        try:
+            dob_date = datetime.strptime(profile['dob'], "%Y-%m-%d")
+            if dob_date > datetime.now():
+                return jsonify({'success': False, 'message': 'Date of birth must be in the past'}), 400
+        except:
+            return jsonify({'success': False, 'message': 'Invalid date format'}), 400
+        
+        existing_profile = target_user.get('profile', {}) or {}
+        if existing_profile.get('photo'):
+            profile['photo'] = existing_profile['photo']
+        target_user['profile'] = profile
+        target_user['profile_completed'] = True
+        target_user['updated_at'] = get_current_timestamp()
+        
+        users_repo.put(target_username, target_user)
     Logger.log_activity(username, 'PROFILE_UPDATED', 'User', target_username, 'Profile updated', 'success')
     
     return jsonify({
@@ -838,23 +1008,21 @@ def update_profile():
 @app.route('/api/academics/list', methods=['GET'])
 @require_auth
 def list_academics():
-    """List all academics"""
-    academics = load_json(ACADEMICS_FILE)
-    users = load_json(USERS_FILE)
+    """List academics (paging/filter params: see list_page)"""
+    try:
+        keys, page = list_page(academics_list_index, 'created_at', 'created_at')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    academics = academics_repo.get_many(keys)
+    usernames = user_index.usernames_for_ids(academics, role='Faculty')
     academic_list = []
     
     for acad_id, acad_data in academics.items():
-        # Find username from users
-        username = None
-        for uname, user_data in users.items():
-            if user_data.get('role') == 'Faculty' and user_data.get('id') == acad_id:
-                username = uname
-                break
-        
         academic_list.append({
             'id': acad_id,
             'name': acad_data.get('name'),
-            'username': username,
+            'username': usernames.get(acad_id),
             'department': acad_data.get('department'),
             'qualification': acad_data.get('qualification'),
             'experience': acad_data.get('experience'),
@@ -864,28 +1032,20 @@ def list_academics():
             'registration_id': acad_data.get('registration_id')
         })
     
-    return jsonify({'success': True, 'data': academic_list, 'total': len(academic_list)})
+    return jsonify({'success': True, 'data': academic_list, **page})
 
 @app.route('/api/academics/<acad_id>/view', methods=['GET'])
 @require_auth
 def view_academic(acad_id):
     """View academic details"""
-    academics = load_json(ACADEMICS_FILE)
-    users = load_json(USERS_FILE)
+    acad = academics_repo.get(acad_id)
     
-    if acad_id not in academics:
+    if acad is None:
         return jsonify({'success': False, 'message': 'Academic not found'}), 404
     
-    acad = academics[acad_id].copy()
-    
     # Find associated user
-    username = None
-    user_data = None
-    for uname, u_data in users.items():
-        if u_data.get('role') == 'Faculty' and u_data.get('id') == acad_id:
-            username = uname
-            user_data = u_data
-            break
+    username = user_index.username_for_id(acad_id, role='Faculty')
+    user_data = users_repo.get(username) if username else None
     
     acad['username'] = username
     if user_data:
@@ -932,24 +1092,13 @@ def add_academic():
     except:
         return jsonify({'success': False, 'message': 'Experience must be a number'}), 400
     
-    academics = load_json(ACADEMICS_FILE)
-    users = load_json(USERS_FILE)
-    
-    # Check duplicate email
-    for acad in academics.values():
-        if acad.get('email', '').lower() == email.lower():
-            return jsonify({'success': False, 'message': 'Email already exists'}), 400
-    
     acad_id = generate_id('ACM')
+    # Hash before taking the locks: PBKDF2 is the slow part
+    password_hash = hash_password(DEFAULT_ACADEMIC_PASSWORD)
     
-    # Auto-generate username
-    existing_usernames = set(users.keys())
-    username = generate_username(name, existing_usernames)
-    
-    academics[acad_id] = {
+    academic = {
         "id": acad_id,
         "name": sanitize_input(name),
-        "username": username,
         "department": sanitize_input(department),
         "qualification": sanitize_input(qualification),
         "experience": str(exp_num),
@@ -963,14 +1112,13 @@ def add_academic():
     }
     
     # Create user account for academic
-    users[username] = {
+    user_account = {
         "id": acad_id,
-        "username": username,
-        "password": hash_password(DEFAULT_ACADEMIC_PASSWORD),
+        "password": password_hash,
         "password_encrypted": encrypt_password(DEFAULT_ACADEMIC_PASSWORD),
         "password_plain": DEFAULT_ACADEMIC_PASSWORD,
         "role": "Faculty",
-        "registration_id": academics[acad_id]['registration_id'],
+        "registration_id": academic['registration_id'],
         "status": "active",
         "profile_completed": False,
         "profile": {
@@ -978,16 +1126,22 @@ def add_academic():
         },
         "created_at": get_current_timestamp(),
         "updated_at": get_current_timestamp(),
-        "created_by": request.session_data['username'],
-        "last_login": None,
-        "login_count": 0,
-        "failed_login_attempts": 0,
-        "account_locked": False,
-        "locked_until": None
+        "created_by": request.session_data['username']
     }
     
-    save_json(ACADEMICS_FILE, academics)
-    save_json(USERS_FILE, users)
+    # Auto-generate username
+    username = generate_username(name, user_index)
+    with academics_repo.transaction(), users_repo.transaction():
+        # Check duplicate email
+        for acad in academics_repo.all().values():
+            if acad.get('email', '').lower() == email.lower():
+                return jsonify({'success': False, 'message': 'Email already exists'}), 400
+        
+        username = claim_username(name, username)
+        academic['username'] = username
+        user_account['username'] = username
+        academics_repo.put(acad_id, academic)
+        users_repo.put(username, user_account)
     Logger.log_activity(request.session_data['username'], 'ACADEMIC_ADDED', 'Academic', acad_id, f'Academic {name} added', 'success')
     
     return jsonify({
@@ -997,7 +1151,7 @@ def add_academic():
             'id': acad_id,
             'name': name,
             'username': username,
-            'registration_id': academics[acad_id]['registration_id'],
+            'registration_id': academic['registration_id'],
             'default_password': DEFAULT_ACADEMIC_PASSWORD
         }
     }), 201
@@ -1009,43 +1163,43 @@ def update_academic(acad_id):
     if request.session_data['role'] != 'Admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    academics = load_json(ACADEMICS_FILE)
-    
-    if acad_id not in academics:
-        return jsonify({'success': False, 'message': 'Academic not found'}), 404
-    
     data = request.json
-    acad = academics[acad_id]
-    
-    # Update fields
-    if 'name' in data:
-        acad['name'] = sanitize_input(data['name'].strip())
-    if 'department' in data:
-        acad['department'] = sanitize_input(data['department'].strip())
-    if 'qualification' in data:
-        acad['qualification'] = sanitize_input(data['qualification'].strip())
-    if 'experience' in data:
-        try:
-            exp_num = int(data['experience'])
-            if 0 <= exp_num <= 60:
-                acad['experience'] = str(exp_num)
-        except:
-            pass
-    if 'email' in data:
-        email = data['email'].strip().lower()
-        if validate_email(email):
-            # Check duplicate
-            for aid, a in academics.items():
-                if aid != acad_id and a.get('email', '').lower() == email:
-                    return jsonify({'success': False, 'message': 'Email already exists'}), 400
-            acad['email'] = email
-    if 'phone' in data:
-        phone = data['phone'].strip()
-        if validate_phone(phone):
-            acad['phone'] = phone
-    
-    acad['updated_at'] = get_current_timestamp()
-    save_json(ACADEMICS_FILE, academics)
+    
+    with academics_repo.transaction():
+        acad = academics_repo.get(acad_id)
+        
+        if acad is None:
+            return jsonify({'success': False, 'message': 'Academic not found'}), 404
+        
+        # Update fields
+        if 'name' in data:
+            acad['name'] = sanitize_input(data['name'].strip())
+        if 'department' in data:
+            acad['department'] = sanitize_input(data['department'].strip())
+        if 'qualification' in data:
+            acad['qualification'] = sanitize_input(data['qualification'].strip())
+        if 'experience' in data:
+            try:
+                exp_num = int(data['experience'])
+                if 0 <= exp_num <= 60:
+                    acad['experience'] = str(exp_num)
+            except:
+                pass
+        if 'email' in data:
+            email = data['email'].strip().lower()
+            if validate_email(email):
+                # Check duplicate
+                for aid, a in academics_repo.all().items():
+                    if aid != acad_id and a.get('email', '').lower() == email:
+                        return jsonify({'success': False, 'message': 'Email already exists'}), 400
+                acad['email'] = email
+        if 'phone' in data:
+            phone = data['phone'].strip()
+            if validate_phone(phone):
+                acad['phone'] = phone
+        
+        acad['updated_at'] = get_current_timestamp()
+        academics_repo.put(acad_id, acad)
     
     Logger.log_activity(request.session_data['username'], 'ACADEMIC_UPDATED', 'Academic', acad_id, f'Academic {acad["name"]} updated', 'success')
     
@@ -1062,16 +1216,17 @@ def delete_academic(acad_id):
     if request.session_data['role'] != 'Admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    academics = load_json(ACADEMICS_FILE)
-    
-    if acad_id not in academics:
-        return jsonify({'success': False, 'message': 'Academic not found'}), 404
-    
-    academics[acad_id]['status'] = 'inactive'
-    academics[acad_id]['updated_at'] = get_current_timestamp()
-    
-    save_json(ACADEMICS_FILE, academics)
-    Logger.log_activity(request.session_data['username'], 'ACADEMIC_DELETED', 'Academic', acad_id, f'Academic {academics[acad_id]["name"]} deleted', 'success')
+    with academics_repo.transaction():
+        acad = academics_repo.get(acad_id)
+        
+        if acad is None:
+            return jsonify({'success': False, 'message': 'Academic not found'}), 404
+        
+        acad['status'] = 'inactive'
+        acad['updated_at'] = get_current_timestamp()
+        
+        academics_repo.put(acad_id, acad)
+    Logger.log_activity(request.session_data['username'], 'ACADEMIC_DELETED', 'Academic', acad_id, f'Academic {acad["name"]} deleted', 'success')
     
     return jsonify({'success': True, 'message': 'Academic deleted successfully'})
 
@@ -1079,11 +1234,15 @@ def delete_academic(acad_id):
 @app.route('/api/students/list', methods=['GET'])
 @require_auth
 def list_students():
-    """List all students"""
-    students = load_json(STUDENTS_FILE)
+    """List students (paging/filter params: see list_page)"""
+    try:
+        keys, page = list_page(students_list_index, 'created_at', 'created_at')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
     student_list = []
     
-    for stu_id, stu_data in students.items():
+    for stu_id, stu_data in students_repo.get_many(keys).items():
         student_list.append({
             'id': stu_id,
             'student_name': stu_data.get('student_name'),
@@ -1098,7 +1257,7 @@ def list_students():
             'registration_id': stu_data.get('registration_id')
         })
     
-    return jsonify({'success': True, 'data': student_list, 'total': len(student_list)})
+    return jsonify({'success': True, 'data': student_list, **page})
 
 @app.route('/api/students/add', methods=['POST'])
 @require_auth
@@ -1116,18 +1275,13 @@ def add_student():
     if not student_name or not section:
         return jsonify({'success': False, 'message': 'Student name and section are required'}), 400
     
-    students = load_json(STUDENTS_FILE)
-    users = load_json(USERS_FILE)
-    
-    # Auto-generate username
-    existing_usernames = set(users.keys())
-    username = generate_username(student_name, existing_usernames)
-    
     stu_id = generate_id('STU')
-    students[stu_id] = {
+    # Hash before taking the locks: PBKDF2 is the slow part
+    password_hash = hash_password(DEFAULT_STUDENT_PASSWORD)
+    
+    student = {
         "id": stu_id,
         "student_name": sanitize_input(student_name),
-        "login_id": username,
         "section": section.upper(),
         "first_name": "",
         "last_name": "",
@@ -1145,29 +1299,29 @@ def add_student():
     }
     
     # Create user account for student
-    users[username] = {
+    user_account = {
         "id": stu_id,
-        "username": username,
-        "password": hash_password(DEFAULT_STUDENT_PASSWORD),
+        "password": password_hash,
         "password_encrypted": encrypt_password(DEFAULT_STUDENT_PASSWORD),
         "password_plain": DEFAULT_STUDENT_PASSWORD,
         "role": "Student",
-        "registration_id": students[stu_id]['registration_id'],
+        "registration_id": student['registration_id'],
         "status": "active",
         "profile_completed": False,
         "profile": {},
         "created_at": get_current_timestamp(),
         "updated_at": get_current_timestamp(),
-        "created_by": request.session_data['username'],
-        "last_login": None,
-        "login_count": 0,
-        "failed_login_attempts": 0,
-        "account_locked": False,
-        "locked_until": None
+        "created_by": request.session_data['username']
     }
     
-    save_json(STUDENTS_FILE, students)
-    save_json(USERS_FILE, users)
+    # Auto-generate username
+    username = generate_username(student_name, user_index)
+    with students_repo.transaction(), users_repo.transaction():
+        username = claim_username(student_name, username)
+        student['login_id'] = username
+        user_account['username'] = username
+        students_repo.put(stu_id, student)
+        users_repo.put(username, user_account)
     
     Logger.log_activity(request.session_data['username'], 'STUDENT_ADDED', 'Student', stu_id, f'Student {student_name} added', 'success')
     
@@ -1179,7 +1333,7 @@ def add_student():
             'student_name': student_name,
             'username': username,
             'section': section.upper(),
-            'registration_id': students[stu_id]['registration_id'],
+            'registration_id': student['registration_id'],
             'default_password': DEFAULT_STUDENT_PASSWORD
         }
     }), 201
@@ -1192,19 +1346,16 @@ def view_student(stu_id):
     if request.session_data['role'] not in ['Admin', 'Faculty']:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    students = load_json(STUDENTS_FILE)
-    users = load_json(USERS_FILE)
+    student = students_repo.get(stu_id)
     
-    if stu_id not in students:
+    if student is None:
         return jsonify({'success': False, 'message': 'Student not found'}), 404
     
-    student = students[stu_id].copy()
-    
     # Find associated user
     username = student.get('login_id')
     user_data = None
-    if username and username in users:
-        user_data = users[username]
+    if username:
+        user_data = users_repo.get(username)
     
     student['username'] = username
     if user_data:
@@ -1228,26 +1379,25 @@ def delete_student(stu_id):
     if request.session_data['role'] not in ['Admin', 'Faculty']:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    students = load_json(STUDENTS_FILE)
-    users = load_json(USERS_FILE)
-    
-    if stu_id not in students:
-        return jsonify({'success': False, 'message': 'Student not found'}), 404
-    
-    student = students[stu_id]
-    username = student.get('login_id')
-    
-    # Soft delete student
-    students[stu_id]['status'] = 'inactive'
-    students[stu_id]['updated_at'] = get_current_timestamp()
-    
-    # Deactivate user account
-    if username and username in users:
-        users[username]['status'] = 'inactive'
-        users[username]['updated_at'] = get_current_timestamp()
-    
-    save_json(STUDENTS_FILE, students)
-    save_json(USERS_FILE, users)
+    with students_repo.transaction(), users_repo.transaction():
+        student = students_repo.get(stu_id)
+        
+        if student is None:
+            return jsonify({'success': False, 'message': 'Student not found'}), 404
+        
+        username = student.get('login_id')
+        
+        # Soft delete student
+        student['status'] = 'inactive'
+        student['updated_at'] = get_current_timestamp()
+        students_repo.put(stu_id, student)
+        
+        # Deactivate user account
+        user = users_repo.get(username) if username else None
+        if user:
+            user['status'] = 'inactive'
+            user['updated_at'] = get_current_timestamp()
+            users_repo.put(username, user)
     
     Logger.log_activity(request.session_data['username'], 'STUDENT_DELETED', 'Student', stu_id, f'Student {student["student_name"]} deleted', 'success')
     
@@ -1262,41 +1412,40 @@ def update_student(stu_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     data = request.json
-    students = load_json(STUDENTS_FILE)
-    
-    if stu_id not in students:
-        return jsonify({'success': False, 'message': 'Student not found'}), 404
-    
-    student = students[stu_id]
-    
-    # Update fields if provided
-    if 'student_name' in data:
-        student['student_name'] = sanitize_input(data['student_name'].strip())
-    if 'section' in data:
-        student['section'] = data['section'].strip().upper()
-    if 'first_name' in data:
-        student['first_name'] = sanitize_input(data['first_name'].strip())
-    if 'last_name' in data:
-        student['last_name'] = sanitize_input(data['last_name'].strip())
-    if 'email' in data:
-        email = data['email'].strip().lower()
-        if email and validate_email(email):
-            student['email'] = email
-    if 'phone' in data:
-        phone = data['phone'].strip()
-        if phone and validate_phone(phone):
-            student['phone'] = phone
-    if 'dob' in data:
-        student['dob'] = data['dob'].strip()
-    if 'gender' in data:
-        student['gender'] = data['gender'].strip()
-    if 'father_name' in data:
-        student['father_name'] = sanitize_input(data['father_name'].strip())
-    if 'mother_name' in data:
-        student['mother_name'] = sanitize_input(data['mother_name'].strip())
-    
-    student['updated_at'] = get_current_timestamp()
-    save_json(STUDENTS_FILE, students)
+    with students_repo.transaction():
+        student = students_repo.get(stu_id)
+        
+        if student is None:
+            return jsonify({'success': False, 'message': 'Student not found'}), 404
+        
+        # Update fields if provided
+        if 'student_name' in data:
+            student['student_name'] = sanitize_input(data['student_name'].strip())
+        if 'section' in data:
+            student['section'] = data['section'].strip().upper()
+        if 'first_name' in data:
+            student['first_name'] = sanitize_input(data['first_name'].strip())
+        if 'last_name' in data:
+            student['last_name'] = sanitize_input(data['last_name'].strip())
+        if 'email' in data:
+            email = data['email'].strip().lower()
+            if email and validate_email(email):
+                student['email'] = email
+        if 'phone' in data:
+            phone = data['phone'].strip()
+            if phone and validate_phone(phone):
+                student['phone'] = phone
+        if 'dob' in data:
+            student['dob'] = data['dob'].strip()
+        if 'gender' in data:
+            student['gender'] = data['gender'].strip()
+        if 'father_name' in data:
+            student['father_name'] = sanitize_input(data['father_name'].strip())
+        if 'mother_name' in data:
+            student['mother_name'] = sanitize_input(data['mother_name'].strip())
+        
+        student['updated_at'] = get_current_timestamp()
+        students_repo.put(stu_id, student)
     
     Logger.log_activity(request.session_data['username'], 'STUDENT_UPDATED', 'Student', stu_id, f'Student {student["student_name"]} updated', 'success')
     
@@ -1307,13 +1456,12 @@ def update_student(stu_id):
     })
 
 # Event Management APIs
-@app.route('/api/events/list', methods=['GET'])
-@require_auth
-def list_events():
-    """List all events"""
-    events = load_json(EVENTS_FILE)
+def event_rows(events):
+    """Serialize {evt_id: event} for the event list responses, with the
+    caller's own registration status for students"""
     event_list = []
-    
+    is_student = request.session_data['role'] == 'Student'
+
     for evt_id, evt_data in events.items():
         event_list.append({
             'id': evt_id,
@@ -1327,14 +1475,92 @@ def list_events():
             'description': evt_data.get('description'),
             'capacity': evt_data.get('capacity'),
             'registered_count': evt_data.get('registered_count', 0),
+            'waitlist_enabled': bool(evt_data.get('waitlist_enabled')),
+            'waitlisted_count': evt_data.get('waitlisted_count', 0),
             'venue': evt_data.get('venue'),
             'status': evt_data.get('status', 'active')
         })
+        if is_student:
+            status, position = registration_store.status(evt_id, request.session_data['username'])
+            event_list[-1]['my_registration'] = {'status': status, 'position': position}
+
+    return event_list
+
+@app.route('/api/events/list', methods=['GET'])
+@require_auth
+def list_events():
+    """List events by date (paging/filter params: see list_page)"""
+    archive_past_events()
+    try:
+        keys, page = list_page(events_list_index, 'date', 'date')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    # Sort by date
-    event_list.sort(key=lambda x: x.get('date', ''))
+    return jsonify({'success': True, 'data': event_rows(events_repo.get_many(keys)), **page})
+
+@app.route('/api/events/range', methods=['GET'])
+@require_auth
+def events_range():
+    """Events by date for calendar views.
+
+    Query params: from and to (inclusive YYYY-MM-DD, or YYYY-MM for a whole
+    month; either may be left open), partition=upcoming (today on) or past
+    (before today, newest first), page_size and cursor (from next_cursor;
+    page_size defaults to MAX_PAGE_SIZE). Archived events are read only when
+    the range reaches back past the archive cutoff.
+    """
+    archive_past_events()
+    low, high = request.args.get('from') or None, request.args.get('to') or None
+    for name, value in (('from', low), ('to', high)):
+        if value is not None and not re.fullmatch(r'\d{4}-\d{2}(-\d{2})?', value):
+            return jsonify({'success': False, 'message': f"Invalid '{name}' date, use YYYY-MM-DD"}), 400
+    partition = request.args.get('partition') or 'all'
+    if partition not in ('all', 'upcoming', 'past'):
+        return jsonify({'success': False, 'message': f"Invalid partition '{partition}'"}), 400
+    page_size = max(1, min(request.args.get('page_size', MAX_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    after = None
+    if request.args.get('cursor'):
+        try:
+            value, key = decode_list_cursor(request.args['cursor'], partition)
+            after = (*value, key)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    
+    today = datetime.now().strftime('%Y-%m-%d')
+    calendars = [events_calendar]
+    if low is None or low < event_archive_cutoff():
+        calendars.append(archived_events_calendar)
+    upcoming_low = max(low or today, today)
+    upcoming_count = sum(calendar.count(upcoming_low, high) for calendar in calendars)
+    past_count = sum(calendar.count(low, high, before=today) for calendar in calendars)
+    
+    bounds = {'all': (low, high, None), 'upcoming': (upcoming_low, high, None), 'past': (low, high, today)}[partition]
+    descending = partition == 'past'
+    # Each calendar yields at most page_size + 1 entries past the cursor;
+    # merging them keeps the page in date order across hot set and archive
+    spans = [calendar.span(*bounds, after=after, descending=descending, limit=page_size + 1) for calendar in calendars]
+    entries = list(heapq.merge(*spans, reverse=descending))[:page_size + 1]
+    next_cursor = None
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        date, time_of_day, key = entries[-1]
+        next_cursor = encode_list_cursor(partition, ((date, time_of_day), key))
+    
+    keys = [key for _, _, key in entries]
+    events = events_repo.get_many(keys)
+    if len(events) < len(keys):
+        events.update(events_archive_repo.get_many([key for key in keys if key not in events]))
+    events = {key: events[key] for key in keys if key in events}
     
-    return jsonify({'success': True, 'data': event_list, 'total': len(event_list)})
+    return jsonify({
+        'success': True,
+        'data': event_rows(events),
+        'total': {'all': upcoming_count + past_count, 'upcoming': upcoming_count, 'past': past_count}[partition],
+        'upcoming_count': upcoming_count,
+        'past_count': past_count,
+        'today': today,
+        'next_cursor': next_cursor
+    })
 
 @app.route('/api/events/add', methods=['POST'])
 @require_auth
@@ -1374,10 +1600,9 @@ def add_event():
     # Convert time to 12-hour format
     time_12 = convert_24_to_12(time) if ':' in time and ('AM' not in time and 'PM' not in time) else time
     
-    events = load_json(EVENTS_FILE)
     evt_id = generate_id('EVT')
     
-    events[evt_id] = {
+    event = {
         "id": evt_id,
         "title": sanitize_input(title),
         "date": date,
@@ -1389,7 +1614,8 @@ def add_event():
         "description": sanitize_input(data.get('description', '').strip()),
         "capacity": cap_num,
         "registered_count": 0,
-        "registrations": [],  # List of registered users
+        "waitlisted_count": 0,
+        "waitlist_enabled": bool(data.get('waitlist_enabled')),
         "venue": sanitize_input(data.get('venue', '').strip()),
         "status": "active",
         "created_at": get_current_timestamp(),
@@ -1397,7 +1623,7 @@ def add_event():
         "created_by": request.session_data['username']
     }
     
-    save_json(EVENTS_FILE, events)
+    events_repo.put(evt_id, event)
     Logger.log_activity(request.session_data['username'], 'EVENT_ADDED', 'Event', evt_id, f'Event {title} added', 'success')
     
     return jsonify({
@@ -1413,92 +1639,363 @@ def add_event():
 @app.route('/api/events/<evt_id>/register', methods=['POST'])
 @require_auth
 def register_event(evt_id):
-    """Register for event"""
-    events = load_json(EVENTS_FILE)
-    students = load_json(STUDENTS_FILE)
-    users = load_json(USERS_FILE)
-    
-    if evt_id not in events:
-        return jsonify({'success': False, 'message': 'Event not found'}), 404
-    
-    event = events[evt_id]
+    """Register for event, or join its waitlist when full and enabled"""
     username = request.session_data['username']
-    user = users.get(username, {})
     
     # Only students can register
-    if user.get('role') != 'Student':
+    if request.session_data['role'] != 'Student':
         return jsonify({'success': False, 'message': 'Only students can register for events'}), 403
     
-    # Check if already registered
-    if 'registrations' not in event:
-        event['registrations'] = []
-    
-    for reg in event['registrations']:
-        if reg.get('username') == username:
-            return jsonify({'success': False, 'message': 'Already registered for this event'}), 400
-    
-    # Check capacity
-    if len(event['registrations']) >= event.get('capacity', 0):
-        return jsonify({'success': False, 'message': 'Event is full'}), 400
-    
-    # Get student info
-    student_info = None
-    for stu_id, stu_data in students.items():
-        if stu_data.get('login_id') == username:
-            student_info = stu_data
-            break
+    event = events_repo.get(evt_id)
+    if event is None:
+        return jsonify({'success': False, 'message': 'Event not found'}), 404
     
-    # Add registration
-    registration = {
-        'username': username,
-        'student_name': student_info.get('student_name', username) if student_info else username,
-        'section': student_info.get('section', '') if student_info else '',
+    # Student info for the registration record (user id is the student id)
+    user = users_repo.get(username) or {}
+    student_info = (students_repo.get(user['id']) if user.get('id') else None) or {}
+    details = {
+        'student_name': student_info.get('student_name', username),
+        'section': student_info.get('section', ''),
         'registered_at': get_current_timestamp()
     }
     
-    event['registrations'].append(registration)
-    event['registered_count'] = len(event['registrations'])
-    event['updated_at'] = get_current_timestamp()
-    
-    save_json(EVENTS_FILE, events)
+    status, position = registration_store.register(
+        evt_id, username, event.get('capacity', 0), details, waitlist=bool(event.get('waitlist_enabled'))
+    )
+    if status == DUPLICATE:
+        return jsonify({'success': False, 'message': 'Already registered for this event'}), 400
+    if status in (REGISTERED, WAITLISTED):
+        registration_counts.publish(evt_id)
+    if status == WAITLISTED:
+        Logger.log_activity(username, 'EVENT_WAITLISTED', 'Event', evt_id, f'Waitlisted for event {event["title"]} (position {position})', 'success')
+        return jsonify({'success': True, 'status': status, 'position': position, 'message': f'Event is full - added to the waitlist (position {position})'})
+    if status != REGISTERED:
+        return jsonify({'success': False, 'message': 'Event is full'}), 400
     Logger.log_activity(username, 'EVENT_REGISTERED', 'Event', evt_id, f'Registered for event {event["title"]}', 'success')
     
-    return jsonify({'success': True, 'message': 'Successfully registered for event'})
+    return jsonify({'success': True, 'status': status, 'message': 'Successfully registered for event'})
+
+@app.route('/api/events/<evt_id>/register', methods=['DELETE'])
+@require_auth
+def cancel_event_registration(evt_id):
+    """Cancel own registration or waitlist place; frees the seat for the waitlist"""
+    username = request.session_data['username']
+    event = events_repo.get(evt_id)
+    if event is None:
+        return jsonify({'success': False, 'message': 'Event not found'}), 404
+    
+    previous, promoted = registration_store.cancel(evt_id, username, event.get('capacity', 0), promoted_at=get_current_timestamp())
+    if previous is None:
+        return jsonify({'success': False, 'message': 'Not registered for this event'}), 400
+    registration_counts.publish(evt_id)
+    Logger.log_activity(username, 'EVENT_REGISTRATION_CANCELLED', 'Event', evt_id, f'Cancelled {previous} place for event {event["title"]}', 'success')
+    if promoted:
+        Logger.log_activity(promoted, 'EVENT_REGISTERED', 'Event', evt_id, f'Promoted from the waitlist for event {event["title"]}', 'success')
+    
+    return jsonify({'success': True, 'message': 'Registration cancelled' if previous == REGISTERED else 'Left the waitlist'})
 
 @app.route('/api/events/<evt_id>/registrations', methods=['GET'])
 @require_auth
 def get_event_registrations(evt_id):
-    """Get event registrations"""
-    events = load_json(EVENTS_FILE)
+    """Page through an event's registrations, or stream them as CSV.
+
+    Query params: status (registered or waitlisted), page_size and cursor
+    (from next_cursor; without either every record is returned), and
+    format=csv (Admin/Faculty) for a streamed download of all of them.
+    """
+    event = events_repo.get(evt_id) or events_archive_repo.get(evt_id)
     
-    if evt_id not in events:
+    if event is None:
         return jsonify({'success': False, 'message': 'Event not found'}), 404
     
-    event = events[evt_id]
-    registrations = event.get('registrations', [])
+    status = request.args.get('status', REGISTERED)
+    if status not in (REGISTERED, WAITLISTED):
+        return jsonify({'success': False, 'message': f"Invalid status '{status}'"}), 400
+    
+    if request.args.get('format') == 'csv':
+        if request.session_data['role'] not in ['Admin', 'Faculty']:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+        return Response(
+            stream_with_context(registrations_csv(evt_id, status)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename=registrations_{secure_filename(evt_id)}_{status}.csv'}
+        )
+    
+    page_size = None
+    if 'page_size' in request.args or 'cursor' in request.args:
+        page_size = max(1, min(request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    try:
+        after = decode_registration_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    registrations, total, last = registration_store.page(evt_id, status, after, page_size)
     
     return jsonify({
         'success': True,
         'registrations': registrations,
-        'total': len(registrations),
-        'capacity': event.get('capacity', 0)
+        'total': total,
+        'next_cursor': encode_registration_cursor(last) if last is not None else None,
+        'capacity': event.get('capacity', 0),
+        'registered_count': event.get('registered_count', 0),
+        'waitlisted_count': event.get('waitlisted_count', 0)
     })
 
+def registrations_csv(evt_id, status):
+    """CSV lines for every registration of one status, a page at a time"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['S.No', 'Student Name', 'Username', 'Section', 'Registered At', 'Status'])
+    for number, reg in enumerate(registration_store.iter_records(evt_id, status), start=1):
+        writer.writerow([number, reg.get('student_name', ''), reg.get('username', ''), reg.get('section', ''), reg.get('registered_at', ''), reg.get('status', status)])
+        if output.tell() >= 64 * 1024:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
 # Timetable Management APIs
+def find_timetable_clashes(entry, start, end, exclude=()):
+    """Classes overlapping [start, end) minutes in any clash dimension of
+    entry, each with the `dimensions` it clashes in (section first)"""
+    found = {}
+    for dimension, group in timetable_clash_groups(entry).items():
+        if group is None:
+            continue
+        for _, _, key, info in timetable_intervals.overlapping(dimension, group, start, end, exclude):
+            found.setdefault(key, dict(info, dimensions=[]))['dimensions'].append(dimension)
+    return list(found.values())
+
+TIMETABLE_CLASH_ERRORS = {
+    'section': ('TT_CLASH_001', "Time clash detected! {class_name} is scheduled from {time}"),
+    'faculty': ('TT_CLASH_002', "Faculty clash detected! {faculty_name} teaches {class_name} (section {section}) from {time}"),
+    'room': ('TT_CLASH_003', "Room clash detected! {classroom} is booked for {class_name} (section {section}) from {time}")
+}
+
+def timetable_clash_response(conflicts):
+    """409 response listing every clash from find_timetable_clashes"""
+    first = min(conflicts, key=lambda clash: TIMETABLE_CLASH_DIMENSIONS.index(clash['dimensions'][0]))
+    error_code, message = TIMETABLE_CLASH_ERRORS[first['dimensions'][0]]
+    more = f" (and {len(conflicts) - 1} more)" if len(conflicts) > 1 else ''
+    return jsonify({
+        'success': False,
+        'message': message.format(**first) + more,
+        'error_code': error_code,
+        'conflicting_class': first['class_name'],
+        'conflicting_time': first['time'],
+        'conflicts': conflicts
+    }), 409
+
 @app.route('/api/timetable/list', methods=['GET'])
 @require_auth
 def list_timetable():
-    """List timetable entries"""
-    timetable = load_json(TIMETABLE_FILE)
+    """List timetable entries (today's finished classes are left out)"""
+    return jsonify({'success': True, 'data': timetable_view.week()})
+
+@app.route('/api/timetable/conflicts', methods=['GET'])
+@require_auth
+def timetable_conflicts():
+    """Every pair of overlapping classes in the week, by section, faculty
+    and room (dimension=<one of them> for just that one)"""
+    if request.session_data['role'] not in ['Admin', 'Faculty']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    dimension = request.args.get('dimension')
+    if dimension and dimension not in TIMETABLE_CLASH_DIMENSIONS:
+        return jsonify({'success': False, 'message': f"Invalid dimension '{dimension}'"}), 400
+    
+    conflicts = []
+    counts = {}
+    for name in [dimension] if dimension else TIMETABLE_CLASH_DIMENSIONS:
+        pairs = timetable_intervals.conflicts(name)
+        counts[name] = len(pairs)
+        conflicts.extend({'dimension': name, 'day': first['day'], 'classes': [first, second]} for _, first, second in pairs)
+    
+    return jsonify({'success': True, 'conflicts': conflicts, 'total': len(conflicts), 'counts': counts})
+
+def existing_timetable_intervals(rows):
+    """{dimension: [(group, start, end, key, info)]} of the existing classes
+    in the clash groups that [(row number, fields, start, end)] touch"""
+    existing = {}
+    for dimension in TIMETABLE_CLASH_DIMENSIONS:
+        groups = {timetable_clash_groups(fields)[dimension] for _, fields, _, _ in rows}
+        groups.discard(None)
+        existing[dimension] = timetable_intervals.intervals(dimension, groups)
+    return existing
+
+def find_batch_timetable_clashes(rows, existing_intervals):
+    """{row number: [clash info]} for [(row number, fields, start, end)] in
+    file order, given existing_timetable_intervals(rows). One sweep per
+    dimension over the batch plus those existing classes finds every
+    overlap; a row then clashes with existing classes and with earlier
+    rows that were kept."""
+    fields_by_row = {number: fields for number, fields, _, _ in rows}
+    existing = {}
+    edges = {}
+    for dimension in TIMETABLE_CLASH_DIMENSIONS:
+        intervals = []
+        for number, fields, start, end in rows:
+            group = timetable_clash_groups(fields)[dimension]
+            if group is not None:
+                intervals.append((group, start, end, ('row', number)))
+        for group, start, end, key, info in existing_intervals[dimension]:
+            intervals.append((group, start, end, ('existing', key)))
+            existing[key] = info
+        for _, first, second in sweep_overlaps(intervals):
+            for this, other in ((first, second), (second, first)):
+                if this[0] == 'row':
+                    edges.setdefault(this[1], []).append((dimension, other))
+    
+    clashes = {}
+    kept = set()
+    for number, _, _, _ in rows:
+        found = {}
+        for dimension, (kind, ref) in edges.get(number, ()):
+            if kind == 'existing':
+                info = existing[ref]
+            elif ref < number and ref in kept:
+                other = fields_by_row[ref]
+                info = {
+                    'row': ref,
+                    'class_name': other['class_name'],
+                    'day': other['day'],
+                    'section': other['section'],
+                    'faculty_name': other['faculty_name'],
+                    'classroom': other['classroom'],
+                    'building': other['building'],
+                    'time': f"{other['start_time_12']} - {other['end_time_12']}"
+                }
+            else:
+                continue
+            found.setdefault(ref, dict(info, dimensions=[]))['dimensions'].append(dimension)
+        if found:
+            clashes[number] = list(found.values())
+        else:
+            kept.add(number)
+    return clashes
+
+def reject_timetable_clashes(rows, clashes, errors):
+    """Rows without clashes; an error for each other row goes to errors"""
+    kept = []
+    for number, fields, start, end in rows:
+        if number in clashes:
+            first = clashes[number][0]
+            errors.append({
+                'row': number,
+                'message': f"Clashes with {first['class_name']} ({first['day']} {first['time']}, {', '.join(first['dimensions'])})",
+                'conflicts': clashes[number]
+            })
+        else:
+            kept.append((number, fields, start, end))
+    return kept
+
+def timetable_import_entries(rows, username):
+    """{entry id: new timetable entry} for validated import rows"""
+    entries = {}
+    for _, fields, _, _ in rows:
+        entry_id = generate_id('TT')
+        while entry_id in entries:
+            entry_id = generate_id('TT')
+        entries[entry_id] = {'id': entry_id, **fields, 'created_at': get_current_timestamp(), 'created_by': username}
+    return entries
+
+@app.route('/api/timetable/import', methods=['POST'])
+@require_auth
+def import_timetable():
+    """Add many classes at once from an uploaded .csv/.xlsx/.json file
+    (form field `file`) or a JSON array of rows.
+
+    Rows are validated one by one; rows that clash with existing classes or
+    with an earlier row of the same batch (section, faculty or room) are
+    rejected, and the rest are written in one go. dry_run=true only
+    reports. Returns per-row errors with sheet row numbers.
+    """
+    if request.session_data['role'] not in ['Admin', 'Faculty']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        rows = read_import_rows(request.files.get('file'), None if request.files.get('file') else request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if not rows:
+        return jsonify({'success': False, 'message': 'No rows to import'}), 400
+    if len(rows) > TIMETABLE_IMPORT_MAX_ROWS:
+        return jsonify({'success': False, 'message': f'At most {TIMETABLE_IMPORT_MAX_ROWS} rows per import'}), 400
+    dry_run = (request.args.get('dry_run') or request.form.get('dry_run') or '').lower() in ('1', 'true', 'yes')
+    
+    errors = []
+    valid = []
+    for number, row in rows:
+        try:
+            valid.append((number, *normalize_timetable_row(row)))
+        except ValueError as e:
+            errors.append({'row': number, 'message': str(e)})
+    
+    # Sweep without the write lock; a real import then re-checks the kept
+    # rows (which no longer clash with each other) against the classes
+    # existing under the lock before writing them
+    username = request.session_data['username']
+    valid = reject_timetable_clashes(valid, find_batch_timetable_clashes(valid, existing_timetable_intervals(valid)), errors)
+    if valid and not dry_run:
+        with timetable_repo.transaction():
+            valid = reject_timetable_clashes(valid, find_batch_timetable_clashes(valid, existing_timetable_intervals(valid)), errors)
+            entries = timetable_import_entries(valid, username)
+            if entries:
+                timetable_repo.put_many(entries)
+    else:
+        entries = timetable_import_entries(valid, username)
     
-    # Filter expired entries
-    for day in DAYS_OF_WEEK:
-        if day in timetable:
-            timetable[day] = [entry for entry in timetable[day] if not is_expired_timetable_entry(entry)]
+    errors.sort(key=lambda error: error['row'])
+    if entries and not dry_run:
+        Logger.log_activity(username, 'TIMETABLE_IMPORTED', 'Timetable', None, f'{len(entries)} classes imported ({len(errors)} rows rejected)', 'success')
     
-    save_json(TIMETABLE_FILE, timetable)
+    return jsonify({
+        'success': True,
+        'message': f"{len(entries)} classes {'valid' if dry_run else 'imported'}, {len(errors)} rows rejected",
+        'dry_run': dry_run,
+        'imported': 0 if dry_run else len(entries),
+        'valid': len(entries),
+        'rejected': len(errors),
+        'errors': errors
+    })
+
+@app.route('/api/timetable/generate', methods=['POST'])
+@require_auth
+def generate_timetable():
+    """Start generating a weekly timetable from subjects, weekly hours,
+    faculty availability, sections and rooms.
+
+    The solve runs in a worker process around the classes already in the
+    timetable; poll /api/timetable/generate/<job_id> for the result and
+    POST its entries to /api/timetable/import to apply them.
+    """
+    if request.session_data['role'] not in ['Admin', 'Faculty']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    return jsonify({'success': True, 'data': timetable})
+    data = request.get_json(silent=True)
+    try:
+        problem = parse_problem(data, timetable_repo.all().values())
+        time_limit = float(data.get('time_limit') or TIMETABLE_GENERATOR_TIME_LIMIT_SECONDS)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if time_limit <= 0:
+        return jsonify({'success': False, 'message': 'time_limit must be positive'}), 400
+    
+    job_id = timetable_generator.submit(problem, time_limit)
+    Logger.log_activity(request.session_data['username'], 'TIMETABLE_GENERATION_STARTED', 'Timetable', job_id, f"{len(problem['sessions'])} sessions to place", 'success')
+    return jsonify({'success': True, 'job_id': job_id, 'sessions': len(problem['sessions'])}), 202
+
+@app.route('/api/timetable/generate/<job_id>', methods=['GET'])
+@require_auth
+def get_generated_timetable(job_id):
+    """Status of a generation job; once finished, the entries (timetable
+    entry fields) and the sessions that could not be placed"""
+    if request.session_data['role'] not in ['Admin', 'Faculty']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    job = timetable_generator.job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify({'success': True, 'job_id': job_id, **job})
 
 @app.route('/api/timetable/add', methods=['POST'])
 @require_auth
@@ -1543,43 +2040,44 @@ def add_timetable_entry():
     except:
         return jsonify({'success': False, 'message': 'Invalid time format'}), 400
     
-    timetable = load_json(TIMETABLE_FILE)
-    
-    # Check for time clash (only for same section)
-    clash = check_time_clash(day, start_time_12, end_time_12, timetable, section=section)
-    if clash:
-        return jsonify({
-            'success': False,
-            'message': f"Time clash detected! {clash['conflicting_class']} is scheduled from {clash['conflicting_time']}",
-            'error_code': 'TT_CLASH_001',
-            'conflicting_class': clash['conflicting_class'],
-            'conflicting_time': clash['conflicting_time']
-        }), 409
-    
-    entry_id = generate_id('TT')
-    entry = {
-        "id": entry_id,
-        "day": day,
-        "section": section,
-        "start_time": start_24,
-        "start_time_12": start_time_12,
-        "end_time": end_24,
-        "end_time_12": end_time_12,
-        "class_name": sanitize_input(class_name),
-        "faculty_name": sanitize_input(faculty_name),
-        "subject": sanitize_input(subject),
-        "topic_covered": sanitize_input(data.get('topic_covered', '').strip()),
-        "classroom": sanitize_input(data.get('classroom', '').strip()),
-        "building": sanitize_input(data.get('building', '').strip()),
-        "created_at": get_current_timestamp(),
-        "created_by": request.session_data['username']
+    # Check for time clashes in the section and for the faculty and room
+    # before taking the write lock, then again under it
+    clash_entry = {
+        'day': day,
+        'section': section,
+        'faculty_name': sanitize_input(faculty_name),
+        'classroom': sanitize_input(data.get('classroom', '').strip()),
+        'building': sanitize_input(data.get('building', '').strip())
     }
-    
-    if day not in timetable:
-        timetable[day] = []
-    timetable[day].append(entry)
-    
-    save_json(TIMETABLE_FILE, timetable)
+    clashes = find_timetable_clashes(clash_entry, start_total, end_total)
+    if clashes:
+        return timetable_clash_response(clashes)
+    
+    with timetable_repo.transaction():
+        clashes = find_timetable_clashes(clash_entry, start_total, end_total)
+        if clashes:
+            return timetable_clash_response(clashes)
+        
+        entry_id = generate_id('TT')
+        entry = {
+            "id": entry_id,
+            "day": day,
+            "section": section,
+            "start_time": start_24,
+            "start_time_12": start_time_12,
+            "end_time": end_24,
+            "end_time_12": end_time_12,
+            "class_name": sanitize_input(class_name),
+            "faculty_name": sanitize_input(faculty_name),
+            "subject": sanitize_input(subject),
+            "topic_covered": sanitize_input(data.get('topic_covered', '').strip()),
+            "classroom": sanitize_input(data.get('classroom', '').strip()),
+            "building": sanitize_input(data.get('building', '').strip()),
+            "created_at": get_current_timestamp(),
+            "created_by": request.session_data['username']
+        }
+        
+        timetable_repo.put(entry_id, entry)
     Logger.log_activity(request.session_data['username'], 'TIMETABLE_ADDED', 'Timetable', entry_id, f'Class {class_name} added to {day} for section {section}', 'success')
     
     return jsonify({
@@ -1602,51 +2100,24 @@ def delete_timetable_entry(entry_id):
     if request.session_data['role'] not in ['Admin', 'Faculty']:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    timetable = load_json(TIMETABLE_FILE)
+    with timetable_repo.transaction():
+        entry = timetable_repo.get(entry_id)
+        if entry is not None:
+            timetable_repo.delete(entry_id)
     
-    for day in DAYS_OF_WEEK:
-        if day in timetable:
-            for i, entry in enumerate(timetable[day]):
-                if entry.get('id') == entry_id:
-                    class_name = entry.get('class_name')
-                    timetable[day].pop(i)
-                    save_json(TIMETABLE_FILE, timetable)
-                    Logger.log_activity(request.session_data['username'], 'TIMETABLE_DELETED', 'Timetable', entry_id, f'Class {class_name} deleted', 'success')
-                    return jsonify({'success': True, 'message': 'Class deleted successfully'})
+    if entry is not None:
+        class_name = entry.get('class_name')
+        Logger.log_activity(request.session_data['username'], 'TIMETABLE_DELETED', 'Timetable', entry_id, f'Class {class_name} deleted', 'success')
+        return jsonify({'success': True, 'message': 'Class deleted successfully'})
     
     return jsonify({'success': False, 'message': 'Timetable entry not found'}), 404
 
 
-@app.route('/api/timetable/<entry_id>', methods=['PUT'])
-@require_auth
-def update_timetable_entry(entry_id):
-    """Update timetable entry (Admin and Faculty)"""
-    # Allow Admin and Faculty (Academics) to update timetable entries
-    if request.session_data['role'] not in ['Admin', 'Faculty']:
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
-
-    data = request.json or {}
-
-    timetable = load_json(TIMETABLE_FILE)
-
-    # Find existing entry
-    found = None
-    found_day = None
-    for day in DAYS_OF_WEEK:
-        if day in timetable:
-            for entry in timetable[day]:
-                if entry.get('id') == entry_id:
-                    found = entry
-                    found_day = day
-                    break
-        if found:
-            break
-
-    if not found:
-        return jsonify({'success': False, 'message': 'Timetable entry not found'}), 404
-
+def updated_timetable_entry(found, data):
+    """(entry, start minutes, end minutes) for found with the fields in data
+    applied (others fall back to found); ValueError on invalid input"""
     # Prepare updated values (fall back to existing)
-    day = data.get('day', found.get('day', found_day)).strip()
+    day = data.get('day', found.get('day')).strip()
     start_time = data.get('start_time', found.get('start_time', '')).strip()
     end_time = data.get('end_time', found.get('end_time', '')).strip()
     class_name = data.get('class_name', found.get('class_name', '')).strip()
@@ -1656,10 +2127,10 @@ def update_timetable_entry(entry_id):
 
     # Validation
     if not all([day, start_time, end_time, class_name, faculty_name, subject, section]):
-        return jsonify({'success': False, 'message': 'All required fields including section must be provided'}), 400
+        raise ValueError('All required fields including section must be provided')
 
     if day not in DAYS_OF_WEEK:
-        return jsonify({'success': False, 'message': 'Invalid day'}), 400
+        raise ValueError('Invalid day')
 
     # Convert times
     start_time_12 = convert_24_to_12(start_time) if ':' in start_time and ('AM' not in start_time and 'PM' not in start_time) else start_time
@@ -1674,69 +2145,105 @@ def update_timetable_entry(entry_id):
         end_hour, end_min = map(int, end_24.split(':'))
         start_total = start_hour * 60 + start_min
         end_total = end_hour * 60 + end_min
-
-        if end_total <= start_total:
-            return jsonify({'success': False, 'message': 'End time must be after start time'}), 400
     except:
-        return jsonify({'success': False, 'message': 'Invalid time format'}), 400
+        raise ValueError('Invalid time format')
+    if end_total <= start_total:
+        raise ValueError('End time must be after start time')
+
+    entry = dict(found)
+    entry['day'] = day
+    entry['section'] = section
+    entry['start_time'] = start_24
+    entry['start_time_12'] = start_time_12
+    entry['end_time'] = end_24
+    entry['end_time_12'] = end_time_12
+    entry['class_name'] = sanitize_input(class_name)
+    entry['faculty_name'] = sanitize_input(faculty_name)
+    entry['subject'] = sanitize_input(subject)
+    entry['topic_covered'] = sanitize_input(data.get('topic_covered', found.get('topic_covered', '')).strip())
+    entry['classroom'] = sanitize_input(data.get('classroom', found.get('classroom', '')).strip())
+    entry['building'] = sanitize_input(data.get('building', found.get('building', '')).strip())
+    return entry, start_total, end_total
 
-    # Check for time clash (exclude current entry by id)
-    clash = check_time_clash(day, start_time_12, end_time_12, timetable, exclude_id=entry_id, section=section)
-    if clash:
-        return jsonify({
-            'success': False,
-            'message': f"Time clash detected! {clash['conflicting_class']} is scheduled from {clash['conflicting_time']}",
-            'error_code': 'TT_CLASH_001',
-            'conflicting_class': clash['conflicting_class'],
-            'conflicting_time': clash['conflicting_time']
-        }), 409
-
-    # Apply updates
-    found['day'] = day
-    found['section'] = section
-    found['start_time'] = start_24
-    found['start_time_12'] = start_time_12
-    found['end_time'] = end_24
-    found['end_time_12'] = end_time_12
-    found['class_name'] = sanitize_input(class_name)
-    found['faculty_name'] = sanitize_input(faculty_name)
-    found['subject'] = sanitize_input(subject)
-    found['topic_covered'] = sanitize_input(data.get('topic_covered', found.get('topic_covered', '')).strip())
-    found['classroom'] = sanitize_input(data.get('classroom', found.get('classroom', '')).strip())
-    found['building'] = sanitize_input(data.get('building', found.get('building', '')).strip())
-    found['updated_at'] = get_current_timestamp()
-
-    # If day changed, move entry between day lists
-    if found_day != day:
-        # remove from old day
-        timetable[found_day] = [e for e in timetable.get(found_day, []) if e.get('id') != entry_id]
-        if day not in timetable:
-            timetable[day] = []
-        timetable[day].append(found)
-
-    save_json(TIMETABLE_FILE, timetable)
-    Logger.log_activity(request.session_data['username'], 'TIMETABLE_UPDATED', 'Timetable', entry_id, f'Class {found.get("class_name")} updated', 'success')
-
-    return jsonify({'success': True, 'message': 'Timetable entry updated', 'timetable_entry': found})
+@app.route('/api/timetable/<entry_id>', methods=['PUT'])
+@require_auth
+def update_timetable_entry(entry_id):
+    """Update timetable entry (Admin and Faculty)"""
+    # Allow Admin and Faculty (Academics) to update timetable entries
+    if request.session_data['role'] not in ['Admin', 'Faculty']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    data = request.json or {}
+
+    # Validate and check for time clashes (exclude current entry by id)
+    # before taking the write lock, then again on the entry re-read under it
+    found = timetable_repo.get(entry_id)
+    if not found:
+        return jsonify({'success': False, 'message': 'Timetable entry not found'}), 404
+    try:
+        entry, start_total, end_total = updated_timetable_entry(found, data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    clashes = find_timetable_clashes(entry, start_total, end_total, exclude={entry_id})
+    if clashes:
+        return timetable_clash_response(clashes)
+
+    with timetable_repo.transaction():
+        found = timetable_repo.get(entry_id)
+        if not found:
+            return jsonify({'success': False, 'message': 'Timetable entry not found'}), 404
+        try:
+            entry, start_total, end_total = updated_timetable_entry(found, data)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        clashes = find_timetable_clashes(entry, start_total, end_total, exclude={entry_id})
+        if clashes:
+            return timetable_clash_response(clashes)
+
+        entry['updated_at'] = get_current_timestamp()
+        # If day changed, move entry to the end of the new day's list
+        if found.get('day') != entry['day']:
+            timetable_repo.delete(entry_id)
+        timetable_repo.put(entry_id, entry)
+    Logger.log_activity(request.session_data['username'], 'TIMETABLE_UPDATED', 'Timetable', entry_id, f'Class {entry.get("class_name")} updated', 'success')
+
+    return jsonify({'success': True, 'message': 'Timetable entry updated', 'timetable_entry': entry})
 
 # Activity Log APIs
 @app.route('/api/activities/list', methods=['GET'])
 @require_auth
 def list_activities():
-    """List activity logs (excluding login/logout/theme changes)"""
+    """List activity logs, newest first (login/logout/theme changes hidden by default)
+
+    Query params: limit, cursor (from next_cursor), user, action and
+    exclude_action (repeatable or comma-separated), entity_type, entity_id,
+    since, until (ISO timestamp or YYYY-MM-DD).
+    """
     if request.session_data['role'] != 'Admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    limit = request.args.get('limit', 100, type=int)
-    activities = Logger.get_activities(limit=limit)
+    def list_arg(name):
+        return [value.strip() for raw in request.args.getlist(name) for value in raw.split(',') if value.strip()]
     
-    # Filter out login, logout, and theme changes
-    filtered_activities = [
-        a for a in activities 
-        if a.get('action') not in ['USER_LOGIN', 'USER_LOGOUT', 'THEME_CHANGED', 'LOGIN_ATTEMPT']
-    ]
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    exclude_actions = list_arg('exclude_action') if 'exclude_action' in request.args else HIDDEN_ACTIVITY_ACTIONS
     
-    return jsonify({'success': True, 'data': filtered_activities, 'total': len(filtered_activities)})
+    try:
+        activities, next_cursor = Logger.query_activities(
+            users=list_arg('user') or None,
+            actions=list_arg('action') or None,
+            exclude_actions=exclude_actions,
+            entity_type=request.args.get('entity_type') or None,
+            entity_id=request.args.get('entity_id') or None,
+            since=request.args.get('since') or None,
+            until=request.args.get('until') or None,
+            cursor=request.args.get('cursor') or None,
+            limit=limit
+        )
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+    
+    return jsonify({'success': True, 'data': activities, 'total': len(activities), 'next_cursor': next_cursor})
 
 # Dashboard APIs
 @app.route('/api/dashboard/stats', methods=['GET'])
@@ -1745,31 +2252,45 @@ def dashboard_stats():
     """Get dashboard statistics"""
     role = request.session_data['role']
     
-    users = load_json(USERS_FILE)
-    academics = load_json(ACADEMICS_FILE)
-    students = load_json(STUDENTS_FILE)
-    events = load_json(EVENTS_FILE)
-    timetable = load_json(TIMETABLE_FILE)
-    
     stats = {
-        'total_users': len(users),
-        'total_academics': len([a for a in academics.values() if a.get('status') == 'active']),
-        'total_students': len([s for s in students.values() if s.get('status') == 'active']),
-        'total_events': len([e for e in events.values() if e.get('status') == 'active']),
-        'active_sessions': len(active_sessions)
+        'total_users': users_repo.count(),
+        'total_academics': academics_repo.count(status='active'),
+        'total_students': students_repo.count(status='active'),
+        'total_events': events_repo.count(status='active'),
+        'active_sessions': session_store.count_active()
     }
     
     # Today's classes
     today = datetime.now().strftime("%A")
-    today_classes = []
-    if today in timetable:
-        for entry in timetable[today]:
-            if not is_expired_timetable_entry(entry):
-                today_classes.append(entry)
-    stats['today_classes'] = len(today_classes)
+    stats['today_classes'] = len(timetable_view.week().get(today, []))
     
     return jsonify({'success': True, 'stats': stats})
 
+# Search API
+@app.route('/api/search', methods=['GET'])
+@require_auth
+def search():
+    """Ranked typeahead hits for q across the types the caller may see.
+
+    Query params: q, types (comma separated subset), limit (default 10, max 50)
+    """
+    query = request.args.get('q', '').strip()
+    allowed = SEARCH_TYPES_BY_ROLE.get(request.session_data['role'], ())
+    types = [t for t in request.args.get('types', ','.join(allowed)).split(',') if t]
+    unknown = [t for t in types if t not in search_indexes]
+    if unknown:
+        return jsonify({'success': False, 'message': f"Invalid type '{unknown[0]}'"}), 400
+    types = [t for t in types if t in allowed]
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    
+    hits = []
+    for entity in types:
+        for score, key, hit in search_indexes[entity].search(query, limit):
+            hits.append({'type': entity, 'id': key, 'score': score, **hit})
+    hits.sort(key=lambda hit: -hit['score'])
+    
+    return jsonify({'success': True, 'query': query, 'data': hits[:limit]})
+
 # Data Management APIs (Admin Only)
 @app.route('/api/data/clear', methods=['POST'])
 @require_auth
@@ -1786,38 +2307,26 @@ def clear_data():
     
     if clear_type == 'all':
         # Clear all data except admin user
-        academics = {}
-        save_json(ACADEMICS_FILE, academics)
+        academics_repo.replace_all({})
         cleared.append('academics')
         
-        students = {}
-        save_json(STUDENTS_FILE, students)
+        students_repo.replace_all({})
         cleared.append('students')
         
-        events = {}
-        save_json(EVENTS_FILE, events)
+        events_repo.replace_all({})
+        events_archive_repo.replace_all({})
+        registration_store.clear()
         cleared.append('events')
         
-        timetable = {
-            "Monday": [],
-            "Tuesday": [],
-            "Wednesday": [],
-            "Thursday": [],
-            "Friday": [],
-            "Saturday": []
-        }
-        save_json(TIMETABLE_FILE, timetable)
+        timetable_repo.replace_all({})
         cleared.append('timetable')
         
-        activities = []
-        save_json(ACTIVITIES_FILE, activities)
+        Logger.clear_activities()
         cleared.append('activities')
         
         # Clear users except admin
-        users = load_json(USERS_FILE)
-        admin_user = users.get('ADMIN', {})
-        users = {'ADMIN': admin_user}
-        save_json(USERS_FILE, users)
+        admin_user = users_repo.get('ADMIN') or {}
+        users_repo.replace_all({'ADMIN': admin_user})
         cleared.append('users')
         
         Logger.log_activity(request.session_data['username'], 'DATA_CLEARED', 'System', None, 'All data cleared', 'success')
@@ -1828,31 +2337,29 @@ def clear_data():
             return jsonify({'success': False, 'message': 'Sections required for partial clear'}), 400
         
         # Clear students by section
-        students = load_json(STUDENTS_FILE)
         students_to_remove = []
-        for stu_id, stu_data in students.items():
+        users_to_remove = []
+        for stu_id, stu_data in students_repo.all().items():
             if stu_data.get('section', '').upper() in [s.upper() for s in sections]:
                 students_to_remove.append(stu_id)
                 # Also remove user account
                 login_id = stu_data.get('login_id')
                 if login_id:
-                    users = load_json(USERS_FILE)
-                    if login_id in users:
-                        del users[login_id]
-                    save_json(USERS_FILE, users)
+                    users_to_remove.append(login_id)
         
-        for stu_id in students_to_remove:
-            del students[stu_id]
-        save_json(STUDENTS_FILE, students)
+        with students_repo.transaction(), users_repo.transaction():
+            students_repo.delete_many(students_to_remove)
+            users_repo.delete_many(users_to_remove)
+        login_state.forget(users_to_remove)
         if students_to_remove:
             cleared.append(f'students (sections: {", ".join(sections)})')
         
         # Clear timetable entries by section
-        timetable = load_json(TIMETABLE_FILE)
-        for day in DAYS_OF_WEEK:
-            if day in timetable:
-                timetable[day] = [e for e in timetable[day] if e.get('section', '').upper() not in [s.upper() for s in sections]]
-        save_json(TIMETABLE_FILE, timetable)
+        timetable_to_remove = [
+            entry_id for entry_id, e in timetable_repo.all().items()
+            if e.get('section', '').upper() in [s.upper() for s in sections]
+        ]
+        timetable_repo.delete_many(timetable_to_remove)
         cleared.append(f'timetable (sections: {", ".join(sections)})')
         
         Logger.log_activity(request.session_data['username'], 'DATA_CLEARED', 'System', None, f'Partial data cleared for sections: {", ".join(sections)}', 'success')
@@ -1869,13 +2376,12 @@ def clear_data():
 def manage_theme():
     """Get or update user theme preference"""
     username = request.session_data['username']
-    users = load_json(USERS_FILE)
-    
-    if username not in users:
-        return jsonify({'success': False, 'message': 'User not found'}), 404
     
     if request.method == 'GET':
-        theme = users[username].get('theme', 'light')
+        user = users_repo.get(username)
+        if user is None:
+            return jsonify({'success': False, 'message': 'User not found'}), 404
+        theme = user.get('theme', 'light')
         return jsonify({'success': True, 'theme': theme})
     
     # PUT - Update theme
@@ -1885,9 +2391,13 @@ def manage_theme():
     if theme not in ['light', 'dark']:
         return jsonify({'success': False, 'message': 'Invalid theme. Use "light" or "dark"'}), 400
     
-    users[username]['theme'] = theme
-    users[username]['updated_at'] = get_current_timestamp()
-    save_json(USERS_FILE, users)
+    with users_repo.transaction():
+        user = users_repo.get(username)
+        if user is None:
+            return jsonify({'success': False, 'message': 'User not found'}), 404
+        user['theme'] = theme
+        user['updated_at'] = get_current_timestamp()
+        users_repo.put(username, user)
     
     # Don't log theme changes
     # Logger.log_activity(username, 'THEME_CHANGED', 'User', username, f'Theme changed to {theme}', 'success')
@@ -1905,9 +2415,8 @@ def export_data(data_type):
     export_format = request.args.get('format', 'csv')  # csv or pdf
     
     if data_type == 'academics':
-        academics = load_json(ACADEMICS_FILE)
         data = []
-        for acad_id, acad_data in academics.items():
+        for acad_id, acad_data in academics_repo.all().items():
             data.append({
                 'ID': acad_id,
                 'Name': acad_data.get('name', ''),
@@ -1923,9 +2432,8 @@ def export_data(data_type):
         filename = 'academics'
         
     elif data_type == 'students':
-        students = load_json(STUDENTS_FILE)
         data = []
-        for stu_id, stu_data in students.items():
+        for stu_id, stu_data in students_repo.all().items():
             data.append({
                 'ID': stu_id,
                 'Student Name': stu_data.get('student_name', ''),
@@ -1945,7 +2453,7 @@ def export_data(data_type):
         filename = 'students'
         
     elif data_type == 'timetable':
-        timetable = load_json(TIMETABLE_FILE)
+        timetable = timetable_repo.week()
         data = []
         for day in DAYS_OF_WEEK:
             if day in timetable:
@@ -1965,9 +2473,8 @@ def export_data(data_type):
         filename = 'timetable'
         
     elif data_type == 'activities':
-        activities = Logger.get_activities(limit=10000)
-        # Filter out login/logout/theme
-        activities = [a for a in activities if a.get('action') not in ['USER_LOGIN', 'USER_LOGOUT', 'THEME_CHANGED', 'LOGIN_ATTEMPT']]
+        # Login/logout/theme changes are left out
+        activities, _ = Logger.query_activities(exclude_actions=HIDDEN_ACTIVITY_ACTIONS, limit=10000)
         data = []
         for act in activities:
             data.append({
@@ -1982,9 +2489,9 @@ def export_data(data_type):
         filename = 'activities'
         
     elif data_type == 'users':
-        users = load_json(USERS_FILE)
         data = []
-        for username, user_data in users.items():
+        for username, user_data in users_repo.all().items():
+            activity = login_state.get(username)
             data.append({
                 'Username': username,
                 'Role': user_data.get('role', ''),
@@ -1992,8 +2499,8 @@ def export_data(data_type):
                 'Email': user_data.get('profile', {}).get('email', ''),
                 'Profile Completed': 'Yes' if user_data.get('profile_completed', False) else 'No',
                 'Registration ID': user_data.get('registration_id', ''),
-                'Last Login': user_data.get('last_login', ''),
-                'Login Count': user_data.get('login_count', 0)
+                'Last Login': activity['last_login'] or '',
+                'Login Count': activity['login_count']
             })
         filename = 'users'
         
@@ -2038,7 +2545,6 @@ def create_backup():
     if request.session_data['role'] != 'Admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    import shutil
     from datetime import datetime
     
     backup_dir = os.path.join(DATA_DIR, 'backups')
@@ -2048,21 +2554,11 @@ def create_backup():
     backup_folder = os.path.join(backup_dir, f'backup_{timestamp}')
     os.makedirs(backup_folder, exist_ok=True)
     
-    # Copy all JSON files
-    files_to_backup = [
-        ('users.json', USERS_FILE),
-        ('academics.json', ACADEMICS_FILE),
-        ('students.json', STUDENTS_FILE),
-        ('events.json', EVENTS_FILE),
-        ('timetable.json', TIMETABLE_FILE),
-        ('activities.json', ACTIVITIES_FILE)
-    ]
-    
-    backed_up = []
-    for filename, filepath in files_to_backup:
-        if os.path.exists(filepath):
-            shutil.copy2(filepath, os.path.join(backup_folder, filename))
-            backed_up.append(filename)
+    # Copy entity stores (JSON files or SQLite database) plus the activity log
+    backed_up = backup_storage(backup_folder)
+    backed_up.extend(Logger.backup_activities(backup_folder))
+    backed_up.extend(login_state.backup_to(backup_folder))
+    backed_up.extend(registration_store.backup_to(backup_folder))
     
     Logger.log_activity(request.session_data['username'], 'BACKUP_CREATED', 'System', None, f'Backup created: backup_{timestamp}', 'success')
     
@@ -2073,6 +2569,51 @@ def create_backup():
         'files': backed_up
     })
 
+@app.route('/api/system/stats', methods=['GET'])
+@require_auth
+def system_stats():
+    """Storage cache, lock-wait and activity queue metrics for this worker (Admin only)"""
+    if request.session_data['role'] != 'Admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'json_cache': get_json_cache_stats(),
+        'locks': lock_manager.stats(),
+        'activity_queue': Logger.activity_queue_stats(),
+        'login_state': login_state.stats(),
+        'registration_counts': registration_counts.stats(),
+        'indexes': {
+            'users': user_index.stats(),
+            'events_calendar': events_calendar.stats(),
+            'archived_events_calendar': archived_events_calendar.stats(),
+            'timetable_intervals': timetable_intervals.stats(),
+            'timetable_view': timetable_view.stats(),
+            **{f'search_{name}': index.stats() for name, index in search_indexes.items()}
+        },
+        'password_hasher': password_hasher.stats()
+    })
+
+@app.errorhandler(LockTimeout)
+def handle_lock_timeout(error):
+    """Data files stayed locked by another request/worker for too long"""
+    Logger.log_error(f'Lock timeout: {error}')
+    return jsonify({
+        'success': False,
+        'message': 'The server is busy. Please try again.'
+    }), 503
+
+@app.errorhandler(PasswordHasherBusy)
+def handle_password_hasher_busy(error):
+    """Every password hashing slot is taken; shed load instead of queueing"""
+    response = jsonify({
+        'success': False,
+        'message': 'The server is busy. Please try again.'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # Global error handler for unexpected exceptions
 @app.errorhandler(Exception)
 def handle_exception(error):
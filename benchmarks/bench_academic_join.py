@@ -0,0 +1,76 @@
+"""
+Benchmark for the academics -> Faculty username join
+Compares the old nested scan in list_academics with the UserIndex lookup
+at 2k faculty / 50k users
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import UserIndex
+from repository import JsonRepository
+
+
+def make_data(faculty, users):
+    academics = {f"ACM_{i:06d}": {"id": f"ACM_{i:06d}", "name": f"Prof {i}"} for i in range(faculty)}
+    records = []
+    for i in range(users):
+        if i < faculty:
+            records.append((f"prof.{i}", {"id": f"ACM_{i:06d}", "role": "Faculty"}))
+        else:
+            records.append((f"student.{i}", {"id": f"STU_{i:06d}", "role": "Student"}))
+    random.Random(1).shuffle(records)  # accounts are created interleaved
+    return academics, dict(records)
+
+
+def scan_join(academics, users):
+    # list_academics before: every user checked for every academic
+    result = {}
+    for acad_id in academics:
+        username = None
+        for uname, user_data in users.items():
+            if user_data.get('role') == 'Faculty' and user_data.get('id') == acad_id:
+                username = uname
+                break
+        result[acad_id] = username
+    return result
+
+
+def timed(func):
+    started = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    faculty = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    academics, records = make_data(faculty, users)
+    workdir = tempfile.mkdtemp()
+    try:
+        repo = JsonRepository('users', os.path.join(workdir, 'users.json'))
+        repo.replace_all(records)
+        index = UserIndex(repo)
+        all_users = repo.all()
+
+        expected, scan_seconds = timed(lambda: scan_join(academics, all_users))
+        cold, cold_seconds = timed(lambda: index.usernames_for_ids(academics, role='Faculty'))
+        warm, warm_seconds = timed(lambda: index.usernames_for_ids(academics, role='Faculty'))
+        assert cold == warm == {k: v for k, v in expected.items() if v is not None}
+
+        repo.put('prof.new', {"id": "ACM_999999", "role": "Faculty"})
+        _, after_write_seconds = timed(lambda: index.usernames_for_ids(academics, role='Faculty'))
+
+        print(f"{faculty} academics, {users} users")
+        print(f"  nested scan (before)        {scan_seconds * 1000:>10.1f} ms")
+        print(f"  index, first call (build)   {cold_seconds * 1000:>10.1f} ms")
+        print(f"  index, warm                 {warm_seconds * 1000:>10.1f} ms")
+        print(f"  index, after one user write {after_write_seconds * 1000:>10.1f} ms  {index.stats()}")
+    finally:
+        shutil.rmtree(workdir)
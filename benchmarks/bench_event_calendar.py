@@ -0,0 +1,75 @@
+"""
+Benchmark for event calendar queries
+Fills the events collection with one to twenty years of events and times
+a month view through DateIndex against building and sorting every event
+(what list_events did), plus the hot-set month view once past events are
+archived
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import DateIndex
+from repository import JsonRepository
+
+EVENTS_PER_DAY = 8
+
+
+def make_events(years, today):
+    rng = random.Random(1)
+    events = {}
+    for day in range(-365 * years, 180):
+        when = (today + timedelta(days=day)).isoformat()
+        for n in range(EVENTS_PER_DAY):
+            key = f"EVT_{day + 365 * years:06d}{n}"
+            events[key] = {'title': f"Event {key}", 'date': when, 'time': f"{rng.randint(8, 20):02d}:00", 'status': 'active'}
+    return events
+
+
+def scan_month(events, month):
+    rows = sorted(((event['date'], event['time'], key) for key, event in events.items()))
+    return [key for event_date, _, key in rows if event_date.startswith(month)]
+
+
+def timed(func, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return value, samples[len(samples) // 2]
+
+
+if __name__ == '__main__':
+    today = date.today()
+    month = (today + timedelta(days=31)).isoformat()[:7]
+    print(f"{EVENTS_PER_DAY} events/day, month view {month}")
+    print(f"  {'years':>5}{'events':>9}{'index':>11}{'scan+sort':>12}{'hot set':>10}")
+    for years in (1, 5, 20):
+        events = make_events(years, today)
+        workdir = tempfile.mkdtemp()
+        try:
+            repo = JsonRepository('events', os.path.join(workdir, 'events.json'))
+            repo.replace_all(events)
+            index = DateIndex(repo, then='time')
+            index.count()  # build
+            keys, index_seconds = timed(lambda: [key for _, _, key in index.span(month, month)])
+            expected, scan_seconds = timed(lambda: scan_month(events, month), repeat=1)
+            assert keys == expected
+
+            cutoff = (today - timedelta(days=30)).isoformat()
+            repo.delete_many(index.keys_before(cutoff))
+            hot_keys, hot_seconds = timed(lambda: [key for _, _, key in index.span(month, month)])
+            assert hot_keys == expected
+            print(f"  {years:>5}{len(events):>9}{index_seconds * 1000:>9.3f}ms{scan_seconds * 1000:>10.1f}ms{hot_seconds * 1000:>8.3f}ms"
+                  f"  ({len(keys)} events, hot set {repo.count()})")
+        finally:
+            shutil.rmtree(workdir)
@@ -0,0 +1,128 @@
+"""
+Load test for event registration
+Several worker processes with many threads each sign up hundreds of
+students for one event at the same moment (every student twice), then
+checks that exactly `capacity` got seats, the rest are waitlisted in a
+single queue and nobody is in twice. Runs the JSON and SQLite
+registration stores, and the old read-modify-write of the event record
+for comparison.
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registrations import JsonRegistrationStore, SqliteRegistrationStore, REGISTERED, DUPLICATE, FULL
+from repository import JournaledJsonRepository
+
+EVENT_ID = 'EVT_LOADTEST'
+
+
+class EmbeddedListStore:
+    """register_event before: registrations inside the event record,
+    checked and rewritten under the events transaction"""
+
+    def __init__(self, path):
+        self.repo = JournaledJsonRepository('events', path)
+
+    def register(self, event_id, username, capacity, details, waitlist=False):
+        with self.repo.transaction():
+            event = self.repo.get(event_id) or {'registrations': []}
+            if any(reg['username'] == username for reg in event['registrations']):
+                return DUPLICATE, None
+            if len(event['registrations']) >= capacity:
+                return FULL, None
+            event['registrations'].append(dict(details, username=username))
+            self.repo.put(event_id, event)
+            return REGISTERED, None
+
+    def registrations(self, event_id):
+        return (self.repo.get(event_id) or {'registrations': []})['registrations']
+
+    def waitlist(self, event_id):
+        return []
+
+
+def make_store(kind, workdir):
+    if kind == 'json':
+        return JsonRegistrationStore(workdir)
+    if kind == 'sqlite':
+        return SqliteRegistrationStore(os.path.join(workdir, 'eduportal.db'))
+    return EmbeddedListStore(os.path.join(workdir, 'events.json'))
+
+
+def worker(kind, workdir, usernames, capacity, start, results):
+    store = make_store(kind, workdir)  # per process, like a gunicorn worker
+    outcomes = []
+    lock = threading.Lock()
+
+    def client(username):
+        start.wait()
+        for attempt in range(2):
+            status, _ = store.register(EVENT_ID, username, capacity, {'student_name': username, 'section': 'A'}, waitlist=True)
+            with lock:
+                outcomes.append((username, attempt, status))
+
+    threads = [threading.Thread(target=client, args=(name,)) for name in usernames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(outcomes)
+
+
+def run(kind, processes, threads, capacity):
+    workdir = tempfile.mkdtemp()
+    try:
+        context = multiprocessing.get_context('fork')
+        start = context.Event()
+        results = context.Queue()
+        names = [f"student.{p}.{t}" for p in range(processes) for t in range(threads)]
+        procs = [
+            context.Process(target=worker, args=(kind, workdir, names[p * threads:(p + 1) * threads], capacity, start, results))
+            for p in range(processes)
+        ]
+        for proc in procs:
+            proc.start()
+        time.sleep(0.5)  # let every thread reach start.wait()
+        started = time.perf_counter()
+        start.set()
+        outcomes = [outcome for _ in procs for outcome in results.get()]
+        elapsed = time.perf_counter() - started
+        for proc in procs:
+            proc.join()
+
+        store = make_store(kind, workdir)
+        registered = [reg['username'] for reg in store.registrations(EVENT_ID)]
+        waiting = [reg['username'] for reg in store.waitlist(EVENT_ID)]
+        first = {name: status for name, attempt, status in outcomes if attempt == 0}
+        second = {name: status for name, attempt, status in outcomes if attempt == 1}
+        got_seat = sorted(name for name, status in first.items() if status == REGISTERED)
+
+        assert len(registered) == len(set(registered)) <= capacity, 'overbooked or duplicated'
+        assert not set(registered) & set(waiting), 'registered and waitlisted'
+        assert sorted(registered) == got_seat, 'lost or phantom registrations'
+        assert all(second[name] == (FULL if status == FULL else DUPLICATE) for name, status in first.items()), 'second attempt not rejected'
+        if kind != 'embedded':
+            assert len(registered) == min(capacity, len(names)), 'seats left empty'
+            assert len(registered) + len(waiting) == len(names), 'lost waitlist entries'
+        print(f"  {kind:<9} {len(outcomes) / elapsed:>8.0f} attempts/sec  registered={len(registered)}/{capacity}  "
+              f"waitlisted={len(waiting)}  full={sum(s == FULL for s in first.values())}  duplicates rejected={sum(s == DUPLICATE for s in second.values())}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    capacity = int(sys.argv[3]) if len(sys.argv) > 3 else 150
+    print(f"{processes} processes x {threads} threads = {processes * threads} registrants, capacity {capacity}, 2 attempts each")
+    for kind in ('json', 'sqlite', 'embedded'):
+        run(kind, processes, threads, capacity)
+    print("all checks passed: no overbooking, no duplicates, no lost sign-ups")
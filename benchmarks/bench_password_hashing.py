@@ -0,0 +1,69 @@
+"""
+Benchmark for password hashing
+Reports logins/sec and latency for several PBKDF2 iteration counts, with
+concurrent clients verifying passwords through the PasswordHasher pool,
+plus how many attempts were shed with PasswordHasherBusy
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher, PasswordHasherBusy
+
+ITERATIONS = (50000, 100000, 200000, 400000)
+
+
+def run(iterations, clients, duration, max_pending):
+    hasher = PasswordHasher(iterations=iterations, max_pending=max_pending)
+    stored = hasher.hash('correct horse')  # also starts the pool
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        mine = []
+        shed = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                assert hasher.verify('correct horse', stored)
+                mine.append(time.perf_counter() - started)
+            except PasswordHasherBusy:
+                shed += 1
+                time.sleep(0.001)
+        with lock:
+            latencies.extend(mine)
+            rejected[0] += shed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    hasher.close()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+    print(f"  iterations={iterations:>7}  logins/sec={len(latencies) / elapsed:>8.1f}  "
+          f"p50={p50 * 1000:>7.1f} ms  p95={p95 * 1000:>7.1f} ms  rejected(503)={rejected[0]}")
+
+
+if __name__ == '__main__':
+    workers = os.cpu_count() or 1
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else workers * 4
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    print(f"{workers} pool workers, {clients} concurrent clients, {duration:.0f}s per setting")
+    print("\nmax_pending = clients (no shedding)")
+    for iterations in ITERATIONS:
+        run(iterations, clients, duration, max_pending=clients)
+    print(f"\nmax_pending = {workers * 2} (excess attempts get 503)")
+    for iterations in ITERATIONS:
+        run(iterations, clients, duration, max_pending=workers * 2)
@@ -0,0 +1,89 @@
+"""
+Benchmark for utils.save_json
+Compares bytes written and time per mutation against the legacy
+read-copy-backup-then-overwrite implementation
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import save_json
+
+
+def legacy_save_json(filepath, data):
+    """save_json as it was before atomic writes (byte-copy backup on every save)"""
+    if os.path.exists(filepath):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            backup_data = f.read()
+        with open(f"{filepath}.backup", 'w', encoding='utf-8') as f:
+            f.write(backup_data)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return True
+
+
+def io_counters():
+    """Return (bytes read, bytes written) for this process, or None off Linux"""
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def make_students(count):
+    return {
+        f"STU_{i:06d}": {
+            "id": f"STU_{i:06d}",
+            "student_name": f"Student {i}",
+            "login_id": f"student{i}",
+            "section": "ABCDEF"[i % 6],
+            "email": f"student{i}@edu.in",
+            "phone": f"{9000000000 + i}",
+            "status": "active",
+            "registration_id": f"REG-20250101000000-{i:04d}",
+            "created_at": "2025-01-01T00:00:00Z",
+            "updated_at": "2025-01-01T00:00:00Z",
+            "created_by": "ADMIN"
+        }
+        for i in range(count)
+    }
+
+
+def run(save, label, records, mutations):
+    workdir = tempfile.mkdtemp()
+    filepath = os.path.join(workdir, 'students.json')
+    data = make_students(records)
+    save(filepath, data)
+
+    before = io_counters()
+    started = time.perf_counter()
+    for i in range(mutations):
+        data[f"STU_{i:06d}"]['updated_at'] = f"2025-01-02T00:00:{i % 60:02d}Z"
+        save(filepath, data)
+    elapsed = time.perf_counter() - started
+    after = io_counters()
+
+    file_size = os.path.getsize(filepath)
+    shutil.rmtree(workdir)
+
+    line = f"{label:<10} file={file_size / 1024:>8.1f} KiB  time/mutation={elapsed / mutations * 1000:>7.2f} ms"
+    if before and after:
+        line += f"  read/mutation={(after[0] - before[0]) / mutations / 1024:>8.1f} KiB"
+        line += f"  written/mutation={(after[1] - before[1]) / mutations / 1024:>8.1f} KiB"
+    print(line)
+
+
+if __name__ == '__main__':
+    mutations = 50
+    for records in (1000, 5000, 20000):
+        print(f"\n{records} records, {mutations} mutations")
+        run(legacy_save_json, 'legacy', records, mutations)
+        run(save_json, 'atomic', records, mutations)
@@ -0,0 +1,91 @@
+"""
+Benchmark for the typeahead SearchIndex
+Builds the students search index at 100k records and times queries as a
+user types them, against a substring scan over every record (what the
+client-side list filters do)
+"""
+
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import SearchIndex
+from repository import JsonRepository
+
+SYLLABLES = ['an', 'ar', 'sa', 'mi', 'ra', 'ka', 'li', 'to', 'ne', 'ha', 'ya', 'vi', 'de', 'su', 'mo', 'ri', 'el', 'in', 'jo', 'pa']
+
+
+def make_name(rng):
+    word = lambda: ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f"{word()} {word()}"
+
+
+def make_students(count):
+    rng = random.Random(1)
+    students = {}
+    for i in range(count):
+        name = make_name(rng)
+        suffix = ''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(4))
+        students[f"STU_{i:06d}"] = {
+            "student_name": name,
+            "login_id": name.lower().replace(' ', '.') + (str(i % 7) if i % 7 else ''),
+            "registration_id": f"REG-2025{i % 12 + 1:02d}{i % 28 + 1:02d}101500-{suffix}",
+            "section": rng.choice('ABCDEF')
+        }
+    return students
+
+
+def scan(students, query):
+    query = query.lower()
+    hits = [key for key, stu in students.items()
+            if query in stu['student_name'].lower() or query in stu['login_id'] or query in stu['registration_id'].lower()]
+    return hits[:10]
+
+
+def timed(func, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return value, samples[len(samples) // 2]
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    students = make_students(count)
+    target = students[f"STU_{count // 2:06d}"]
+    first, last = target['student_name'].split()
+    workdir = tempfile.mkdtemp()
+    try:
+        repo = JsonRepository('students', os.path.join(workdir, 'students.json'))
+        repo.replace_all(students)
+        index = SearchIndex(
+            repo,
+            fields={'student_name': 2, 'login_id': 1.5, 'registration_id': 1},
+            display=lambda key, stu: {'title': stu.get('student_name')}
+        )
+        _, build_seconds = timed(lambda: index.search('x'))
+        print(f"{count} students, vocabulary {len(index._terms)} terms, build {build_seconds:.2f} s")
+
+        typed = [first[:n] for n in range(1, len(first) + 1)] + [f"{first} {last[:n]}" for n in range(1, len(last) + 1)]
+        extra = [last[1:5].lower(), first[:-1] + 'x', target['registration_id'][-4:], 'REG-202503']
+        print(f"  {'query':<24}{'index':>10}{'scan':>10}  top hit")
+        for query in typed + extra:
+            hits, index_seconds = timed(lambda: index.search(query, 10), repeat=5)
+            _, scan_seconds = timed(lambda: scan(students, query))
+            top = hits[0][2]['title'] if hits else '-'
+            print(f"  {query!r:<24}{index_seconds * 1000:>8.2f}ms{scan_seconds * 1000:>8.1f}ms  {top}")
+
+        repo.put('STU_new', {"student_name": "Zyzzyva Quux", "login_id": "zyzzyva.quux", "registration_id": "REG-X"})
+        hits, write_seconds = timed(lambda: index.search('zyzz'))
+        print(f"  after one write: {write_seconds * 1000:.2f} ms, found={bool(hits)}  {index.stats()}")
+    finally:
+        shutil.rmtree(workdir)
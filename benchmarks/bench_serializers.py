@@ -0,0 +1,77 @@
+"""
+Benchmark for the data file serializers
+Reports encode/decode time and on-disk size for every available
+DATA_SERIALIZER format on generated activities and users data
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serializers
+
+
+def make_activities(count):
+    return [
+        {
+            "id": f"ACT_{i + 1:06d}",
+            "timestamp": f"2025-01-{i % 28 + 1:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+            "user": f"user{i % 500}",
+            "action": ("LOGIN", "CREATE", "UPDATE", "DELETE")[i % 4],
+            "entity_type": ("Student", "Academic", "Event", "Timetable")[i % 4],
+            "entity_id": f"STU_{i:06d}",
+            "description": f"Updated record {i} – café résumé",
+            "status": "success",
+            "details": {"ip": f"10.0.{i % 256}.{i % 200}", "fields": ["name", "section"]}
+        }
+        for i in range(count)
+    ]
+
+
+def make_users(count):
+    return {
+        f"user{i}": {
+            "id": f"STU_{i:06d}",
+            "password": "e" * 64,
+            "role": ("Student", "Faculty")[i % 2],
+            "status": "active",
+            "name": f"User {i}",
+            "email": f"user{i}@edu.in",
+            "created_at": "2025-01-01T00:00:00Z",
+            "last_login": "2025-01-02T08:00:00Z",
+            "login_count": i % 40,
+            "theme": "light"
+        }
+        for i in range(count)
+    }
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(label, data, repeat=5):
+    print(f"\n{label}")
+    baseline = len(serializers.SERIALIZERS['json-pretty'].encode(data))
+    for name, serializer in serializers.SERIALIZERS.items():
+        payload = serializer.encode(data)
+        assert serializers.decode(payload) == data, name
+        encode = best_of(lambda: serializer.encode(data), repeat)
+        decode = best_of(lambda: serializer.decode(payload), repeat)
+        size = len(payload)
+        print(f"  {name:<12} encode={encode * 1000:>8.2f} ms  decode={decode * 1000:>8.2f} ms  size={size / 1024:>8.1f} KiB  ({size / baseline:.2f}x json-pretty)")
+
+
+if __name__ == '__main__':
+    missing = [name for name in ('orjson', 'msgpack') if name not in serializers.SERIALIZERS]
+    if missing:
+        print(f"(not installed, skipped: {', '.join(missing)})")
+    run('activities.json, 10000 entries', make_activities(10000))
+    run('users.json, 20000 users', make_users(20000))
@@ -0,0 +1,114 @@
+"""
+Benchmark for timetable clash checks
+Fills a day of many sections with back-to-back 10-minute classes and
+times the IntervalIndex overlap query for one section against the old
+check (re-parse and compare every entry of that day and section), for a
+free slot and for one overlapping several classes, then times the
+whole-week conflicts sweep (sweep_overlaps) against comparing every pair
+of classes on the same day
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import IntervalIndex, sweep_overlaps
+from repository import JsonRepository
+from config import DAYS_OF_WEEK
+from utils import convert_12_to_24, convert_24_to_12, time_to_minutes
+
+
+def make_entries(count):
+    # 10-minute classes from midnight, wrapping into more sections of the same day
+    entries = {}
+    for i in range(count):
+        start = (i % 140) * 10
+        key = f"TT_{i:06d}"
+        entries[key] = {
+            'id': key, 'day': 'Monday', 'section': f"S{i // 140}",
+            'start_time': f"{start // 60:02d}:{start % 60:02d}", 'end_time': f"{(start + 10) // 60:02d}:{(start + 10) % 60:02d}",
+            'start_time_12': convert_24_to_12(f"{start // 60:02d}:{start % 60:02d}"), 'class_name': key
+        }
+    return entries
+
+
+def linear_clashes(entries, section, start, end):
+    """The old check: walk the day's entries, converting each one's times"""
+    clashes = []
+    for entry in entries:
+        if entry['section'] != section:
+            continue
+        entry_start = convert_12_to_24(entry['start_time']) if 'M' in entry['start_time'] else entry['start_time']
+        entry_end = convert_12_to_24(entry['end_time']) if 'M' in entry['end_time'] else entry['end_time']
+        e_start = int(entry_start.split(':')[0]) * 60 + int(entry_start.split(':')[1])
+        e_end = int(entry_end.split(':')[0]) * 60 + int(entry_end.split(':')[1])
+        if start < e_end and end > e_start:
+            clashes.append(entry['id'])
+    return clashes
+
+
+def make_week(sections, rng):
+    """8 one-hour classes a day per section, faculty drawn from a pool
+    sized so that a few end up double-booked"""
+    faculty = [f"Prof {n}" for n in range(sections * 2)]
+    return [
+        (('faculty', day, rng.choice(faculty)), start * 60, start * 60 + 60, f"{day}-{section}-{start}")
+        for section in range(sections) for day in DAYS_OF_WEEK for start in range(9, 17)
+    ]
+
+
+def pairwise(intervals):
+    """Compare every pair of classes on the same day"""
+    by_day = {}
+    for group, start, end, key in intervals:
+        by_day.setdefault(group[1], []).append((group, start, end, key))
+    return [(a[0], a[3], b[3]) for items in by_day.values()
+            for i, a in enumerate(items) for b in items[i + 1:] if a[0] == b[0] and a[1] < b[2] and b[1] < a[2]]
+
+
+def timed(func, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return value, samples[len(samples) // 2]
+
+
+if __name__ == '__main__':
+    print(f"  {'entries':>8}{'query':>16}{'index':>11}{'linear':>11}  clashes")
+    for count in (140, 1400, 14000):
+        entries = make_entries(count)
+        workdir = tempfile.mkdtemp()
+        try:
+            repo = JsonRepository('timetable', os.path.join(workdir, 'timetable.json'))
+            repo.replace_all(entries)
+            index = IntervalIndex(
+                repo,
+                groups={'section': lambda key, entry: (entry['day'], entry['section'])},
+                interval=lambda key, entry: (time_to_minutes(entry['start_time']), time_to_minutes(entry['end_time']))
+            )
+            index.overlapping('section', ('Monday', 'S0'), 0, 1)  # build
+            day = [entry for entry in entries.values() if entry['section'] == 'S0']
+            for label, (start, end) in (('free 23:30', (1410, 1440)), ('09:05-10:05', (545, 605))):
+                hits, index_seconds = timed(lambda: [key for _, _, key, _ in index.overlapping('section', ('Monday', 'S0'), start, end)])
+                expected, linear_seconds = timed(lambda: linear_clashes(day, 'S0', start, end))
+                assert sorted(hits) == sorted(expected)
+                print(f"  {count:>8}{label:>16}{index_seconds * 1e6:>9.1f}us{linear_seconds * 1e6:>9.0f}us  {len(hits)}")
+        finally:
+            shutil.rmtree(workdir)
+
+    print(f"\n  {'sections':>8}{'classes':>9}{'sweep':>11}{'pairwise':>11}  double bookings")
+    rng = random.Random(1)
+    for sections in (10, 50, 100):
+        week = make_week(sections, rng)
+        pairs, sweep_seconds = timed(lambda: sweep_overlaps(week), repeat=3)
+        expected, pairwise_seconds = timed(lambda: pairwise(week), repeat=1)
+        assert len(pairs) == len(expected)
+        print(f"  {sections:>8}{len(week):>9}{sweep_seconds * 1000:>9.1f}ms{pairwise_seconds * 1000:>9.1f}ms  {len(pairs)}")
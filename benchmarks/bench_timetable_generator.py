@@ -0,0 +1,67 @@
+"""
+Benchmark for the timetable generator
+Builds synthetic institutions of 10 to 200 sections (eight subjects of two
+to five weekly hours each, faculty shared between sections, some with
+limited availability, one home room per section plus labs), solves each
+and checks the result for section, faculty and room clashes
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import sweep_overlaps
+from timetable_generator import parse_problem, solve
+from utils import time_to_minutes
+
+SUBJECTS = [('Mathematics', 5), ('Physics', 4), ('Chemistry', 4), ('English', 3),
+            ('Computer Science', 4), ('Biology', 3), ('History', 2), ('Lab', 3)]
+SECTIONS_PER_TEACHER = 4
+
+
+def make_institution(sections, seed=1):
+    rng = random.Random(seed)
+    names = [f"S{n:03d}" for n in range(sections)]
+    labs = [{'classroom': f"LAB-{n}", 'building': 'Science'} for n in range(max(1, sections // 6))]
+    faculty, subjects = [], []
+    for subject, hours in SUBJECTS:
+        teachers = [f"{subject} Teacher {n}" for n in range(-(-sections // SECTIONS_PER_TEACHER))]
+        for name in teachers:
+            if rng.random() < 0.3:  # part-time: four days only
+                days = rng.sample(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'], 4)
+                faculty.append({'name': name, 'available': {day: ['9:00 AM - 5:00 PM'] for day in days}})
+        for n, section in enumerate(names):
+            spec = {'section': section, 'subject': subject, 'faculty': teachers[n // SECTIONS_PER_TEACHER], 'hours': hours}
+            if subject == 'Lab':
+                spec.update(room=labs[n % len(labs)]['classroom'], building='Science')
+            else:
+                spec.update(room=f"R-{section}", building='Main')
+            subjects.append(spec)
+    return {'subjects': subjects, 'faculty': faculty, 'rooms': labs}
+
+
+def clashes(entries):
+    groups = {
+        'section': lambda e: (e['day'], e['section']),
+        'faculty': lambda e: (e['day'], e['faculty_name'].lower()),
+        'room': lambda e: (e['day'], e['building'].lower(), e['classroom'].lower())
+    }
+    found = 0
+    for group in groups.values():
+        intervals = [(group(e), time_to_minutes(e['start_time']), time_to_minutes(e['end_time']), n) for n, e in enumerate(entries)]
+        found += len(sweep_overlaps(intervals))
+    return found
+
+
+if __name__ == '__main__':
+    time_limit = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print(f"{len(SUBJECTS)} subjects/section, {SECTIONS_PER_TEACHER} sections/teacher, time limit {time_limit:g}s")
+    print(f"  {'sections':>8}{'sessions':>10}{'placed':>9}{'attempts':>10}{'seconds':>10}  status")
+    for sections in (10, 25, 50, 100, 200):
+        problem = parse_problem(make_institution(sections))
+        result = solve(problem, time_limit)
+        stats = result['stats']
+        assert clashes(result['entries']) == 0, 'generated timetable has clashes'
+        print(f"  {sections:>8}{stats['sessions']:>10}{stats['placed']:>9}{stats['attempts']:>10}{stats['seconds']:>10.3f}  {result['status']}")
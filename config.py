@@ -25,18 +25,90 @@ USERS_FILE = os.path.join(DATA_DIR, 'users.json')
 ACADEMICS_FILE = os.path.join(DATA_DIR, 'academics.json')
 STUDENTS_FILE = os.path.join(DATA_DIR, 'students.json')
 EVENTS_FILE = os.path.join(DATA_DIR, 'events.json')
+EVENTS_ARCHIVE_FILE = os.path.join(DATA_DIR, 'events_archive.json')
 TIMETABLE_FILE = os.path.join(DATA_DIR, 'timetable.json')
 ACTIVITIES_FILE = os.path.join(DATA_DIR, 'activities.json')
 
+# Storage backend for users/academics/students/events/timetable:
+# 'json' uses the files above, 'sqlite' uses SQLITE_DB_FILE (WAL mode).
+# Run `python migrate_json_to_sqlite.py` once before switching to 'sqlite'.
+STORAGE_BACKEND = 'json'
+SQLITE_DB_FILE = os.path.join(DATA_DIR, 'eduportal.db')
+
+# JSON backend timetable: one shard file per (day, section) plus
+# manifest.json listing the shards in display order. An existing
+# TIMETABLE_FILE is migrated on first start and then left unused.
+TIMETABLE_SHARD_DIR = os.path.join(DATA_DIR, 'timetable')
+os.makedirs(TIMETABLE_SHARD_DIR, exist_ok=True)
+
+# JSON backend event registrations: one append-only <event id>.jsonl per
+# event (the SQLite backend keeps them in SQLITE_DB_FILE)
+REGISTRATIONS_DIR = os.path.join(DATA_DIR, 'registrations')
+os.makedirs(REGISTRATIONS_DIR, exist_ok=True)
+
+# JSON backend journaling: mutations of these entities are appended to
+# <file>.journal (one small record each) instead of rewriting the file, and a
+# background compaction folds the journal into a new snapshot once it reaches
+# either threshold. (The timetable is sharded instead, see above.)
+JOURNAL_ENTITIES = ['users', 'academics', 'students', 'events']
+JOURNAL_COMPACT_ENTRIES = 1000
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# Format used when writing the data files: 'json' (compact), 'json-pretty'
+# (indent=2, the original layout), 'orjson' or 'msgpack'. The last two need
+# the optional package and otherwise fall back to 'json'. Files in any of
+# these formats load regardless of the setting.
+DATA_SERIALIZER = 'json'
+
+# JSON read cache (parsed files are reused until mtime/size/inode change)
+JSON_CACHE_ENABLED = True
+
+# Backups taken by save_json: the live file is hard-linked to <file>.backup
+# (older generations rotate to .backup.1, .backup.2, ...) whenever either
+# threshold is reached. Set a threshold to 0 to disable it.
+BACKUP_GENERATIONS = 3
+BACKUP_EVERY_N_WRITES = 10
+BACKUP_INTERVAL_SECONDS = 300
+
+# Data file locking (fcntl locks on <file>.lock, shared across worker
+# processes). Requests that wait longer than this fail with HTTP 503.
+LOCK_TIMEOUT_SECONDS = 10
+
 # Session configuration
 SESSION_TIMEOUT_MINUTES = 15
 SESSION_TIMEOUT_SECONDS = SESSION_TIMEOUT_MINUTES * 60
 
+# Session store: 'memory' (per process) or 'sqlite' (SESSION_DB_FILE, shared
+# by every worker; use it when running more than one worker process)
+SESSION_STORE = 'memory'
+SESSION_DB_FILE = os.path.join(DATA_DIR, 'sessions.db')
+
 # Security settings
 PASSWORD_MIN_LENGTH = 6
 MAX_LOGIN_ATTEMPTS = 5
 LOCKOUT_DURATION_MINUTES = 15
 
+# Password hashing: PBKDF2-HMAC-SHA256 with PASSWORD_HASH_ITERATIONS rounds,
+# computed in a pool of PASSWORD_HASH_WORKERS processes (None = CPU count,
+# 0 = in the request thread). Once PASSWORD_HASH_MAX_PENDING hashes are
+# queued or running, further logins get HTTP 503 instead of waiting. Older
+# SHA-256 hashes (and hashes with another iteration count) are rehashed on
+# the next successful login. `python benchmarks/bench_password_hashing.py`
+# reports logins/sec per iteration count.
+PASSWORD_HASH_ITERATIONS = 200000
+PASSWORD_HASH_WORKERS = None
+PASSWORD_HASH_MAX_PENDING = 32
+
+# Login bookkeeping (last login, login count, failed attempts, lockouts)
+# lives in LOGIN_STATE_FILE instead of users.json. Logins are counted in
+# memory and merged into the file every LOGIN_STATE_FLUSH_INTERVAL_SECONDS
+# or once LOGIN_STATE_FLUSH_BATCH users have changes; lockouts are written
+# at once. MAX_LOGIN_ATTEMPTS failures within LOCKOUT_DURATION_MINUTES lock
+# the account for LOCKOUT_DURATION_MINUTES.
+LOGIN_STATE_FILE = os.path.join(DATA_DIR, 'login_state.json')
+LOGIN_STATE_FLUSH_INTERVAL_SECONDS = 5
+LOGIN_STATE_FLUSH_BATCH = 200
+
 # Default passwords
 DEFAULT_ADMIN_PASSWORD = "admin123"
 DEFAULT_ACADEMIC_PASSWORD = "acad123"
@@ -71,9 +143,60 @@ GENDER_OPTIONS = ["Male", "Female", "Other"]
 # Marital status options
 MARITAL_STATUS_OPTIONS = ["Single", "Married", "Divorced", "Widowed"]
 
-# Pagination
+# Pagination for the list endpoints: page_size defaults to DEFAULT_PAGE_SIZE
+# once paging is requested and is capped at MAX_PAGE_SIZE; requests without
+# page_size/cursor still get every matching record
 DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 500
+
+# Event archival: events dated more than EVENT_ARCHIVE_AFTER_DAYS days ago
+# move from EVENTS_FILE (the hot set behind /api/events/list, search and
+# registration) to EVENTS_ARCHIVE_FILE. /api/events/range still returns
+# them, reading the archive only for ranges that reach back that far.
+EVENT_ARCHIVE_AFTER_DAYS = 30
+
+# Bulk timetable import (POST /api/timetable/import): rows accepted per
+# upload (CSV, XLSX or a JSON array)
+TIMETABLE_IMPORT_MAX_ROWS = 5000
+
+# Timetable generator (POST /api/timetable/generate): solves run in a pool
+# of TIMETABLE_GENERATOR_WORKERS processes and stop after the requested
+# time limit (default TIMETABLE_GENERATOR_TIME_LIMIT_SECONDS, capped at
+# TIMETABLE_GENERATOR_MAX_TIME_LIMIT_SECONDS) with the best timetable found.
+# Job status and results are JSON files in TIMETABLE_JOBS_DIR, kept for
+# TIMETABLE_JOB_RETENTION_HOURS. `python benchmarks/bench_timetable_generator.py`
+# reports solve times for 10 to 200 sections.
+TIMETABLE_JOBS_DIR = os.path.join(DATA_DIR, 'timetable_jobs')
+os.makedirs(TIMETABLE_JOBS_DIR, exist_ok=True)
+TIMETABLE_GENERATOR_WORKERS = 1
+TIMETABLE_GENERATOR_TIME_LIMIT_SECONDS = 10
+TIMETABLE_GENERATOR_MAX_TIME_LIMIT_SECONDS = 60
+TIMETABLE_JOB_RETENTION_HOURS = 24
 
 # Activity log retention
 MAX_ACTIVITY_LOGS = 10000
 
+# Actions left out of the activity list and export unless asked for
+HIDDEN_ACTIVITY_ACTIONS = ['USER_LOGIN', 'USER_LOGOUT', 'THEME_CHANGED', 'LOGIN_ATTEMPT']
+
+# Activity log storage: append-only JSONL segments under ACTIVITY_LOG_DIR.
+# The active segment is closed (and gzipped if enabled) once it reaches
+# ACTIVITY_SEGMENT_BYTES; the oldest closed segments are dropped whole while
+# the newer ones still hold at least MAX_ACTIVITY_LOGS entries. A legacy
+# ACTIVITIES_FILE is imported on first use and then left unused.
+ACTIVITY_LOG_DIR = os.path.join(DATA_DIR, 'activities')
+ACTIVITY_SEGMENT_BYTES = 256 * 1024
+ACTIVITY_COMPRESS_SEGMENTS = True
+
+# Background activity writer: Logger.log_activity queues entries and a
+# flusher thread appends them in one write every ACTIVITY_FLUSH_INTERVAL_MS
+# or ACTIVITY_FLUSH_BATCH entries (whatever comes first); the queue is
+# flushed at exit. A hard crash can lose up to one interval of entries.
+# ACTIVITY_OVERFLOW_POLICY for a full queue: 'block', 'drop-oldest' or
+# 'sync' (the request writes the queue itself).
+ACTIVITY_ASYNC_WRITES = True
+ACTIVITY_QUEUE_SIZE = 10000
+ACTIVITY_FLUSH_INTERVAL_MS = 200
+ACTIVITY_FLUSH_BATCH = 500
+ACTIVITY_OVERFLOW_POLICY = 'sync'
+
@@ -0,0 +1,753 @@
+"""
+In-memory lookup indexes for EduPortal
+Secondary indexes over repository records, kept current through
+Repository.subscribe() and rebuilt whenever Repository.version() shows a
+write they did not see (another worker, or a backend without versions)
+"""
+
+import base64
+import bisect
+import heapq
+import json
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from utils import time_to_minutes
+
+# Writes queued for an index between lookups; past this many it rebuilds
+# instead of replaying them
+MAX_QUEUED_WRITES = 4096
+
+class RepositoryIndex:
+    """Base class: rebuild from repo.all() on a version mismatch, otherwise
+    apply this process's writes incrementally.
+
+    Request handlers query indexes while holding repository transactions,
+    so the repository is only ever read before taking self._lock, never
+    under it: index and repository locks cannot wait on each other.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self._lock = threading.RLock()
+        self._version = None
+        self._built = False
+        self._queue_lock = threading.Lock()
+        self._queued = []  # (changes, before, after) not applied yet; None = overflowed
+        self._stats = {'rebuilds': 0, 'incremental': 0}
+        repo.subscribe(self._on_write)
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _add(self, key, record):
+        raise NotImplementedError
+
+    def _remove(self, key):
+        raise NotImplementedError
+
+    def _update(self, key, record):
+        """Apply one put (record) or delete (None)"""
+        self._remove(key)
+        if record is not None:
+            self._add(key, record)
+
+    def _load(self, version, records):
+        """Replace the contents with records read at version; call with
+        self._lock held"""
+        self._clear()
+        for key, record in records.items():
+            self._add(key, record)
+        self._version = version
+        self._built = True
+        self._stats['rebuilds'] += 1
+
+    def _apply_queued(self):
+        """Replay this process's queued writes; False if the index needs a
+        rebuild. Call with self._lock held"""
+        with self._queue_lock:
+            queued, self._queued = self._queued, []
+        if queued is None:
+            self._built = False
+        elif self._built:
+            for changes, before, after in queued:
+                if after is not None and after == self._version:
+                    continue  # already read by the last rebuild
+                if changes is None or before is None or before != self._version:
+                    self._built = False  # missed a write (or full replace)
+                    break
+                for key, record in changes.items():
+                    self._update(key, record)
+                self._version = after
+                self._stats['incremental'] += 1
+        return self._built
+
+    @contextmanager
+    def _fresh(self):
+        """Hold self._lock with the index up to date"""
+        while True:
+            version = self.repo.version()
+            with self._lock:
+                seen = self._version
+                if self._apply_queued() and version is not None and version == self._version:
+                    yield
+                    return
+                if not self._built or version is None or self._version == seen:
+                    break  # a write this process did not see: rebuild
+            # Our own writes moved the index past the version just read
+            # (versions are read under the repository lock, so every write
+            # they reflect is already queued): read it again
+        # Rebuild. Writes queued so far are in what we read next. Version
+        # first: the records read afterwards are at least this new, so a
+        # write in between is skipped below or causes one extra rebuild.
+        with self._queue_lock:
+            self._queued = []
+        version = self.repo.version()
+        records = self.repo.all()
+        with self._lock:
+            self._load(version, records)
+            self._apply_queued()
+            yield
+
+    def _on_write(self, changes, before, after):
+        # Runs under the repository's write lock, possibly while a lookup
+        # holds self._lock: queue the write for the next lookup to apply.
+        with self._queue_lock:
+            if self._queued is None:
+                return
+            if len(self._queued) >= MAX_QUEUED_WRITES:
+                self._queued = None  # rebuild on next lookup
+                return
+            self._queued.append((changes, before, after))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+class UserIndex(RepositoryIndex):
+    """users: lowercased username -> key, user id -> usernames, role -> usernames"""
+
+    def _clear(self):
+        self._by_lower = {}   # lowercased key -> {key: None}, first added wins
+        self._by_id = {}      # id -> {key: role}
+        self._by_role = {}    # role -> {key: None}
+        self._entries = {}    # key -> (lowercased key, id, role), for removal
+
+    @staticmethod
+    def _discard(index, value, key):
+        keys = index.get(value)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del index[value]
+
+    def _add(self, key, record):
+        lower = key.lower()
+        user_id = record.get('id')
+        role = record.get('role')
+        self._by_lower.setdefault(lower, {})[key] = None
+        if user_id is not None:
+            self._by_id.setdefault(user_id, {})[key] = role
+        self._by_role.setdefault(role, {})[key] = None
+        self._entries[key] = (lower, user_id, role)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        lower, user_id, role = entry
+        self._discard(self._by_lower, lower, key)
+        self._discard(self._by_id, user_id, key)
+        self._discard(self._by_role, role, key)
+
+    def resolve(self, username):
+        """Exact stored key for a username, matched case-insensitively"""
+        if not username:
+            return None
+        with self._fresh():
+            if username in self._entries:
+                return username
+            keys = self._by_lower.get(username.lower())
+            return next(iter(keys)) if keys else None
+
+    def __contains__(self, username):
+        """`name in user_index` is a case-insensitive existence check"""
+        return self.resolve(username) is not None
+
+    def username_for_id(self, user_id, role=None):
+        """Username of the (first) user whose record id is user_id"""
+        return self.usernames_for_ids([user_id], role).get(user_id)
+
+    def usernames_for_ids(self, user_ids, role=None):
+        """{id: username} for many ids with a single freshness check"""
+        with self._fresh():
+            found = {}
+            for user_id in user_ids:
+                for key, key_role in self._by_id.get(user_id, {}).items():
+                    if role is None or key_role == role:
+                        found[user_id] = key
+                        break
+            return found
+
+    def usernames_for_role(self, role):
+        with self._fresh():
+            return list(self._by_role.get(role, ()))
+
+def _sort_value(value):
+    """Order None/empty first, then numbers, then strings case-insensitively"""
+    if value is None or value == '':
+        return (0, '')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value)
+    return (2, str(value).lower())
+
+def _filter_value(value):
+    return None if value is None else str(value).strip().lower()
+
+def _accessor(spec):
+    """Field name, or callable(key, record), -> callable(key, record)"""
+    if callable(spec):
+        return spec
+    return lambda key, record: record.get(spec)
+
+def encode_list_cursor(sort, position):
+    """Opaque keyset cursor: the sort name plus the last (value, key) served"""
+    value, key = position
+    payload = {'sort': sort, 'value': list(value), 'key': key}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_list_cursor(cursor, sort):
+    """Return the (value, key) position; ValueError if malformed or for another sort"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if payload['sort'] != sort:
+            raise ValueError('Cursor belongs to a different sort')
+        return (tuple(payload['value']), str(payload['key']))
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+class ListIndex(RepositoryIndex):
+    """Filter and sort indexes behind the paged list endpoints.
+
+    filters maps a filter name to a field (or accessor) matched by
+    case-insensitive equality through {value: {keys}}; sorts maps a sort
+    name to a field kept as a sorted list of (value, key), which also serves
+    range filters on that field. Pages are keyset-based: a cursor holds the
+    last (value, key) returned, so inserts and deletes between requests
+    never shift or repeat rows.
+    """
+
+    # Below this share of all rows the matches are sorted directly instead
+    # of walking the whole sorted list and skipping non-matches
+    SORT_MATCHES_RATIO = 0.25
+
+    def __init__(self, repo, filters, sorts):
+        self.filters = {name: _accessor(spec) for name, spec in filters.items()}
+        self.sorts = {name: _accessor(spec) for name, spec in sorts.items()}
+        super().__init__(repo)
+
+    def _clear(self):
+        self._entries = {}  # key -> ({filter: value}, {sort: value})
+        self._by_value = {name: {} for name in self.filters}
+        self._sorted = {name: [] for name in self.sorts}
+
+    def _add(self, key, record):
+        filter_values = {name: _filter_value(get(key, record)) for name, get in self.filters.items()}
+        sort_values = {name: _sort_value(get(key, record)) for name, get in self.sorts.items()}
+        for name, value in filter_values.items():
+            self._by_value[name].setdefault(value, set()).add(key)
+        for name, value in sort_values.items():
+            bisect.insort(self._sorted[name], (value, key))
+        self._entries[key] = (filter_values, sort_values)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        filter_values, sort_values = entry
+        for name, value in filter_values.items():
+            keys = self._by_value[name].get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_value[name][value]
+        for name, value in sort_values.items():
+            entries = self._sorted[name]
+            i = bisect.bisect_left(entries, (value, key))
+            if i < len(entries) and entries[i] == (value, key):
+                del entries[i]
+
+    def _range_keys(self, field, low, high):
+        """Keys whose `field` string value lies in [low, high] (prefix match on high)"""
+        entries = self._sorted[field]
+        start = bisect.bisect_left(entries, ((2, low.lower()), '')) if low else bisect.bisect_left(entries, ((1,), ''))
+        stop = bisect.bisect_right(entries, ((2, high.lower() + '\uffff'),)) if high else len(entries)
+        return {key for _, key in entries[start:stop]}
+
+    def query(self, filters=None, ranges=None, sort=None, descending=False, after=None, limit=None):
+        """Return (keys, total, last) for one page.
+
+        filters: {filter name: value}; ranges: {sort name: (low, high)} with
+        inclusive ISO-string bounds; after: position from a cursor; last is
+        the position to continue from, or None on the final page.
+        """
+        with self._fresh():
+            candidate_sets = [self._by_value[name].get(_filter_value(value), set()) for name, value in (filters or {}).items()]
+            candidate_sets += [self._range_keys(field, low, high) for field, (low, high) in (ranges or {}).items()]
+            entries = self._sorted[sort]
+            if candidate_sets:
+                candidate_sets.sort(key=len)
+                matches = candidate_sets[0].intersection(*candidate_sets[1:])
+                total = len(matches)
+                if total < len(entries) * self.SORT_MATCHES_RATIO:
+                    entries = sorted((self._entries[key][1][sort], key) for key in matches)
+                    matches = None
+            else:
+                matches = None
+                total = len(entries)
+
+            if descending:
+                stop = bisect.bisect_left(entries, after) if after is not None else len(entries)
+                walk = (entries[i] for i in range(stop - 1, -1, -1))
+            else:
+                start = bisect.bisect_right(entries, after) if after is not None else 0
+                walk = (entries[i] for i in range(start, len(entries)))
+
+            page = []
+            appended = after  # position of the last key in page
+            last = None
+            for position in walk:
+                if matches is not None and position[1] not in matches:
+                    continue
+                if limit is not None and len(page) == limit:
+                    last = appended
+                    break
+                page.append(position[1])
+                appended = position
+            return page, total, last
+
+_TERM_RE = re.compile(r'[0-9a-z]+')
+
+def search_terms(text):
+    """Lowercased alphanumeric runs: 'REG-2025-AB12' -> ['reg', '2025', 'ab12']"""
+    return _TERM_RE.findall(str(text).lower()) if text else []
+
+def _trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+class SearchIndex(RepositoryIndex):
+    """Inverted index for typeahead search over a few text fields.
+
+    fields maps a field (or accessor) to a weight. Every query term must
+    match some indexed term of a record, scored by how it matched: the
+    same term (3), a prefix of it (2), somewhere inside it (0.9, via
+    trigrams) or a Dice trigram similarity of at least TRIGRAM_SIMILARITY
+    for typos. Scores are multiplied by the field weight and summed over
+    the query terms.
+
+    Prefixes walk a sorted term list with bisect, and trigrams point at
+    terms rather than records so fuzzy matching only scans the vocabulary.
+    display(key, record) builds the stored hit so results need no reads.
+    """
+
+    EXACT, PREFIX, INFIX = 3.0, 2.0, 0.9
+    TRIGRAM_SIMILARITY = 0.5
+    # Up to this many candidates, further query terms are scored per record
+    CANDIDATE_SCAN_LIMIT = 20000
+
+    def __init__(self, repo, fields, display, include=None):
+        self.fields = [(_accessor(spec), weight) for spec, weight in fields.items()]
+        self.display = display
+        self.include = include
+        self._loading = False
+        super().__init__(repo)
+
+    def _clear(self):
+        self._postings = {}      # term -> {key: field weight}
+        self._terms = []         # sorted vocabulary, for prefix ranges
+        self._by_trigram = {}    # trigram -> {terms}
+        self._entries = {}       # key -> ({term: field weight}, hit)
+
+    def _load(self, version, records):
+        # Sort the vocabulary once instead of inserting term by term
+        self._loading = True
+        try:
+            super()._load(version, records)
+        finally:
+            self._loading = False
+        self._terms.sort()
+
+    def _add(self, key, record):
+        if self.include is not None and not self.include(key, record):
+            return
+        weights = {}
+        for get, weight in self.fields:
+            for term in search_terms(get(key, record)):
+                weights[term] = max(weight, weights.get(term, 0))
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if self._loading:
+                    self._terms.append(term)
+                else:
+                    bisect.insort(self._terms, term)
+                for trigram in _trigrams(term):
+                    self._by_trigram.setdefault(trigram, set()).add(term)
+            postings[key] = weight
+        self._entries[key] = (weights, self.display(key, record))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for term in entry[0]:
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if postings:
+                continue
+            del self._postings[term]
+            del self._terms[bisect.bisect_left(self._terms, term)]
+            for trigram in _trigrams(term):
+                terms = self._by_trigram[trigram]
+                terms.discard(term)
+                if not terms:
+                    del self._by_trigram[trigram]
+
+    def _similarity(self, query_term, query_trigrams, term, shared):
+        """Fuzzy score of a term sharing `shared` trigrams with the query, or 0"""
+        if query_term in term:
+            return self.INFIX
+        # Dice coefficient of the two trigram sets
+        similarity = 2 * shared / (len(query_trigrams) + len(term) - 2)
+        return min(similarity, self.INFIX) if similarity >= self.TRIGRAM_SIMILARITY else 0
+
+    def _matches(self, query_term):
+        """{key: best score} for one query term over the whole index"""
+        scores = {}
+        seen = set()
+        start = bisect.bisect_left(self._terms, query_term)
+        for i in range(start, len(self._terms)):
+            term = self._terms[i]
+            if not term.startswith(query_term):
+                break
+            seen.add(term)
+            score = self.EXACT if term == query_term else self.PREFIX
+            if not scores:
+                scores = {key: score * weight for key, weight in self._postings[term].items()}
+                continue
+            for key, weight in self._postings[term].items():
+                if score * weight > scores.get(key, 0):
+                    scores[key] = score * weight
+        query_trigrams = _trigrams(query_term)
+        shared = {}
+        for trigram in query_trigrams:
+            for term in self._by_trigram.get(trigram, ()):
+                shared[term] = shared.get(term, 0) + 1
+        for term, count in shared.items():
+            similarity = 0 if term in seen else self._similarity(query_term, query_trigrams, term, count)
+            if not similarity:
+                continue
+            for key, weight in self._postings[term].items():
+                if similarity * weight > scores.get(key, 0):
+                    scores[key] = similarity * weight
+        return scores
+
+    def _score(self, query_term, query_trigrams, key):
+        """Best score of one query term against a single record, or 0"""
+        best = 0
+        for term, weight in self._entries[key][0].items():
+            if term.startswith(query_term):
+                score = self.EXACT if term == query_term else self.PREFIX
+            elif query_term in term and query_trigrams:
+                score = self.INFIX
+            elif len(query_term) >= 4 and abs(len(term) - len(query_term)) <= 2:
+                score = self._similarity(query_term, query_trigrams, term, len(query_trigrams & _trigrams(term)))
+            else:
+                continue
+            best = max(best, score * weight)
+        return best
+
+    def search(self, query, limit=10):
+        """Best `limit` hits as [(score, key, hit)], highest score first.
+
+        The longest query term is matched through the index; once few
+        records remain, the other terms are checked against just those
+        records' terms instead of expanding short prefixes index-wide.
+        """
+        terms = sorted(set(search_terms(query)), key=len, reverse=True)
+        if not terms:
+            return []
+        with self._fresh():
+            totals = self._matches(terms[0])
+            for query_term in terms[1:]:
+                if not totals:
+                    return []
+                if len(totals) <= self.CANDIDATE_SCAN_LIMIT:
+                    query_trigrams = _trigrams(query_term)
+                    scores = {key: self._score(query_term, query_trigrams, key) for key in totals}
+                else:
+                    scores = self._matches(query_term)
+                totals = {key: total + scores[key] for key, total in totals.items() if scores.get(key)}
+            if not totals:
+                return []
+            # Top scores first, ties by key; the ties at the cutoff can be
+            # most of the index for a short query, so only those get heaped
+            cutoff = heapq.nlargest(limit, totals.values())[-1]
+            best = sorted((-score, key) for key, score in totals.items() if score > cutoff)
+            best += [(-cutoff, key) for key in heapq.nsmallest(limit - len(best), (key for key, score in totals.items() if score == cutoff))]
+            return [(round(-score, 3), key, self._entries[key][1]) for score, key in best]
+
+class DateIndex(RepositoryIndex):
+    """Records ordered by a 'YYYY-MM-DD' field (then an optional second
+    field such as a time) for calendar queries.
+
+    Entries are (date, then, key) tuples in one sorted list, so any date
+    range is two bisects and a slice: the cost follows the number of
+    records in the range, not the size of the collection. Records without
+    a date, or rejected by include(key, record), are left out.
+    """
+
+    def __init__(self, repo, field='date', then=None, include=None):
+        self.field = field
+        self.then = then
+        self.include = include
+        self._loading = False
+        super().__init__(repo)
+
+    def _clear(self):
+        self._sorted = []   # (date, then, key), ascending
+        self._entries = {}  # key -> its tuple in _sorted
+
+    def _load(self, version, records):
+        self._loading = True
+        try:
+            super()._load(version, records)
+        finally:
+            self._loading = False
+        self._sorted.sort()
+
+    def _add(self, key, record):
+        value = record.get(self.field)
+        if not value or (self.include is not None and not self.include(key, record)):
+            return
+        entry = (str(value), str(record.get(self.then) or '') if self.then else '', key)
+        if self._loading:
+            self._sorted.append(entry)
+        else:
+            bisect.insort(self._sorted, entry)
+        self._entries[key] = entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        i = bisect.bisect_left(self._sorted, entry)
+        if i < len(self._sorted) and self._sorted[i] == entry:
+            del self._sorted[i]
+
+    def _bounds(self, low, high, before):
+        # low inclusive; high inclusive and may be a prefix ('2026-10' is
+        # the whole month); before exclusive
+        start = bisect.bisect_left(self._sorted, (low,)) if low else 0
+        stop = bisect.bisect_left(self._sorted, (high + '\uffff',)) if high else len(self._sorted)
+        if before:
+            stop = min(stop, bisect.bisect_left(self._sorted, (before,)))
+        return start, max(start, stop)
+
+    def count(self, low=None, high=None, before=None):
+        """Number of records dated in [low, high] and before `before`"""
+        with self._fresh():
+            start, stop = self._bounds(low, high, before)
+            return stop - start
+
+    def span(self, low=None, high=None, before=None, after=None, descending=False, limit=None):
+        """Entries (date, then, key) dated in [low, high] and before
+        `before`, in date order (newest first if descending), continuing
+        past the entry `after` when given; at most `limit` of them"""
+        with self._fresh():
+            start, stop = self._bounds(low, high, before)
+            if descending:
+                if after is not None:
+                    stop = max(start, min(stop, bisect.bisect_left(self._sorted, after)))
+                first = stop if limit is None else max(start, stop - limit)
+                return self._sorted[first:stop][::-1]
+            if after is not None:
+                start = min(stop, max(start, bisect.bisect_right(self._sorted, after)))
+            return self._sorted[start:stop if limit is None else min(stop, start + limit)]
+
+    def keys_before(self, date):
+        """Keys of every record dated before `date`"""
+        with self._fresh():
+            return [key for _, _, key in self._sorted[:bisect.bisect_left(self._sorted, (date,))]]
+
+def sweep_overlaps(intervals):
+    """Overlapping pairs among (group, start, end, key) items as (group,
+    earlier key, later key): one sort, then a sweep per group that keeps
+    the intervals still open in a heap by end, O(n log n + pairs)"""
+    pairs = []
+    group = active = None
+    for item_group, start, end, key in sorted(intervals):
+        if item_group != group:
+            group, active = item_group, []
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        pairs.extend((group, other, key) for _, other in active)
+        heapq.heappush(active, (end, key))
+    return pairs
+
+class IntervalIndex(RepositoryIndex):
+    """Minute ranges per group for overlap (clash) queries.
+
+    groups maps a dimension name to an accessor(key, record) giving the
+    record's group in it, e.g. (day, section), or None to leave it out of
+    that dimension; interval(key, record) gives (start, end) in minutes.
+    Each group keeps (start, end, key) sorted by start and the lengths in
+    it: anything overlapping [start, end) begins after start - longest and
+    before end, so a query is two bisects plus a scan of that window,
+    O(log n + k) for classes of bounded length. display(key, record) builds
+    the stored description returned with each hit.
+    """
+
+    def __init__(self, repo, groups, interval, display=None):
+        self.groups = {name: _accessor(spec) for name, spec in groups.items()}
+        self.interval = interval
+        self.display = display
+        self._loading = False
+        super().__init__(repo)
+
+    def _clear(self):
+        self._sorted = {}   # (dimension, group) -> [(start, end, key)] by start
+        self._lengths = {}  # (dimension, group) -> {length: count}
+        self._entries = {}  # key -> ([(dimension, group)], (start, end, key), info)
+
+    def _load(self, version, records):
+        self._loading = True
+        try:
+            super()._load(version, records)
+        finally:
+            self._loading = False
+        for entries in self._sorted.values():
+            entries.sort()
+
+    def _add(self, key, record):
+        start, end = self.interval(key, record) or (None, None)
+        if start is None or end is None or end <= start:
+            return
+        item = (start, end, key)
+        buckets = []
+        for name, get in self.groups.items():
+            group = get(key, record)
+            if group is None:
+                continue
+            bucket = (name, group)
+            entries = self._sorted.setdefault(bucket, [])
+            if self._loading:
+                entries.append(item)
+            else:
+                bisect.insort(entries, item)
+            lengths = self._lengths.setdefault(bucket, {})
+            lengths[end - start] = lengths.get(end - start, 0) + 1
+            buckets.append(bucket)
+        self._entries[key] = (buckets, item, self.display(key, record) if self.display else None)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        buckets, item, _ = entry
+        length = item[1] - item[0]
+        for bucket in buckets:
+            entries = self._sorted[bucket]
+            i = bisect.bisect_left(entries, item)
+            if i < len(entries) and entries[i] == item:
+                del entries[i]
+            lengths = self._lengths[bucket]
+            lengths[length] -= 1
+            if not lengths[length]:
+                del lengths[length]
+            if not entries:
+                del self._sorted[bucket], self._lengths[bucket]
+
+    def _overlapping(self, bucket, start, end, exclude):
+        entries = self._sorted.get(bucket)
+        if not entries:
+            return []
+        longest = max(self._lengths[bucket])
+        low = bisect.bisect_right(entries, (start - longest, float('inf')))
+        high = bisect.bisect_left(entries, (end,))
+        return [item for item in entries[low:high] if item[1] > start and item[2] not in exclude]
+
+    def overlapping(self, dimension, group, start, end, exclude=()):
+        """Every (start, end, key, info) in `group` of `dimension` that
+        overlaps [start, end), by start time; keys in exclude are skipped"""
+        with self._fresh():
+            return [item + (self._entries[item[2]][2],) for item in self._overlapping((dimension, group), start, end, exclude)]
+
+    def intervals(self, dimension, groups):
+        """(group, start, end, key, info) for everything in the given groups of `dimension`"""
+        with self._fresh():
+            return [
+                (group, start, end, key, self._entries[key][2])
+                for group in groups
+                for start, end, key in self._sorted.get((dimension, group), ())
+            ]
+
+    def conflicts(self, dimension):
+        """Every overlapping pair in `dimension` as (group, info, info),
+        found with one sweep_overlaps pass over all of its groups"""
+        with self._fresh():
+            intervals = [
+                (group, start, end, key)
+                for (name, group), entries in self._sorted.items() if name == dimension
+                for start, end, key in entries
+            ]
+            return [(group, self._entries[first][2], self._entries[second][2]) for group, first, second in sweep_overlaps(intervals)]
+
+class TimetableTodayView:
+    """repo.week() without today's classes that have already ended.
+
+    A read-time projection: nothing is deleted, so recurring classes show
+    again next week. The result is cached until the repository version
+    changes or the next of today's remaining classes ends (or the day
+    does), so page views neither rescan the week nor write anything.
+    Callers must treat the returned dict as read-only.
+    """
+
+    def __init__(self, repo, now=datetime.now):
+        self.repo = repo
+        self.now = now
+        self._lock = threading.Lock()
+        self._week = None
+        self._version = None
+        self._valid_until = None
+        self._stats = {'hits': 0, 'recomputes': 0}
+
+    def week(self):
+        now = self.now()
+        version = self.repo.version()
+        with self._lock:
+            if self._week is not None and version is not None and version == self._version and now < self._valid_until:
+                self._stats['hits'] += 1
+                return self._week
+        # Read outside self._lock (see RepositoryIndex); racing recomputes
+        # just both store an equally fresh week
+        week = self.repo.week()
+        with self._lock:
+            today = now.strftime('%A')
+            minute = now.hour * 60 + now.minute
+            midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            # A class ending at HH:MM is shown until HH:MM has passed
+            remaining = [(time_to_minutes(entry.get('end_time')), entry) for entry in week.get(today, [])]
+            remaining = [(end, entry) for end, entry in remaining if end is None or end >= minute]
+            week = dict(week, **{today: [entry for _, entry in remaining]}) if today in week else week
+            boundaries = [end + 1 for end, _ in remaining if end is not None] + [24 * 60]
+            self._week, self._version = week, version
+            self._valid_until = midnight + timedelta(minutes=min(boundaries))
+            self._stats['recomputes'] += 1
+            return week
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, valid_until=self._valid_until.isoformat() if self._valid_until else None)
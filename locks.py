@@ -0,0 +1,149 @@
+"""
+File locking for EduPortal
+Shared/exclusive locks that serialize access to the data files across
+threads and worker processes
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import LOCK_TIMEOUT_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+class LockTimeout(Exception):
+    """Raised when a data file lock could not be acquired in time.
+
+    Deliberately not an OSError, so the existing `except (IOError, OSError)`
+    handlers around file access do not mistake it for a missing file.
+    """
+
+class LockManager:
+    """Advisory fcntl locks on <path>.lock plus an in-process RLock per path.
+
+    Exclusive locks take the path's RLock (so threads queue in-process) and
+    then flock(LOCK_EX); shared locks only take flock(LOCK_SH), so readers in
+    the same process still run concurrently. Re-acquiring a path the thread
+    already holds is reentrant; upgrading shared -> exclusive is refused.
+    """
+
+    def __init__(self, timeout=LOCK_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._path_locks = {}
+        self._registry_lock = threading.Lock()
+        self._held = threading.local()
+        self._stats = {
+            mode: {'acquired': 0, 'contended': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+            for mode in ('shared', 'exclusive')
+        }
+
+    def _path_lock(self, path):
+        with self._registry_lock:
+            lock = self._path_locks.get(path)
+            if lock is None:
+                lock = self._path_locks[path] = threading.RLock()
+            return lock
+
+    def _held_locks(self):
+        held = getattr(self._held, 'locks', None)
+        if held is None:
+            held = self._held.locks = {}
+        return held
+
+    def _record(self, mode, waited, contended=False, timed_out=False):
+        with self._registry_lock:
+            stats = self._stats[mode]
+            if timed_out:
+                stats['timeouts'] += 1
+                return
+            stats['acquired'] += 1
+            stats['wait_seconds'] += waited
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], waited)
+            if contended:
+                stats['contended'] += 1
+
+    def _flock(self, fd, operation, deadline):
+        """Poll a non-blocking flock until it succeeds or the deadline passes"""
+        delay = 0.001
+        contended = False
+        while True:
+            try:
+                fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                return contended
+            except BlockingIOError:
+                contended = True
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                delay = min(delay * 2, 0.05)
+
+    @contextmanager
+    def _acquire(self, path, mode, timeout):
+        held = self._held_locks()
+        if path in held:
+            held_mode, depth, fd = held[path]
+            if mode == 'exclusive' and held_mode == 'shared':
+                raise RuntimeError(f'Cannot upgrade shared lock on {path} to exclusive')
+            held[path] = (held_mode, depth + 1, fd)
+            try:
+                yield
+            finally:
+                held_mode, depth, fd = held[path]
+                held[path] = (held_mode, depth - 1, fd)
+            return
+
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        thread_lock = None
+        if mode == 'exclusive' or fcntl is None:
+            thread_lock = self._path_lock(path)
+            if not thread_lock.acquire(timeout=timeout):
+                self._record(mode, 0, timed_out=True)
+                raise LockTimeout(f'Timed out waiting for {mode} lock on {os.path.basename(path)}')
+
+        fd = None
+        try:
+            contended = time.monotonic() - started > 0.001
+            if fcntl is not None:
+                fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                operation = fcntl.LOCK_EX if mode == 'exclusive' else fcntl.LOCK_SH
+                flock_contended = self._flock(fd, operation, deadline)
+                if flock_contended is None:
+                    self._record(mode, 0, timed_out=True)
+                    raise LockTimeout(f'Timed out waiting for {mode} lock on {os.path.basename(path)}')
+                contended = contended or flock_contended
+            self._record(mode, time.monotonic() - started, contended)
+
+            held[path] = (mode, 1, fd)
+            try:
+                yield
+            finally:
+                del held[path]
+        finally:
+            if fd is not None:
+                os.close(fd)  # closing the descriptor releases the flock
+            if thread_lock is not None:
+                thread_lock.release()
+
+    def shared(self, path, timeout=None):
+        """Context manager holding a shared (reader) lock on path"""
+        return self._acquire(path, 'shared', timeout)
+
+    def exclusive(self, path, timeout=None):
+        """Context manager holding an exclusive (writer) lock on path"""
+        return self._acquire(path, 'exclusive', timeout)
+
+    def stats(self):
+        """Return lock acquisition and wait-time counters per mode"""
+        with self._registry_lock:
+            return {
+                mode: dict(values, wait_seconds=round(values['wait_seconds'], 6), max_wait_seconds=round(values['max_wait_seconds'], 6))
+                for mode, values in self._stats.items()
+            }
+
+lock_manager = LockManager()
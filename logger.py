@@ -3,25 +3,475 @@ Logging system for EduPortal
 Handles activity logging and error logging
 """
 
+import atexit
+import base64
+import bisect
+import gzip
+import heapq
 import json
 import os
+import re
+import shutil
+import threading
+import traceback
+from collections import deque
 from datetime import datetime
-from config import ACTIVITIES_FILE, MAX_ACTIVITY_LOGS
-from utils import load_json, save_json
+from config import (
+    ACTIVITIES_FILE, MAX_ACTIVITY_LOGS,
+    ACTIVITY_LOG_DIR, ACTIVITY_SEGMENT_BYTES, ACTIVITY_COMPRESS_SEGMENTS,
+    ACTIVITY_ASYNC_WRITES, ACTIVITY_QUEUE_SIZE, ACTIVITY_FLUSH_INTERVAL_MS,
+    ACTIVITY_FLUSH_BATCH, ACTIVITY_OVERFLOW_POLICY
+)
+from locks import lock_manager
+from utils import load_json, atomic_write
+
+# seg-<first seq>.jsonl is the active segment; closed ones are renamed to
+# seg-<first seq>-<last seq>.jsonl[.gz], so entry counts and the next id
+# can be worked out from file names alone.
+_SEGMENT_RE = re.compile(r'^seg-(\d{9})(?:-(\d{9}))?\.jsonl(\.gz)?$')
+
+class Segment:
+    """One activity log segment file"""
+
+    def __init__(self, directory, name, first, last, compressed):
+        self.path = os.path.join(directory, name)
+        self.name = name
+        self.first = first
+        self.last = last
+        self.compressed = compressed
+
+    @property
+    def closed(self):
+        return self.last is not None
+
+class ActivityLog:
+    """Append-only JSONL activity log split into rotating segments.
+
+    Appends write one line to the active segment under the log's exclusive
+    lock. Once it reaches ACTIVITY_SEGMENT_BYTES it is closed (gzipped when
+    ACTIVITY_COMPRESS_SEGMENTS is set) and retention drops the oldest closed
+    segments whole. Readers take no lock: closed segments never change, and
+    only complete lines of the active segment are read.
+    """
+
+    def __init__(self, directory, legacy_file=None):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self.lock_path = os.path.join(directory, 'log')
+        self._tail = None  # (active segment path, size read, next seq)
+        os.makedirs(directory, exist_ok=True)
+
+    def _segments(self):
+        """Return segments oldest first, ignoring actives left by a crash mid-rotation"""
+        found = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_RE.match(name)
+            if match:
+                last = int(match.group(2)) if match.group(2) else None
+                found.append(Segment(self.directory, name, int(match.group(1)), last, bool(match.group(3))))
+        closed_firsts = {segment.first for segment in found if segment.closed}
+        segments = [segment for segment in found if segment.closed or segment.first not in closed_firsts]
+        return sorted(segments, key=lambda segment: (segment.first, not segment.closed))
+
+    def _migrate_legacy(self):
+        """Import the old single-file activities.json into a closed segment.
+        The file is left in place (it may be tracked seed data) and ignored
+        once any segment exists."""
+        if not self.legacy_file or not os.path.exists(self.legacy_file) or self._segments():
+            return
+        with lock_manager.exclusive(self.lock_path):
+            if not os.path.exists(self.legacy_file) or self._segments():
+                return
+            entries = load_json(self.legacy_file)
+            entries = entries[-MAX_ACTIVITY_LOGS:] if isinstance(entries, list) else []
+            if entries:
+                payload = b''.join(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n' for entry in entries)
+                self._write_closed(1, len(entries), payload)
+
+    def _write_closed(self, first, last, payload):
+        name = f"seg-{first:09d}-{last:09d}.jsonl"
+        if ACTIVITY_COMPRESS_SEGMENTS:
+            name += '.gz'
+            payload = gzip.compress(payload)
+        atomic_write(os.path.join(self.directory, name), payload)
+
+    def _next_seq(self, segments):
+        """Sequence number for the next entry (caller holds the exclusive lock)"""
+        active = segments[-1] if segments and not segments[-1].closed else None
+        if active is None:
+            return segments[-1].last + 1 if segments else 1
+        if self._tail and self._tail[0] == active.path:
+            offset, seq = self._tail[1], self._tail[2]
+        else:
+            offset, seq = 0, active.first
+        with open(active.path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+        complete = chunk.rfind(b'\n') + 1
+        seq += chunk[:complete].count(b'\n')
+        self._tail = (active.path, offset + complete, seq)
+        return seq
+
+    def append(self, fields):
+        """Append one entry (fields without an id) and return it with its id"""
+        return self.append_many([fields])[0]
+
+    def append_many(self, batch):
+        """Append entries in one write, numbering them ACT_<seq> in order"""
+        self._migrate_legacy()
+        with lock_manager.exclusive(self.lock_path):
+            segments = self._segments()
+            seq = self._next_seq(segments)
+            entries = [{"id": f"ACT_{seq + i:06d}", **fields} for i, fields in enumerate(batch)]
+            payload = b''.join(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n' for entry in entries)
+            last = seq + len(entries) - 1
+
+            active = segments[-1] if segments and not segments[-1].closed else None
+            path = active.path if active else os.path.join(self.directory, f"seg-{seq:09d}.jsonl")
+            first = active.first if active else seq
+            with open(path, 'a+b') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b'\n':
+                        payload = b'\n' + payload  # a crashed writer left a torn line
+                f.write(payload)
+                size += len(payload)
+            self._tail = (path, size, last + 1)
+
+            if size >= ACTIVITY_SEGMENT_BYTES:
+                self._rotate(path, first, last)
+        return entries
+
+    def _rotate(self, path, first, last):
+        with open(path, 'rb') as f:
+            payload = f.read()
+        self._write_closed(first, last, payload)
+        os.remove(path)
+        self._tail = None
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        """Drop the oldest closed segments once newer ones hold MAX_ACTIVITY_LOGS entries"""
+        segments = self._segments()
+        if not segments:
+            return
+        newest = self._next_seq(segments) - 1
+        for segment in segments:
+            if not segment.closed or newest - segment.last < MAX_ACTIVITY_LOGS:
+                break
+            os.remove(segment.path)
+
+    def read_lines(self, segment, offset=0):
+        """Return (complete lines from byte offset on, offset after the last one).
+
+        Closed segments are read whole (offset must be 0); for the active one
+        a trailing partial line, i.e. an append in progress, is left out.
+        """
+        with open(segment.path, 'rb') as f:
+            if segment.closed:
+                data = f.read()
+                data = gzip.decompress(data) if segment.compressed else data
+                return data.splitlines(), len(data)
+            f.seek(offset)
+            chunk = f.read()
+        complete = chunk.rfind(b'\n') + 1
+        return chunk[:complete].splitlines(), offset + complete
+
+    def clear(self):
+        """Delete every entry; numbering continues after the last one"""
+        self._migrate_legacy()
+        with lock_manager.exclusive(self.lock_path):
+            segments = self._segments()
+            seq = self._next_seq(segments)
+            for segment in segments:
+                os.remove(segment.path)
+            atomic_write(os.path.join(self.directory, f"seg-{seq:09d}.jsonl"), b'')
+            self._tail = None
+
+    def backup_to(self, folder):
+        """Copy the log segments into folder/<log dir name>"""
+        name = os.path.basename(self.directory)
+        with lock_manager.shared(self.lock_path):
+            shutil.copytree(self.directory, os.path.join(folder, name), ignore=shutil.ignore_patterns('*.lock', '*.tmp'))
+        return [f"{name}/"]
+
+class ActivityIndex:
+    """In-memory secondary indexes over the activity log.
+
+    Entries are keyed by their log sequence number (the line's position in
+    the log, so it stays unique even for imported legacy ids) and indexed by
+    user, action, (entity_type, entity_id) and hour bucket, each index being
+    an ascending list of sequence numbers. refresh() folds in only the lines
+    appended since the last call and forgets segments dropped by retention.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.entries = {}
+        self.by_user = {}
+        self.by_action = {}
+        self.by_entity = {}
+        self.by_entity_type = {}
+        self.by_bucket = {}
+        self.buckets = []  # sorted bucket keys
+        self._min_seq = 1
+        self._next_seq = 1
+        self._active = None  # (active segment path, byte offset read, seq at that offset)
+
+    def _add(self, seq, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return  # torn line from a crashed writer
+        self.entries[seq] = entry
+        self.by_user.setdefault(entry.get('user'), []).append(seq)
+        self.by_action.setdefault(entry.get('action'), []).append(seq)
+        self.by_entity.setdefault((entry.get('entity_type'), entry.get('entity_id')), []).append(seq)
+        self.by_entity_type.setdefault(entry.get('entity_type'), []).append(seq)
+        bucket = (entry.get('timestamp') or '')[:13]
+        if bucket not in self.by_bucket:
+            bisect.insort(self.buckets, bucket)
+        self.by_bucket.setdefault(bucket, []).append(seq)
+
+    def _trim(self, oldest):
+        """Forget entries below oldest (their segments were deleted)"""
+        if oldest <= self._min_seq:
+            return
+        self.entries = {seq: entry for seq, entry in self.entries.items() if seq >= oldest}
+        for index in (self.by_user, self.by_action, self.by_entity, self.by_entity_type, self.by_bucket):
+            for key in list(index):
+                kept = index[key][bisect.bisect_left(index[key], oldest):]
+                if kept:
+                    index[key] = kept
+                else:
+                    del index[key]
+        self.buckets = [bucket for bucket in self.buckets if bucket in self.by_bucket]
+        self._min_seq = oldest
+
+    def refresh(self):
+        with self._lock:
+            segments = self.log._segments()
+            if not segments:
+                self._reset()
+                return
+            if segments[0].first < self._min_seq:
+                self._reset()  # log was rebuilt underneath us
+            self._trim(segments[0].first)
+            self._next_seq = max(self._next_seq, segments[0].first)
+            for segment in segments:
+                if segment.closed and segment.last < self._next_seq:
+                    continue
+                try:
+                    if segment.closed:
+                        lines, _ = self.log.read_lines(segment)
+                        start = segment.first
+                    elif self._active and self._active[0] == segment.path:
+                        lines, offset = self.log.read_lines(segment, self._active[1])
+                        start = self._active[2]
+                    else:
+                        lines, offset = self.log.read_lines(segment)
+                        start = segment.first
+                except FileNotFoundError:
+                    break  # rotated or cleared mid-refresh; the next refresh catches up
+                for seq, line in enumerate(lines, start):
+                    if seq >= self._next_seq:
+                        self._add(seq, line)
+                self._next_seq = max(self._next_seq, start + len(lines))
+                if not segment.closed:
+                    self._active = (segment.path, offset, start + len(lines))
+
+    def query(self, users=None, actions=None, exclude_actions=None, entity_type=None, entity_id=None,
+              since=None, until=None, before=None, limit=100):
+        """Return (entries newest first, seq of the last one if more may follow)"""
+        self.refresh()
+        with self._lock:
+            candidates = []
+            if users:
+                candidates.append([self.by_user.get(user, []) for user in users])
+            if actions:
+                candidates.append([self.by_action.get(action, []) for action in actions])
+            if entity_type is not None and entity_id is not None:
+                candidates.append([self.by_entity.get((entity_type, entity_id), [])])
+            elif entity_type is not None:
+                candidates.append([self.by_entity_type.get(entity_type, [])])
+            if since or until:
+                low = bisect.bisect_left(self.buckets, since[:13]) if since else 0
+                high = bisect.bisect_right(self.buckets, until[:13]) if until else len(self.buckets)
+                candidates.append([self.by_bucket[bucket] for bucket in self.buckets[low:high]])
+
+            upper = before if before is not None else self._next_seq
+            if candidates:
+                # Walk the most selective index; the other filters are checked per entry
+                lists = min(candidates, key=lambda group: sum(len(seqs) for seqs in group))
+                seqs = heapq.merge(*[reversed(seqs[:bisect.bisect_left(seqs, upper)]) for seqs in lists], reverse=True)
+            else:
+                seqs = range(upper - 1, self._min_seq - 1, -1)
+
+            users = set(users or ())
+            actions = set(actions or ())
+            exclude_actions = set(exclude_actions or ())
+            results = []
+            last_seq = None
+            for seq in seqs:
+                entry = self.entries.get(seq)
+                if entry is None:
+                    continue
+                timestamp = entry.get('timestamp') or ''
+                if ((users and entry.get('user') not in users)
+                        or (actions and entry.get('action') not in actions)
+                        or entry.get('action') in exclude_actions
+                        or (entity_type is not None and entry.get('entity_type') != entity_type)
+                        or (entity_id is not None and entry.get('entity_id') != entity_id)
+                        or (since and timestamp < since)
+                        or (until and timestamp > until)):
+                    continue
+                if limit is not None and len(results) >= limit:
+                    return results, last_seq
+                results.append(entry)
+                last_seq = seq
+            return results, None
+
+class AsyncActivityWriter:
+    """Bounded queue plus a flusher thread that appends activities in batches.
+
+    The flusher wakes every flush_interval_ms, or as soon as batch_size
+    entries are waiting, and writes everything queued with one append. When
+    the queue is full the overflow policy decides: 'block' waits for the
+    flusher, 'drop-oldest' discards the oldest queued entry, and 'sync' makes
+    the caller write the whole queue itself. Queue order is write order.
+    """
+
+    def __init__(self, log, max_queue, flush_interval_ms, batch_size, overflow_policy):
+        if overflow_policy not in ('block', 'drop-oldest', 'sync'):
+            raise ValueError(f"Unknown ACTIVITY_OVERFLOW_POLICY '{overflow_policy}'")
+        self.log = log
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = min(batch_size, max_queue)
+        self.overflow_policy = overflow_policy
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # keeps batches in queue order
+        self._thread = None
+        self._closed = False
+        self._stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'dropped': 0, 'blocked': 0, 'sync_flushes': 0, 'errors': 0, 'max_depth': 0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Pre-fork servers: the flusher thread does not survive fork(), and
+        # entries queued in the parent are the parent's to write.
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, fields):
+        """Queue one activity; returns once it is queued (or written)"""
+        with self._cond:
+            if self._closed:
+                write_now = True
+            else:
+                write_now = False
+                self._ensure_thread()
+                if len(self._queue) >= self.max_queue:
+                    if self.overflow_policy == 'block':
+                        self._stats['blocked'] += 1
+                        self._cond.notify_all()
+                        self._cond.wait_for(lambda: len(self._queue) < self.max_queue or self._closed)
+                    elif self.overflow_policy == 'drop-oldest':
+                        self._queue.popleft()
+                        self._stats['dropped'] += 1
+                    else:
+                        self._stats['sync_flushes'] += 1
+                        write_now = True
+                self._queue.append(fields)
+                self._stats['enqueued'] += 1
+                self._stats['max_depth'] = max(self._stats['max_depth'], len(self._queue))
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+        if write_now:
+            if self._closed:
+                self.log.append(fields)
+            else:
+                self.flush()
+
+    def _take_batch(self):
+        with self._cond:
+            batch = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.log.append_many(batch)
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+        except Exception:
+            self._stats['errors'] += 1
+            Logger.log_error('Activity log batch write failed', details={'entries': len(batch), 'trace': traceback.format_exc()})
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        with self._write_lock:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._queue) >= self.batch_size or self._closed, timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write whatever is still queued (atexit hook)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        """Queue depth and throughput counters"""
+        with self._cond:
+            return dict(self._stats, depth=len(self._queue), capacity=self.max_queue, policy=self.overflow_policy)
+
+activity_log = ActivityLog(ACTIVITY_LOG_DIR, legacy_file=ACTIVITIES_FILE)
+activity_index = ActivityIndex(activity_log)
+activity_writer = None
+if ACTIVITY_ASYNC_WRITES:
+    activity_writer = AsyncActivityWriter(
+        activity_log, ACTIVITY_QUEUE_SIZE, ACTIVITY_FLUSH_INTERVAL_MS,
+        ACTIVITY_FLUSH_BATCH, ACTIVITY_OVERFLOW_POLICY
+    )
+    atexit.register(activity_writer.close)
 
 class Logger:
     """Activity and error logger"""
-    
+
     @staticmethod
     def log_activity(user, action, entity_type=None, entity_id=None, description="", status="success", details=None):
-        """Log user activity"""
-        activities = load_json(ACTIVITIES_FILE)
-        
-        if not isinstance(activities, list):
-            activities = []
-        
+        """Log user activity.
+
+        With ACTIVITY_ASYNC_WRITES the entry is queued for the background
+        writer and returned without its id, which is assigned when written.
+        """
         activity = {
-            "id": f"ACT_{len(activities) + 1:06d}",
             "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
             "user": user,
             "action": action,
@@ -31,53 +481,90 @@ class Logger:
             "status": status,
             "details": details or {}
         }
-        
-        activities.append(activity)
-        
-        # Keep only last MAX_ACTIVITY_LOGS entries
-        if len(activities) > MAX_ACTIVITY_LOGS:
-            activities = activities[-MAX_ACTIVITY_LOGS:]
-        
-        save_json(ACTIVITIES_FILE, activities)
-        return activity
-    
+
+        if activity_writer is not None:
+            activity_writer.submit(activity)
+            return dict(activity, id=None)
+        return activity_log.append(activity)
+
     @staticmethod
     def log_error(error_message, user=None, details=None):
         """Log error to error log file"""
         error_log_path = os.path.join(os.path.dirname(ACTIVITIES_FILE), 'errors.log')
-        
+
         error_entry = {
             "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
             "user": user or "SYSTEM",
             "error": error_message,
             "details": details or {}
         }
-        
+
         try:
             with open(error_log_path, 'a', encoding='utf-8') as f:
                 f.write(json.dumps(error_entry) + '\n')
         except:
             pass  # Silently fail if logging fails
-    
+
     @staticmethod
     def get_activities(user=None, action=None, limit=100):
-        """Get activity logs with optional filters"""
-        activities = load_json(ACTIVITIES_FILE)
-        
-        if not isinstance(activities, list):
-            return []
-        
-        # Filter by user if provided
-        if user:
-            activities = [a for a in activities if a.get('user') == user]
-        
-        # Filter by action if provided
-        if action:
-            activities = [a for a in activities if a.get('action') == action]
-        
-        # Sort by timestamp (most recent first)
-        activities.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        
-        # Limit results
-        return activities[:limit]
+        """Get activity logs with optional filters (most recent first)"""
+        activities, _ = Logger.query_activities(
+            users=[user] if user else None,
+            actions=[action] if action else None,
+            limit=limit
+        )
+        return activities
+
+    @staticmethod
+    def query_activities(users=None, actions=None, exclude_actions=None, entity_type=None, entity_id=None,
+                         since=None, until=None, cursor=None, limit=100):
+        """Indexed activity query, newest first; returns (activities, next_cursor).
+
+        since/until are ISO timestamps or YYYY-MM-DD dates (until is inclusive).
+        Exclusions are applied before the limit. Pass next_cursor back as
+        cursor for the following page; it is None on the last page.
+        """
+        if activity_writer is not None:
+            activity_writer.flush()  # read-your-writes within this worker
+        if until and len(until) == 10:
+            until += 'T23:59:59Z'
+        before = Logger._decode_cursor(cursor) if cursor else None
+        activities, last_seq = activity_index.query(
+            users=users, actions=actions, exclude_actions=exclude_actions,
+            entity_type=entity_type, entity_id=entity_id,
+            since=since, until=until, before=before, limit=limit
+        )
+        next_cursor = Logger._encode_cursor(last_seq) if last_seq is not None else None
+        return activities, next_cursor
+
+    @staticmethod
+    def _encode_cursor(seq):
+        return base64.urlsafe_b64encode(json.dumps({'before': seq}).encode()).decode().rstrip('=')
 
+    @staticmethod
+    def _decode_cursor(cursor):
+        """Raise ValueError for a malformed cursor"""
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            return int(json.loads(payload)['before'])
+        except (TypeError, KeyError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+
+    @staticmethod
+    def clear_activities():
+        """Remove all activity log entries"""
+        if activity_writer is not None:
+            activity_writer.flush()
+        activity_log.clear()
+
+    @staticmethod
+    def activity_queue_stats():
+        """Background writer metrics, or None when writes are synchronous"""
+        return activity_writer.stats() if activity_writer is not None else None
+
+    @staticmethod
+    def backup_activities(folder):
+        """Copy the activity log into folder; return the copied names"""
+        if activity_writer is not None:
+            activity_writer.flush()
+        return activity_log.backup_to(folder)
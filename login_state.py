@@ -0,0 +1,273 @@
+"""
+Login state for EduPortal
+Last login, login count and lockout windows, kept out of users.json
+"""
+
+import atexit
+import os
+import shutil
+import threading
+import time
+import traceback
+from datetime import datetime
+from config import (
+    LOGIN_STATE_FILE, LOGIN_STATE_FLUSH_INTERVAL_SECONDS, LOGIN_STATE_FLUSH_BATCH,
+    MAX_LOGIN_ATTEMPTS, LOCKOUT_DURATION_MINUTES
+)
+from locks import lock_manager
+from utils import load_json, save_json
+
+def _empty_record():
+    return {'last_login': None, 'login_count': 0, 'failures': [], 'locked_at': None, 'reset_at': 0}
+
+def _merge(record, pending, window, max_failures):
+    """Fold pending changes into a stored record (both may be partial).
+
+    login_count is added as a delta and everything else keeps the newest
+    value, so merges from several workers commute. A reset drops the
+    failures and lock that happened before it.
+    """
+    merged = _empty_record()
+    merged.update(record or {})
+    merged['login_count'] = merged['login_count'] + pending.get('logins', 0)
+    if pending.get('last_login') and (merged['last_login'] or '') < pending['last_login']:
+        merged['last_login'] = pending['last_login']
+    merged['reset_at'] = max(merged['reset_at'], pending.get('reset_at', 0))
+    locked_at = max(merged['locked_at'] or 0, pending.get('locked_at') or 0)
+    merged['locked_at'] = locked_at if locked_at > merged['reset_at'] else None
+    horizon = max(merged['reset_at'], time.time() - window)
+    failures = sorted(set(merged['failures']) | set(pending.get('failures', ())))
+    merged['failures'] = [ts for ts in failures if ts > horizon][-max_failures:]
+    return merged
+
+class LoginStateStore:
+    """Per-user login bookkeeping in LOGIN_STATE_FILE.
+
+    Successful logins only touch in-memory pending counters, which a flusher
+    thread merges into the file every flush_interval seconds (or once
+    batch_size users are dirty) under the file's exclusive lock. Failed
+    logins go into a sliding window: max_failures failures within the
+    lockout duration lock the account for that duration. Failures (and the
+    lock) are written through at once, so every worker counts them and
+    honours the lock.
+    """
+
+    def __init__(self, path, flush_interval, batch_size, max_failures=MAX_LOGIN_ATTEMPTS, lockout_minutes=LOCKOUT_DURATION_MINUTES):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_failures = max_failures
+        self.window = lockout_minutes * 60
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._stats = {'logins': 0, 'failures': 0, 'lockouts': 0, 'flushes': 0, 'errors': 0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name='login-state-writer', daemon=True)
+            self._thread.start()
+
+    def _pending_for(self, username):
+        pending = self._pending.get(username)
+        if pending is None:
+            pending = self._pending[username] = {'logins': 0, 'failures': []}
+        return pending
+
+    def _record(self, username):
+        stored = load_json(self.path, readonly=True).get(username)
+        with self._cond:
+            pending = self._pending.get(username, {})
+            return _merge(stored, pending, self.window, self.max_failures)
+
+    def get(self, username):
+        """Return {last_login, login_count, failed_login_attempts, account_locked, locked_until}"""
+        record = self._record(username)
+        locked_until = self._locked_until(record)
+        return {
+            'last_login': record['last_login'],
+            'login_count': record['login_count'],
+            'failed_login_attempts': len(record['failures']),
+            'account_locked': locked_until is not None,
+            'locked_until': locked_until.strftime("%Y-%m-%dT%H:%M:%SZ") if locked_until else None
+        }
+
+    def _locked_until(self, record):
+        if record['locked_at'] and time.time() < record['locked_at'] + self.window:
+            return datetime.fromtimestamp(record['locked_at'] + self.window)
+        return None
+
+    def is_locked(self, username):
+        return self._locked_until(self._record(username)) is not None
+
+    def record_failure(self, username):
+        """Add a failed attempt, written through; returns True if it locked
+        the account"""
+        now = time.time()
+        with self._write_lock:
+            with self._cond:
+                pending = self._pending.pop(username, None) or {'logins': 0, 'failures': []}
+                self._stats['failures'] += 1
+            pending['failures'] = pending['failures'] + [now]
+            locked = failed = False
+            try:
+                with lock_manager.exclusive(self.path):
+                    data = load_json(self.path)
+                    record = _merge(data.get(username), pending, self.window, self.max_failures)
+                    locked = len(record['failures']) >= self.max_failures and not self._locked_until(record)
+                    if locked:
+                        record['locked_at'] = pending['locked_at'] = now
+                    data[username] = record
+                    if not save_json(self.path, data):
+                        raise IOError(f'Could not write {self.path}')
+            except Exception:
+                self._requeue({username: pending})
+                locked, failed = False, True
+            if locked:
+                with self._cond:
+                    self._stats['lockouts'] += 1
+        if failed:
+            self._mark_dirty()  # the flusher retries it
+        return locked
+
+    def record_login(self, username, timestamp):
+        """Count a successful login and clear the user's failure window"""
+        with self._cond:
+            pending = self._pending_for(username)
+            pending['logins'] += 1
+            pending['last_login'] = timestamp
+            pending['reset_at'] = time.time()
+            pending['failures'] = []
+            pending.pop('locked_at', None)
+            self._stats['logins'] += 1
+        self._mark_dirty()
+
+    def reset(self, username):
+        """Clear failures and any lock now (password reset, admin unlock)"""
+        with self._cond:
+            pending = self._pending_for(username)
+            pending['reset_at'] = time.time()
+            pending['failures'] = []
+            pending.pop('locked_at', None)
+        self.flush()
+
+    def _mark_dirty(self):
+        with self._cond:
+            if self._closed:
+                write_now = True
+            else:
+                write_now = False
+                self._ensure_thread()
+                if len(self._pending) >= self.batch_size:
+                    self._cond.notify_all()
+        if write_now:
+            self.flush()
+
+    def flush(self):
+        """Merge pending changes into the file from the calling thread"""
+        with self._write_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                with lock_manager.exclusive(self.path):
+                    data = load_json(self.path)
+                    for username, changes in pending.items():
+                        data[username] = _merge(data.get(username), changes, self.window, self.max_failures)
+                    if not save_json(self.path, data):
+                        raise IOError(f'Could not write {self.path}')
+                self._stats['flushes'] += 1
+            except Exception:
+                self._requeue(pending)
+
+    def _requeue(self, pending):
+        """Put changes that failed to write back in front of newer ones"""
+        self._stats['errors'] += 1
+        with self._cond:
+            for username, changes in pending.items():
+                current = self._pending.get(username)
+                if current is None:
+                    self._pending[username] = changes
+                else:
+                    current['logins'] += changes['logins']
+                    current['failures'] = changes['failures'] + current['failures']
+                    for key in ('last_login', 'reset_at', 'locked_at'):
+                        if key in changes and key not in current:
+                            current[key] = changes[key]
+        from logger import Logger
+        Logger.log_error('Login state flush failed', details={'users': len(pending), 'trace': traceback.format_exc()})
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.batch_size or self._closed, timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write whatever is pending (atexit hook)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def seed_from_users(self, users):
+        """Create the file from the counters older users.json records carry"""
+        with lock_manager.exclusive(self.path):
+            if os.path.exists(self.path):
+                return False
+            data = {}
+            for username, user in users.items():
+                record = _empty_record()
+                record['last_login'] = user.get('last_login')
+                record['login_count'] = user.get('login_count', 0) or 0
+                if user.get('account_locked') and user.get('locked_until'):
+                    try:
+                        locked_until = datetime.strptime(user['locked_until'], "%Y-%m-%dT%H:%M:%SZ")
+                        record['locked_at'] = locked_until.timestamp() - self.window
+                    except ValueError:
+                        pass
+                data[username] = record
+            return save_json(self.path, data)
+
+    def forget(self, usernames):
+        """Drop the state of deleted users"""
+        usernames = set(usernames)
+        if not usernames:
+            return
+        self.flush()
+        with lock_manager.exclusive(self.path):
+            data = load_json(self.path)
+            if usernames & data.keys():
+                save_json(self.path, {key: value for key, value in data.items() if key not in usernames})
+
+    def backup_to(self, folder):
+        """Copy the state file into folder; return the copied names"""
+        self.flush()
+        if not os.path.exists(self.path):
+            return []
+        filename = os.path.basename(self.path)
+        with lock_manager.shared(self.path):
+            shutil.copy2(self.path, os.path.join(folder, filename))
+        return [filename]
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending))
+
+login_state = LoginStateStore(LOGIN_STATE_FILE, LOGIN_STATE_FLUSH_INTERVAL_SECONDS, LOGIN_STATE_FLUSH_BATCH)
+atexit.register(login_state.close)
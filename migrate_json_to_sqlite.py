@@ -0,0 +1,41 @@
+"""
+One-shot migration for EduPortal
+Imports the JSON data files into the SQLite database used when
+STORAGE_BACKEND = 'sqlite'
+"""
+
+import argparse
+from config import SQLITE_DB_FILE
+from repository import ENTITY_FILES, get_repository, get_database
+from registrations import get_registration_store
+
+def migrate(force=False):
+    """Copy every JSON entity collection into SQLite; return {entity: count}"""
+    counts = {}
+    with get_database().transaction():
+        for entity in ENTITY_FILES:
+            target = get_repository(entity, backend='sqlite')
+            if target.count() and not force:
+                raise SystemExit(f"Table '{entity}' already has data in {SQLITE_DB_FILE}; rerun with --force to overwrite.")
+            records = get_repository(entity, backend='json').all()
+            target.replace_all(records)
+            counts[entity] = len(records)
+    source, target = get_registration_store('json'), get_registration_store('sqlite')
+    if force:
+        target.clear()
+    counts['registrations'] = 0
+    for evt_id in get_repository('events', backend='json').keys():
+        registrations, waitlist = source.registrations(evt_id), source.waitlist(evt_id)
+        if target.import_event(evt_id, registrations, waitlist):
+            counts['registrations'] += len(registrations) + len(waitlist)
+    return counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import EduPortal JSON data files into SQLite')
+    parser.add_argument('--force', action='store_true', help='overwrite tables that already contain data')
+    args = parser.parse_args()
+
+    counts = migrate(force=args.force)
+    for entity, count in counts.items():
+        print(f"{entity:<10} {count:>7} records")
+    print(f"Imported into {SQLITE_DB_FILE}. Set STORAGE_BACKEND = 'sqlite' in config.py to use it.")
@@ -0,0 +1,127 @@
+"""
+Password hashing for EduPortal
+PBKDF2-HMAC-SHA256 with a configurable cost, computed in a bounded
+process pool so slow hashes never run on the request threads
+"""
+
+import atexit
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import PASSWORD_HASH_ITERATIONS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+ALGORITHM = 'pbkdf2_sha256'
+
+class PasswordHasherBusy(Exception):
+    """Raised when PASSWORD_HASH_MAX_PENDING hashes are already queued or running"""
+
+def _pbkdf2(password, salt, iterations):
+    # Runs in the pool's worker processes
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+def is_legacy_hash(stored):
+    """True for the unsalted SHA-256 hex digests written by older versions"""
+    return isinstance(stored, str) and len(stored) == 64 and '$' not in stored
+
+class PasswordHasher:
+    """Stored hashes look like pbkdf2_sha256$<iterations>$<salt>$<hash>.
+
+    hash() and verify() block the calling thread until a pool worker is
+    done, but at most max_pending of them may be waiting at once; beyond
+    that they raise PasswordHasherBusy immediately. workers=0 hashes in the
+    calling thread (still subject to max_pending).
+    """
+
+    def __init__(self, iterations=PASSWORD_HASH_ITERATIONS, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING):
+        self.iterations = iterations
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'legacy_verified': 0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # The parent's pool processes belong to the parent
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _derive(self, password, salt, iterations):
+        if not self._slots.acquire(blocking=False):
+            self._stats['rejected'] += 1
+            raise PasswordHasherBusy('Too many password checks in progress')
+        try:
+            if not self.workers:
+                return _pbkdf2(password, salt, iterations)
+            try:
+                return self._executor().submit(_pbkdf2, password, salt, iterations).result()
+            except BrokenProcessPool:
+                # A worker died (OOM killer, ...): start a fresh pool once
+                with self._pool_lock:
+                    self._pool = None
+                return self._executor().submit(_pbkdf2, password, salt, iterations).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        salt = secrets.token_bytes(16)
+        derived = self._derive(password, salt, self.iterations)
+        self._stats['hashed'] += 1
+        return f"{ALGORITHM}${self.iterations}${_b64(salt)}${_b64(derived)}"
+
+    def verify(self, password, stored):
+        """Check password against a stored hash (PBKDF2 or legacy SHA-256)"""
+        if not isinstance(stored, str) or not stored:
+            return False
+        if is_legacy_hash(stored):
+            self._stats['legacy_verified'] += 1
+            return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        try:
+            algorithm, iterations, salt, expected = stored.split('$')
+            iterations = int(iterations)
+            salt, expected = _unb64(salt), _unb64(expected)
+        except ValueError:
+            return False
+        if algorithm != ALGORITHM:
+            return False
+        self._stats['verified'] += 1
+        return hmac.compare_digest(self._derive(password, salt, iterations), expected)
+
+    def needs_upgrade(self, stored):
+        """True if stored is a legacy hash or uses a different iteration count"""
+        if is_legacy_hash(stored):
+            return True
+        parts = stored.split('$') if isinstance(stored, str) else []
+        return len(parts) != 4 or parts[0] != ALGORITHM or parts[1] != str(self.iterations)
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self):
+        return dict(self._stats, workers=self.workers, iterations=self.iterations, max_pending=self.max_pending)
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.close)
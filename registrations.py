@@ -0,0 +1,496 @@
+"""
+Event registrations for EduPortal
+Per-event sign-ups with an atomic capacity check, O(1) duplicate checks and
+an optional FIFO waitlist, stored as appended records instead of inside
+events.json
+"""
+
+import base64
+import bisect
+import json
+import os
+import re
+import shutil
+import threading
+import traceback
+from config import STORAGE_BACKEND, SQLITE_DB_FILE, REGISTRATIONS_DIR
+from locks import lock_manager
+from repository import SqliteDatabase
+
+REGISTERED = 'registered'
+WAITLISTED = 'waitlisted'
+DUPLICATE = 'duplicate'
+FULL = 'full'
+
+class RegistrationStore:
+    """Registrations and waitlists keyed by event id.
+
+    details is the caller's record for a sign-up (student_name, section,
+    registered_at, ...); the store adds username and status.
+    """
+
+    def register(self, event_id, username, capacity, details, waitlist=False):
+        """Take a seat if fewer than capacity are registered, else join the
+        waitlist when allowed. Returns (status, waitlist position or None)
+        with status REGISTERED, WAITLISTED, DUPLICATE or FULL."""
+        raise NotImplementedError
+
+    def cancel(self, event_id, username, capacity, promoted_at=None):
+        """Drop a registration or waitlist place; the head of the waitlist
+        takes a freed seat. Returns (previous status or None, promoted username or None)"""
+        raise NotImplementedError
+
+    def page(self, event_id, status=REGISTERED, after=None, limit=None):
+        """Return (records, total, last) for one page of REGISTERED records in
+        sign-up order or WAITLISTED ones in queue order, starting after
+        sequence number `after`; last is the sequence number to continue
+        from, or None on the final page"""
+        raise NotImplementedError
+
+    def iter_records(self, event_id, status=REGISTERED, chunk=500):
+        """Yield every record of one status, a page at a time"""
+        after = None
+        while True:
+            records, _, after = self.page(event_id, status, after, chunk)
+            yield from records
+            if after is None:
+                return
+
+    def registrations(self, event_id):
+        """Registered records in sign-up order"""
+        return list(self.iter_records(event_id, REGISTERED))
+
+    def waitlist(self, event_id):
+        """Waitlisted records, next in line first"""
+        return list(self.iter_records(event_id, WAITLISTED))
+
+    def status(self, event_id, username):
+        """(REGISTERED/WAITLISTED or None, waitlist position or None)"""
+        raise NotImplementedError
+
+    def counts(self, event_ids):
+        """{event_id: (registered, waitlisted)} for many events"""
+        raise NotImplementedError
+
+    def import_event(self, event_id, registrations, waitlist=()):
+        """Load registrations embedded in an older event record (or copied
+        from another store), unless the event already has stored ones;
+        returns True if imported"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def backup_to(self, folder):
+        """Copy the store into folder; return the copied names"""
+        raise NotImplementedError
+
+def encode_registration_cursor(seq):
+    return base64.urlsafe_b64encode(json.dumps({'after': seq}).encode()).decode().rstrip('=')
+
+def decode_registration_cursor(cursor):
+    """Raise ValueError for a malformed cursor"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return int(json.loads(payload)['after'])
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+class _EventLog:
+    """In-memory fold of one event's log file"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, file_id=None):
+        # username -> (seq, record); seq is the line number of the register,
+        # waitlist or promote line, so both dicts stay in seq order
+        self.registered = {}
+        self.waiting = {}
+        self.file_id = file_id
+        self.offset = 0
+        self.lines = 0
+
+    def apply(self, op):
+        self.lines += 1
+        username = op.get('username')
+        kind = op.get('op')
+        record = {key: value for key, value in op.items() if key != 'op'}
+        if kind == 'register':
+            self.registered[username] = (self.lines, dict(record, status=REGISTERED))
+        elif kind == 'waitlist':
+            self.waiting[username] = (self.lines, dict(record, status=WAITLISTED))
+        elif kind == 'promote':
+            promoted = self.waiting.pop(username, None)
+            if promoted is not None:
+                self.registered[username] = (self.lines, dict(promoted[1], status=REGISTERED, promoted_at=op.get('promoted_at')))
+        elif kind == 'cancel':
+            self.registered.pop(username, None)
+            self.waiting.pop(username, None)
+
+class JsonRegistrationStore(RegistrationStore):
+    """One append-only <event id>.jsonl per event under directory.
+
+    A line is {'op': 'register'|'waitlist'|'promote'|'cancel', 'username',
+    ...}. Each worker keeps every event's log folded into dicts and reads
+    only the bytes appended since its last look. A sign-up takes the
+    exclusive lock of that event's log alone, catches up, decides against
+    the dicts and appends one line, so different events never wait on each
+    other and the seat count cannot be overtaken between check and write.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._logs = {}
+        self._logs_lock = threading.Lock()
+
+    def _path(self, event_id):
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_-]', '_', event_id) + '.jsonl')
+
+    def _log(self, event_id):
+        with self._logs_lock:
+            log = self._logs.get(event_id)
+            if log is None:
+                log = self._logs[event_id] = _EventLog()
+            return log
+
+    def _fold(self, event_id):
+        """Apply lines appended since the last read; call under the file lock"""
+        log = self._log(event_id)
+        with log.lock:
+            try:
+                with open(self._path(event_id), 'rb') as f:
+                    stat_result = os.fstat(f.fileno())
+                    file_id = (stat_result.st_dev, stat_result.st_ino)
+                    if file_id != log.file_id or stat_result.st_size < log.offset:
+                        # New or replaced file (clear/import): start over
+                        log.reset(file_id)
+                    f.seek(log.offset)
+                    chunk = f.read()
+            except FileNotFoundError:
+                log.reset()
+                return log
+            complete = chunk.rfind(b'\n') + 1
+            for line in chunk[:complete].splitlines():
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    op = {}  # torn write from a crash; still counts as a line
+                log.apply(op)
+            log.offset += complete
+            return log
+
+    def _append(self, event_id, ops):
+        payload = b''.join(json.dumps(op, ensure_ascii=False).encode('utf-8') + b'\n' for op in ops)
+        with open(self._path(event_id), 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        return self._fold(event_id)
+
+    def register(self, event_id, username, capacity, details, waitlist=False):
+        with lock_manager.exclusive(self._path(event_id)):
+            log = self._fold(event_id)
+            if username in log.registered or username in log.waiting:
+                return DUPLICATE, None
+            if len(log.registered) < capacity:
+                self._append(event_id, [dict(details, op='register', username=username)])
+                return REGISTERED, None
+            if not waitlist:
+                return FULL, None
+            log = self._append(event_id, [dict(details, op='waitlist', username=username)])
+            return WAITLISTED, len(log.waiting)
+
+    def cancel(self, event_id, username, capacity, promoted_at=None):
+        with lock_manager.exclusive(self._path(event_id)):
+            log = self._fold(event_id)
+            previous = REGISTERED if username in log.registered else WAITLISTED if username in log.waiting else None
+            if previous is None:
+                return None, None
+            ops = [{'op': 'cancel', 'username': username}]
+            promoted = None
+            seats = len(log.registered) - (previous == REGISTERED)
+            waiting = [name for name in log.waiting if name != username]
+            if waiting and seats < capacity:
+                promoted = waiting[0]
+                ops.append({'op': 'promote', 'username': promoted, 'promoted_at': promoted_at})
+            self._append(event_id, ops)
+            return previous, promoted
+
+    def _read(self, event_id):
+        with lock_manager.shared(self._path(event_id)):
+            return self._fold(event_id)
+
+    def page(self, event_id, status=REGISTERED, after=None, limit=None):
+        log = self._read(event_id)
+        with log.lock:
+            entries = list((log.registered if status == REGISTERED else log.waiting).values())
+        start = bisect.bisect_right([seq for seq, _ in entries], after) if after is not None else 0
+        stop = len(entries) if limit is None else start + limit
+        page = entries[start:stop]
+        last = page[-1][0] if page and stop < len(entries) else None
+        return [record for _, record in page], len(entries), last
+
+    def status(self, event_id, username):
+        log = self._read(event_id)
+        with log.lock:
+            if username in log.registered:
+                return REGISTERED, None
+            if username in log.waiting:
+                return WAITLISTED, list(log.waiting).index(username) + 1
+            return None, None
+
+    def counts(self, event_ids):
+        found = {}
+        for event_id in event_ids:
+            log = self._read(event_id)
+            with log.lock:
+                found[event_id] = (len(log.registered), len(log.waiting))
+        return found
+
+    def import_event(self, event_id, registrations, waitlist=()):
+        ops = [dict(reg, op='register') for reg in registrations or () if reg.get('username')]
+        ops += [dict(reg, op='waitlist') for reg in waitlist if reg.get('username')]
+        if not ops:
+            return False
+        with lock_manager.exclusive(self._path(event_id)):
+            if os.path.exists(self._path(event_id)):
+                return False
+            self._append(event_id, [{key: value for key, value in op.items() if key != 'status'} for op in ops])
+            return True
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.jsonl'):
+                path = os.path.join(self.directory, filename)
+                with lock_manager.exclusive(path):
+                    os.remove(path)
+        with self._logs_lock:
+            self._logs = {}
+
+    def backup_to(self, folder):
+        name = os.path.basename(self.directory)
+        target = os.path.join(folder, name)
+        os.makedirs(target, exist_ok=True)
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.jsonl'):
+                path = os.path.join(self.directory, filename)
+                with lock_manager.shared(path):
+                    shutil.copy2(path, os.path.join(target, filename))
+        return [f"{name}/"]
+
+def _create_registration_schema(conn):
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS event_registrations ('
+        'event_id TEXT NOT NULL, username TEXT NOT NULL, status TEXT NOT NULL, '
+        'seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (event_id, username))'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_event_registrations_order ON event_registrations(event_id, status, seq)')
+    # Seat counters, changed in the same transaction as the rows they count
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS event_registration_counts ('
+        'event_id TEXT PRIMARY KEY, registered INTEGER NOT NULL DEFAULT 0, waitlisted INTEGER NOT NULL DEFAULT 0)'
+    )
+
+class SqliteRegistrationStore(RegistrationStore):
+    """Registrations in SQLITE_DB_FILE.
+
+    A seat is taken by `UPDATE ... SET registered = registered + 1 WHERE
+    registered < capacity` inside BEGIN IMMEDIATE, so the count check and
+    the insert are one atomic step for every worker; (event_id, username)
+    is the primary key for duplicate checks.
+    """
+
+    def __init__(self, path):
+        self.db = SqliteDatabase(path, schema=_create_registration_schema)
+        self.db.connection()  # create the tables now, never inside another write transaction
+
+    @staticmethod
+    def _insert(conn, event_id, username, status, details):
+        conn.execute(
+            'INSERT INTO event_registrations (event_id, username, status, seq, data) '
+            'VALUES (?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM event_registrations), ?)',
+            (event_id, username, status, json.dumps(dict(details, username=username), ensure_ascii=False))
+        )
+
+    def register(self, event_id, username, capacity, details, waitlist=False):
+        with self.db.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO event_registration_counts (event_id) VALUES (?)', (event_id,))
+            if conn.execute('SELECT 1 FROM event_registrations WHERE event_id = ? AND username = ?', (event_id, username)).fetchone():
+                return DUPLICATE, None
+            if conn.execute(
+                'UPDATE event_registration_counts SET registered = registered + 1 WHERE event_id = ? AND registered < ?',
+                (event_id, capacity)
+            ).rowcount:
+                self._insert(conn, event_id, username, REGISTERED, details)
+                return REGISTERED, None
+            if not waitlist:
+                return FULL, None
+            conn.execute('UPDATE event_registration_counts SET waitlisted = waitlisted + 1 WHERE event_id = ?', (event_id,))
+            self._insert(conn, event_id, username, WAITLISTED, details)
+            position = conn.execute('SELECT waitlisted FROM event_registration_counts WHERE event_id = ?', (event_id,)).fetchone()[0]
+            return WAITLISTED, position
+
+    def cancel(self, event_id, username, capacity, promoted_at=None):
+        with self.db.transaction() as conn:
+            row = conn.execute('SELECT status FROM event_registrations WHERE event_id = ? AND username = ?', (event_id, username)).fetchone()
+            if row is None:
+                return None, None
+            previous = row[0]
+            conn.execute('DELETE FROM event_registrations WHERE event_id = ? AND username = ?', (event_id, username))
+            column = 'registered' if previous == REGISTERED else 'waitlisted'
+            conn.execute(f'UPDATE event_registration_counts SET {column} = {column} - 1 WHERE event_id = ?', (event_id,))
+            registered = conn.execute('SELECT registered FROM event_registration_counts WHERE event_id = ?', (event_id,)).fetchone()[0]
+            promoted = None
+            if registered < capacity:
+                head = conn.execute(
+                    'SELECT username, data FROM event_registrations WHERE event_id = ? AND status = ? ORDER BY seq LIMIT 1',
+                    (event_id, WAITLISTED)
+                ).fetchone()
+                if head is not None:
+                    promoted = head[0]
+                    data = dict(json.loads(head[1]), promoted_at=promoted_at)
+                    conn.execute(
+                        'UPDATE event_registrations SET status = ?, data = ?, '
+                        'seq = (SELECT MAX(seq) + 1 FROM event_registrations) WHERE event_id = ? AND username = ?',
+                        (REGISTERED, json.dumps(data, ensure_ascii=False), event_id, promoted)
+                    )
+                    conn.execute(
+                        'UPDATE event_registration_counts SET registered = registered + 1, waitlisted = waitlisted - 1 WHERE event_id = ?',
+                        (event_id,)
+                    )
+            return previous, promoted
+
+    def page(self, event_id, status=REGISTERED, after=None, limit=None):
+        conn = self.db.connection()
+        rows = conn.execute(
+            'SELECT seq, data FROM event_registrations WHERE event_id = ? AND status = ? AND seq > ? ORDER BY seq LIMIT ?',
+            (event_id, status, after or 0, -1 if limit is None else limit + 1)
+        ).fetchall()
+        registered, waitlisted = self.counts([event_id])[event_id]
+        last = rows[limit - 1][0] if limit is not None and len(rows) > limit else None
+        records = [dict(json.loads(data), status=status) for _, data in rows[:limit]]
+        return records, registered if status == REGISTERED else waitlisted, last
+
+    def status(self, event_id, username):
+        conn = self.db.connection()
+        row = conn.execute('SELECT status, seq FROM event_registrations WHERE event_id = ? AND username = ?', (event_id, username)).fetchone()
+        if row is None:
+            return None, None
+        if row[0] == REGISTERED:
+            return REGISTERED, None
+        ahead = conn.execute(
+            'SELECT COUNT(*) FROM event_registrations WHERE event_id = ? AND status = ? AND seq < ?', (event_id, WAITLISTED, row[1])
+        ).fetchone()[0]
+        return WAITLISTED, ahead + 1
+
+    def counts(self, event_ids):
+        event_ids = list(event_ids)
+        found = dict.fromkeys(event_ids, (0, 0))
+        conn = self.db.connection()
+        for start in range(0, len(event_ids), 500):  # stay under SQLite's bound-parameter limit
+            chunk = event_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            for event_id, registered, waitlisted in conn.execute(
+                f'SELECT event_id, registered, waitlisted FROM event_registration_counts WHERE event_id IN ({placeholders})', chunk
+            ):
+                found[event_id] = (registered, waitlisted)
+        return found
+
+    def import_event(self, event_id, registrations, waitlist=()):
+        entries = {}
+        for status, records in ((REGISTERED, registrations or ()), (WAITLISTED, waitlist)):
+            for reg in records:
+                if reg.get('username') and reg['username'] not in entries:
+                    entries[reg['username']] = (status, {key: value for key, value in reg.items() if key != 'status'})
+        if not entries:
+            return False
+        with self.db.transaction() as conn:
+            if conn.execute('SELECT 1 FROM event_registration_counts WHERE event_id = ?', (event_id,)).fetchone():
+                return False
+            registered = sum(status == REGISTERED for status, _ in entries.values())
+            conn.execute(
+                'INSERT INTO event_registration_counts (event_id, registered, waitlisted) VALUES (?, ?, ?)',
+                (event_id, registered, len(entries) - registered)
+            )
+            for username, (status, reg) in entries.items():
+                self._insert(conn, event_id, username, status, reg)
+            return True
+
+    def clear(self):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM event_registrations')
+            conn.execute('DELETE FROM event_registration_counts')
+
+    def backup_to(self, folder):
+        return []  # tables live in SQLITE_DB_FILE, which backup_storage() copies
+
+class EventCountPublisher:
+    """Materializes registered_count / waitlisted_count on event records.
+
+    publish() runs after a sign-up or cancellation. The counts are read
+    from the store inside the events transaction, so whichever write lands
+    last carries counts at least as new as every publish before it. While
+    one thread is publishing an event, further calls for it only mark it
+    dirty and that thread writes once more, so a burst of sign-ups turns
+    into a few event writes instead of one per registrant.
+    """
+
+    def __init__(self, store, events_repo):
+        self.store = store
+        self.events_repo = events_repo
+        self._lock = threading.Lock()
+        self._running = set()
+        self._dirty = set()
+        self._stats = {'published': 0, 'coalesced': 0, 'errors': 0}
+
+    def publish(self, event_id):
+        with self._lock:
+            if event_id in self._running:
+                self._dirty.add(event_id)
+                self._stats['coalesced'] += 1
+                return
+            self._running.add(event_id)
+        try:
+            while True:
+                self._write(event_id)
+                with self._lock:
+                    # Hand back in the same critical section that found
+                    # nothing dirty, so a later call publishes itself
+                    if event_id not in self._dirty:
+                        self._running.discard(event_id)
+                        return
+                    self._dirty.discard(event_id)
+        except Exception:
+            with self._lock:
+                self._running.discard(event_id)
+                self._dirty.discard(event_id)
+            self._stats['errors'] += 1
+            from logger import Logger
+            Logger.log_error('Publishing registration counts failed', details={'event_id': event_id, 'trace': traceback.format_exc()})
+
+    def _write(self, event_id):
+        with self.events_repo.transaction():
+            event = self.events_repo.get(event_id)
+            if event is None:
+                return
+            registered, waitlisted = self.store.counts([event_id])[event_id]
+            if event.get('registered_count') != registered or event.get('waitlisted_count', 0) != waitlisted:
+                event['registered_count'] = registered
+                event['waitlisted_count'] = waitlisted
+                self.events_repo.put(event_id, event)
+                self._stats['published'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+def get_registration_store(backend=None):
+    """Build the registration store for STORAGE_BACKEND"""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'sqlite':
+        return SqliteRegistrationStore(SQLITE_DB_FILE)
+    if backend == 'json':
+        return JsonRegistrationStore(REGISTRATIONS_DIR)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'")
@@ -0,0 +1,869 @@
+"""
+Storage repositories for EduPortal
+Per-entity get/put/query access backed by the JSON files or by SQLite
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import (
+    USERS_FILE, ACADEMICS_FILE, STUDENTS_FILE, EVENTS_FILE, EVENTS_ARCHIVE_FILE, TIMETABLE_FILE,
+    TIMETABLE_SHARD_DIR, DAYS_OF_WEEK, STORAGE_BACKEND, SQLITE_DB_FILE,
+    JOURNAL_ENTITIES, JOURNAL_COMPACT_ENTRIES, JOURNAL_COMPACT_BYTES
+)
+from locks import lock_manager
+from utils import FrozenDict, load_json, save_json, atomic_write, file_signature, freeze, thaw
+
+# JSON file behind each entity collection
+ENTITY_FILES = {
+    'users': USERS_FILE,
+    'academics': ACADEMICS_FILE,
+    'students': STUDENTS_FILE,
+    'events': EVENTS_FILE,
+    'events_archive': EVENTS_ARCHIVE_FILE,
+    'timetable': TIMETABLE_FILE
+}
+
+# Record fields mirrored into indexed SQLite columns, per entity
+INDEXED_FIELDS = {
+    'users': ['id', 'role', 'status'],
+    'academics': ['email', 'department', 'status'],
+    'students': ['login_id', 'section', 'status'],
+    'events': ['date', 'status'],
+    'events_archive': ['date', 'status'],
+    'timetable': ['day', 'section']
+}
+
+def _matches(record, filters):
+    return all(record.get(field) == value for field, value in filters.items())
+
+class Repository:
+    """Keyed record collection for one entity (users, students, ...)"""
+
+    def __init__(self, entity):
+        self.entity = entity
+        self._subscribers = []
+
+    def get(self, key):
+        """Return a mutable copy of one record, or None"""
+        raise NotImplementedError
+
+    def version(self):
+        """Opaque value that changes whenever the collection changes (in any
+        process); None when the backend cannot tell, meaning "maybe changed"
+        """
+        return None
+
+    def subscribe(self, callback):
+        """Call callback(changes, before, after) after each write from this process.
+
+        changes maps key -> new record (None for a delete), or is None when
+        the whole collection was replaced. before/after are version() just
+        before and after the write, taken under the write lock, so a
+        subscriber whose state matches `before` can apply changes and adopt
+        `after`; any other state has missed a write and must rebuild.
+        """
+        self._subscribers.append(callback)
+
+    def _notify(self, changes, before, after):
+        for callback in self._subscribers:
+            callback(changes, before, after)
+
+    def all(self):
+        """Return {key: record} in insertion order (treat as read-only)"""
+        raise NotImplementedError
+
+    def keys(self):
+        return list(self.all().keys())
+
+    def get_many(self, keys):
+        """Return {key: record} (read-only) for the keys that exist, in keys order"""
+        records = self.all()
+        return {key: records[key] for key in keys if key in records}
+
+    def count(self, **filters):
+        return len(self.query(**filters)) if filters else len(self.all())
+
+    def query(self, **filters):
+        """Return records whose fields equal all given filter values"""
+        return [record for record in self.all().values() if _matches(record, filters)]
+
+    def put(self, key, record):
+        self.put_many({key: record})
+
+    def put_many(self, records):
+        raise NotImplementedError
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        raise NotImplementedError
+
+    def replace_all(self, records):
+        """Replace the whole collection with {key: record}"""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        """Group a read-modify-write sequence into one unit"""
+        yield self
+
+    def compact(self):
+        """Fold any pending journal into the main store (no-op by default)"""
+        return False
+
+class TimetableMixin:
+    """Week view shared by the timetable repositories"""
+
+    def week(self):
+        """Return a fresh {day: [entries]} dict covering every day of the week"""
+        return group_timetable_by_day(self.all().values())
+
+class JsonRepository(Repository):
+    """Repository over one whole-file JSON dict (the original storage format)"""
+
+    def __init__(self, entity, filepath):
+        super().__init__(entity)
+        self.filepath = filepath
+
+    def _records_from_file(self, data):
+        """Convert parsed file contents into {key: record}"""
+        return data if isinstance(data, dict) else {}
+
+    def _file_from_records(self, records):
+        """Convert {key: record} into the on-disk file structure"""
+        return dict(records)
+
+    def get(self, key):
+        record = self.all().get(key)
+        return thaw(record) if record is not None else None
+
+    def all(self):
+        return self._records_from_file(load_json(self.filepath, readonly=True))
+
+    def _load_mutable(self):
+        return self._records_from_file(load_json(self.filepath))
+
+    def version(self):
+        # Under the lock, so a write is never visible before its notification
+        with lock_manager.shared(self.filepath):
+            return file_signature(self.filepath)
+
+    def _save(self, data, changes):
+        with self.transaction():
+            before = self.version()
+            saved = save_json(self.filepath, self._file_from_records(data))
+            if saved:
+                self._notify(changes, before, self.version())
+            return saved
+
+    def put_many(self, records):
+        with self.transaction():
+            data = self._load_mutable()
+            data.update(records)
+            return self._save(data, dict(records))
+
+    def delete_many(self, keys):
+        with self.transaction():
+            data = self._load_mutable()
+            for key in keys:
+                data.pop(key, None)
+            return self._save(data, dict.fromkeys(keys))
+
+    def replace_all(self, records):
+        return self._save(records, None)
+
+    def backup_to(self, folder):
+        """Copy the (compacted) store into folder; return the copied names"""
+        self.compact()
+        if not os.path.exists(self.filepath):
+            return []
+        filename = os.path.basename(self.filepath)
+        with lock_manager.shared(self.filepath):
+            shutil.copy2(self.filepath, os.path.join(folder, filename))
+        return [filename]
+
+    @contextmanager
+    def transaction(self):
+        """Hold the file's exclusive lock (in-process and across workers)"""
+        with lock_manager.exclusive(self.filepath):
+            yield self
+
+class JsonTimetableRepository(TimetableMixin, JsonRepository):
+    """Timetable entries keyed by id, stored on disk as {day: [entries]}"""
+
+    def _records_from_file(self, week):
+        if not isinstance(week, dict):
+            return {}
+        return {entry.get('id'): entry for entries in week.values() for entry in entries}
+
+    def _file_from_records(self, records):
+        return group_timetable_by_day(records.values())
+
+    def query(self, **filters):
+        week = load_json(self.filepath, readonly=True)
+        if not isinstance(week, dict):
+            return []
+        days = [filters['day']] if 'day' in filters else list(week.keys())
+        return [entry for day in days for entry in week.get(day, []) if _matches(entry, filters)]
+
+class JournaledJsonRepository(JsonRepository):
+    """JSON snapshot plus an append-only journal of put/delete records.
+
+    Mutations append one line per record to <file>.journal instead of
+    rewriting the snapshot, and readers fold only the journal bytes added
+    since their last read into an in-memory copy. Once the journal grows past
+    JOURNAL_COMPACT_ENTRIES / JOURNAL_COMPACT_BYTES a background thread writes
+    a new snapshot and starts an empty journal. Journal records carry whole
+    records, so replaying an already-folded journal is harmless.
+    """
+
+    def __init__(self, entity, filepath):
+        super().__init__(entity, filepath)
+        self.journal_path = f"{filepath}.journal"
+        self._lock = threading.RLock()
+        self._records = {}
+        self._frozen = None  # read-only copy of _records handed out by all()
+        self._snapshot_signature = False
+        self._journal_id = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._appended = 0
+        self._compacting = False
+
+    def _read_journal_tail(self):
+        """Apply journal lines appended since the last read"""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                stat_result = os.fstat(f.fileno())
+                journal_id = (stat_result.st_dev, stat_result.st_ino)
+                if journal_id != self._journal_id or stat_result.st_size < self._journal_offset:
+                    # Journal was replaced by a compaction: its predecessor is
+                    # already part of the snapshot, so start from the top.
+                    self._journal_id = journal_id
+                    self._journal_offset = 0
+                    self._journal_entries = 0
+                f.seek(self._journal_offset)
+                chunk = f.read()
+        except OSError:
+            return
+        complete = chunk.rfind(b'\n') + 1
+        if complete:
+            self._frozen = None
+        for line in chunk[:complete].splitlines():
+            try:
+                op = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash; the next line starts fresh
+            if op.get('op') == 'put':
+                self._records[op['key']] = freeze(op['record'])
+            elif op.get('op') == 'delete':
+                self._records.pop(op['key'], None)
+            self._journal_entries += 1
+        self._journal_offset += complete
+
+    def _refresh(self):
+        """Bring the in-memory records up to date with snapshot + journal"""
+        with self._lock:
+            for _ in range(3):
+                signature = file_signature(self.filepath)
+                if signature != self._snapshot_signature:
+                    self._records = dict(super().all())
+                    self._frozen = None
+                    self._snapshot_signature = signature
+                    self._journal_id = None
+                self._read_journal_tail()
+                # A compaction between the two reads replaced the snapshot;
+                # retry so the new journal is never applied to the old one.
+                if file_signature(self.filepath) == signature:
+                    break
+            return self._records
+
+    # Lock order is always file lock, then self._lock. The shared lock keeps
+    # another worker's compaction from swapping snapshot and journal between
+    # the two reads in _refresh().
+
+    def all(self):
+        with lock_manager.shared(self.filepath), self._lock:
+            records = self._refresh()
+            if self._frozen is None:
+                self._frozen = FrozenDict(records)
+            return self._frozen
+
+    def get(self, key):
+        with lock_manager.shared(self.filepath), self._lock:
+            record = self._refresh().get(key)
+        return thaw(record) if record is not None else None
+
+    def get_many(self, keys):
+        with lock_manager.shared(self.filepath), self._lock:
+            records = self._refresh()
+            return {key: records[key] for key in keys if key in records}
+
+    def count(self, **filters):
+        if filters:
+            return super().count(**filters)
+        with lock_manager.shared(self.filepath), self._lock:
+            return len(self._refresh())
+
+    def version(self):
+        with lock_manager.shared(self.filepath):
+            return (file_signature(self.filepath), file_signature(self.journal_path))
+
+    def _append(self, ops, changes):
+        payload = b''.join(json.dumps(op, ensure_ascii=False).encode('utf-8') + b'\n' for op in ops)
+        with lock_manager.exclusive(self.filepath), self._lock:
+            before = self.version()
+            with open(self.journal_path, 'a+b') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b'\n':
+                        payload = b'\n' + payload
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                size += len(payload)
+            self._appended += len(ops)
+            pending = max(self._journal_entries, self._appended)
+            self._notify(changes, before, self.version())
+        if size >= JOURNAL_COMPACT_BYTES or pending >= JOURNAL_COMPACT_ENTRIES:
+            self.compact_async()
+        return True
+
+    def put_many(self, records):
+        return self._append([{'op': 'put', 'key': key, 'record': record} for key, record in records.items()], dict(records))
+
+    def delete_many(self, keys):
+        return self._append([{'op': 'delete', 'key': key} for key in keys], dict.fromkeys(keys))
+
+    def _write_snapshot(self, records, changes):
+        with lock_manager.exclusive(self.filepath), self._lock:
+            before = self.version()
+            saved = save_json(self.filepath, self._file_from_records(records))
+            if saved:
+                atomic_write(self.journal_path, b'')
+                self._appended = 0
+                self._notify(changes, before, self.version())
+            return saved
+
+    def replace_all(self, records):
+        return self._write_snapshot(records, None)
+
+    def compact(self):
+        """Fold the journal into a new snapshot; returns True if one was written"""
+        with lock_manager.exclusive(self.filepath), self._lock:
+            records = self._refresh()
+            if not self._journal_offset:
+                return False
+            return self._write_snapshot(records, {})  # same records, new version
+
+    def compact_async(self):
+        """Run compact() on a background thread unless one is already running"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact_worker, name=f'journal-compact-{self.entity}', daemon=True).start()
+
+    def _compact_worker(self):
+        try:
+            self.compact()
+        finally:
+            with self._lock:
+                self._compacting = False
+
+class JournaledJsonTimetableRepository(JournaledJsonRepository, JsonTimetableRepository):
+    """Journaled timetable; the snapshot keeps the {day: [entries]} layout"""
+
+    def query(self, **filters):
+        return Repository.query(self, **filters)
+
+def _shard_name(day, section):
+    safe = ''.join(c if c.isalnum() or c in '-_' else f'%{ord(c):02X}' for c in section)
+    return f"{day}__{safe}.json"
+
+class ShardedJsonTimetableRepository(TimetableMixin, Repository):
+    """Timetable stored as one JSON list per (day, section) plus a manifest.
+
+    manifest.json maps each day to its sections in display order; shard files
+    hold that day/section's entries in insertion order. A mutation rewrites
+    only the shards it touches (and the manifest when a shard appears or
+    empties), and day/section queries read only the matching shards. All
+    access goes through the manifest lock, so readers never see an entry
+    half-way through a move between shards. Lookups by id use an in-memory
+    id -> shard map checked against the shard's file signature, so they
+    read only that shard.
+    """
+
+    def __init__(self, entity, directory, legacy_file=None):
+        super().__init__(entity)
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self._locations = {}    # id -> (day, section)
+        self._shard_keys = {}   # (day, section) -> (file signature, {ids})
+        self._locations_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if legacy_file:
+            self._migrate_legacy(legacy_file)
+
+    def _migrate_legacy(self, legacy_file):
+        """Split the old single-file timetable (and its journal) into shards"""
+        if os.path.exists(self.manifest_path) or not os.path.exists(legacy_file):
+            return
+        with self.transaction():
+            if os.path.exists(self.manifest_path) or not os.path.exists(legacy_file):
+                return
+            # The legacy file is left as it was (it may be tracked seed
+            # data); once the manifest exists it is no longer read
+            legacy = JournaledJsonTimetableRepository(self.entity, legacy_file)
+            self.replace_all(legacy.all())
+
+    def _shard_path(self, day, section):
+        return os.path.join(self.directory, _shard_name(day, section))
+
+    def _manifest(self):
+        data = load_json(self.manifest_path)
+        days = data.get('days') if isinstance(data, dict) else None
+        return days if isinstance(days, dict) else {}
+
+    def _shard(self, day, section, readonly=True):
+        entries = load_json(self._shard_path(day, section), readonly=readonly)
+        return entries if isinstance(entries, list) else []
+
+    def _shards(self, manifest, day=None, section=None):
+        """Yield (day, section) for the shards matching the optional filters"""
+        days = [day] if day is not None else DAYS_OF_WEEK + [d for d in manifest if d not in DAYS_OF_WEEK]
+        for shard_day in days:
+            for shard_section in manifest.get(shard_day, []):
+                if section is None or shard_section == section:
+                    yield shard_day, shard_section
+
+    def _forget_shard(self, shard):
+        # Call with self._locations_lock held
+        _, keys = self._shard_keys.pop(shard, (None, ()))
+        for key in keys:
+            if self._locations.get(key) == shard:
+                del self._locations[key]
+
+    def _sync_shard(self, shard, entries=None):
+        """Ids in shard, re-read only if its file changed since last seen
+        (entries: its contents just written); call with
+        self._locations_lock held"""
+        signature = file_signature(self._shard_path(*shard))
+        cached = self._shard_keys.get(shard)
+        if entries is None:
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            entries = self._shard(*shard)
+        self._forget_shard(shard)
+        keys = {entry.get('id') for entry in entries}
+        for key in keys:
+            self._locations[key] = shard
+        self._shard_keys[shard] = (signature, keys)
+        return keys
+
+    def _locate(self, manifest, key):
+        """(day, section) of the shard holding key, or None"""
+        with self._locations_lock:
+            shard = self._locations.get(key)
+            if shard is not None and shard[1] in manifest.get(shard[0], ()) and key in self._sync_shard(shard):
+                return shard
+            # Unknown or moved by another worker: bring every shard's ids up
+            # to date (a stat each, reading only shards that changed)
+            live = list(self._shards(manifest))
+            for gone in set(self._shard_keys) - set(live):
+                self._forget_shard(gone)
+            found = None
+            for shard in live:
+                if key in self._sync_shard(shard):
+                    found = shard
+            return found
+
+    def get(self, key):
+        with lock_manager.shared(self.manifest_path):
+            manifest = self._manifest()
+            location = self._locate(manifest, key)
+            if location is None:
+                return None
+            record = next(entry for entry in self._shard(*location) if entry.get('id') == key)
+        return thaw(record)
+
+    def all(self):
+        with lock_manager.shared(self.manifest_path):
+            manifest = self._manifest()
+            return {
+                entry.get('id'): entry
+                for day, section in self._shards(manifest)
+                for entry in self._shard(day, section)
+            }
+
+    def query(self, **filters):
+        with lock_manager.shared(self.manifest_path):
+            manifest = self._manifest()
+            shards = self._shards(manifest, filters.get('day'), filters.get('section'))
+            return [entry for shard in shards for entry in self._shard(*shard) if _matches(entry, filters)]
+
+    def week(self):
+        with lock_manager.shared(self.manifest_path):
+            manifest = self._manifest()
+            week = {day: [] for day in DAYS_OF_WEEK}
+            for day, section in self._shards(manifest):
+                week.setdefault(day, []).extend(self._shard(day, section))
+            return week
+
+    def version(self):
+        with lock_manager.shared(self.manifest_path):
+            manifest = self._manifest()
+            return (file_signature(self.manifest_path),) + tuple(
+                file_signature(self._shard_path(day, section)) for day, section in self._shards(manifest)
+            )
+
+    def _write_shards(self, manifest, shards, changes):
+        """Persist changed shards {(day, section): entries} and the manifest.
+
+        New shards are added to the manifest before they are written and
+        emptied ones removed only afterwards, so a crash part-way leaves an
+        entry visible twice rather than not at all.
+        """
+        before = self.version()
+        added = False
+        for day, section in shards:
+            sections = manifest.setdefault(day, [])
+            if shards[(day, section)] and section not in sections:
+                sections.append(section)
+                added = True
+        saved = True
+        if added or not os.path.exists(self.manifest_path):
+            saved = save_json(self.manifest_path, {'days': manifest}) and saved
+        for (day, section), entries in shards.items():
+            if entries:
+                saved = save_json(self._shard_path(day, section), entries) and saved
+        emptied = [(day, section) for (day, section), entries in shards.items() if not entries and section in manifest.get(day, [])]
+        if emptied:
+            for day, section in emptied:
+                manifest[day].remove(section)
+            saved = save_json(self.manifest_path, {'days': manifest}) and saved
+        for (day, section), entries in shards.items():
+            if not entries and os.path.exists(self._shard_path(day, section)):
+                os.remove(self._shard_path(day, section))
+        with self._locations_lock:
+            for shard, entries in shards.items():
+                if entries and saved:
+                    self._sync_shard(shard, entries)
+                else:
+                    self._forget_shard(shard)
+        if saved:
+            self._notify(changes, before, self.version())
+        return saved
+
+    def put_many(self, records):
+        with self.transaction():
+            manifest = self._manifest()
+            shards = {}
+            for key, record in records.items():
+                source = self._locate(manifest, key)
+                target = (record.get('day'), record.get('section') or '')
+                for shard in filter(None, {source, target}):
+                    if shard not in shards:
+                        shards[shard] = self._shard(*shard, readonly=False)
+                if source is not None:
+                    entries = shards[source]
+                    index = next(i for i, entry in enumerate(entries) if entry.get('id') == key)
+                    if source == target:
+                        entries[index] = record
+                        continue
+                    del entries[index]
+                shards[target].append(record)
+            return self._write_shards(manifest, shards, dict(records))
+
+    def delete_many(self, keys):
+        with self.transaction():
+            manifest = self._manifest()
+            shards = {}
+            for key in keys:
+                source = self._locate(manifest, key)
+                if source is None:
+                    continue
+                if source not in shards:
+                    shards[source] = self._shard(*source, readonly=False)
+                shards[source] = [entry for entry in shards[source] if entry.get('id') != key]
+            if not shards:
+                return True
+            return self._write_shards(manifest, shards, dict.fromkeys(keys))
+
+    def replace_all(self, records):
+        with self.transaction():
+            manifest = self._manifest()
+            shards = {shard: [] for shard in self._shards(manifest)}
+            for record in records.values():
+                shards.setdefault((record.get('day'), record.get('section') or ''), []).append(record)
+            return self._write_shards(manifest, shards, None)
+
+    @contextmanager
+    def transaction(self):
+        """Hold the manifest's exclusive lock, which guards every shard"""
+        with lock_manager.exclusive(self.manifest_path):
+            yield self
+
+    def backup_to(self, folder):
+        with lock_manager.shared(self.manifest_path):
+            target = os.path.join(folder, os.path.basename(self.directory))
+            shutil.copytree(self.directory, target, ignore=shutil.ignore_patterns('*.lock', '*.tmp', '*.backup*'))
+        return [f"{os.path.basename(self.directory)}/"]
+
+def _create_entity_schema(conn):
+    for entity, fields in INDEXED_FIELDS.items():
+        columns = ''.join(f', "{field}" TEXT' for field in fields)
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {entity} '
+            f'(key TEXT PRIMARY KEY, seq INTEGER NOT NULL, data TEXT NOT NULL{columns})'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity}_seq ON {entity}(seq)')
+        for field in fields:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity}_{field} ON {entity}("{field}")')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_key_nocase ON users(key COLLATE NOCASE)')
+    # Random token per entity, replaced by every write (see Repository.version)
+    conn.execute('CREATE TABLE IF NOT EXISTS entity_versions (entity TEXT PRIMARY KEY, version TEXT NOT NULL)')
+
+class SqliteDatabase:
+    """Shared SQLite database (WAL mode) with one connection per thread.
+
+    schema(conn) creates the tables on first connect; it defaults to the
+    entity tables.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema or _create_entity_schema
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        # Held across COMMIT and the write notifications that follow it, and
+        # by version reads, so no reader sees a commit before its notification
+        self.commit_lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.depth = 0
+            self._local.on_commit = []
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            self.schema(conn)
+            self._schema_ready = True
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT; nested calls join the outer transaction"""
+        conn = self.connection()
+        if self._local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                self._local.on_commit = []
+                conn.execute('ROLLBACK')
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            callbacks, self._local.on_commit = self._local.on_commit, []
+            with self.commit_lock:
+                conn.execute('COMMIT')
+                for callback in callbacks:
+                    callback()
+
+    def on_commit(self, callback):
+        """Run callback() once the current transaction has committed"""
+        self._local.on_commit.append(callback)
+
+    def backup_to(self, dest_path):
+        """Write a consistent copy of the database to dest_path"""
+        dest = sqlite3.connect(dest_path)
+        try:
+            self.connection().backup(dest)
+        finally:
+            dest.close()
+
+class SqliteRepository(Repository):
+    """Repository stored as one SQLite table with indexed columns"""
+
+    def __init__(self, entity, database):
+        super().__init__(entity)
+        self.db = database
+        self.fields = INDEXED_FIELDS[entity]
+
+    def _rows(self, sql, params=()):
+        return self.db.connection().execute(sql, params).fetchall()
+
+    def get(self, key):
+        rows = self._rows(f'SELECT data FROM {self.entity} WHERE key = ?', (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def all(self):
+        return {
+            key: json.loads(data)
+            for key, data in self._rows(f'SELECT key, data FROM {self.entity} ORDER BY seq')
+        }
+
+    def keys(self):
+        return [row[0] for row in self._rows(f'SELECT key FROM {self.entity} ORDER BY seq')]
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            chunk = keys[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            for key, data in self._rows(f'SELECT key, data FROM {self.entity} WHERE key IN ({placeholders})', chunk):
+                found[key] = json.loads(data)
+        return {key: found[key] for key in keys if key in found}
+
+    def _where(self, filters):
+        unindexed = {field: value for field, value in filters.items() if field not in self.fields}
+        indexed = [(field, value) for field, value in filters.items() if field in self.fields]
+        clause = ' AND '.join(f'"{field}" = ?' for field, _ in indexed)
+        return (f' WHERE {clause}' if clause else ''), [value for _, value in indexed], unindexed
+
+    def query(self, **filters):
+        where, params, unindexed = self._where(filters)
+        records = [json.loads(row[0]) for row in self._rows(f'SELECT data FROM {self.entity}{where} ORDER BY seq', params)]
+        return [record for record in records if _matches(record, unindexed)] if unindexed else records
+
+    def count(self, **filters):
+        where, params, unindexed = self._where(filters)
+        if unindexed:
+            return len(self.query(**filters))
+        return self._rows(f'SELECT COUNT(*) FROM {self.entity}{where}', params)[0][0]
+
+    def version(self):
+        conn = self.db.connection()
+        with self.db.commit_lock:
+            return self._version(conn)
+
+    def _version(self, conn):
+        row = conn.execute('SELECT version FROM entity_versions WHERE entity = ?', (self.entity,)).fetchone()
+        return row[0] if row else ''
+
+    @contextmanager
+    def _write(self, changes):
+        """Transaction that replaces the entity's version and notifies
+        subscribers once the outermost transaction has committed"""
+        with self.db.transaction() as conn:
+            before = self._version(conn)
+            yield conn
+            conn.execute(
+                'INSERT INTO entity_versions (entity, version) VALUES (?, lower(hex(randomblob(8)))) '
+                'ON CONFLICT(entity) DO UPDATE SET version = excluded.version',
+                (self.entity,)
+            )
+            after = self._version(conn)
+            self.db.on_commit(lambda: self._notify(changes, before, after))
+
+    def _insert(self, conn, records):
+        columns = ', '.join(f'"{field}"' for field in self.fields)
+        placeholders = ', '.join('?' for _ in self.fields)
+        updates = ', '.join(f'"{field}" = excluded."{field}"' for field in self.fields)
+        sql = (
+            f'INSERT INTO {self.entity} (key, seq, data, {columns}) '
+            f'VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM {self.entity}), ?, {placeholders}) '
+            f'ON CONFLICT(key) DO UPDATE SET data = excluded.data, {updates}'
+        )
+        for key, record in records.items():
+            values = [record.get(field) for field in self.fields]
+            conn.execute(sql, [key, json.dumps(record, ensure_ascii=False)] + values)
+
+    def put_many(self, records):
+        with self._write(dict(records)) as conn:
+            self._insert(conn, records)
+        return True
+
+    def delete_many(self, keys):
+        with self._write(dict.fromkeys(keys)) as conn:
+            conn.executemany(f'DELETE FROM {self.entity} WHERE key = ?', [(key,) for key in keys])
+        return True
+
+    def replace_all(self, records):
+        with self._write(None) as conn:
+            conn.execute(f'DELETE FROM {self.entity}')
+            self._insert(conn, records)
+        return True
+
+    def transaction(self):
+        return self.db.transaction()
+
+class SqliteTimetableRepository(TimetableMixin, SqliteRepository):
+    """Timetable table; listing keeps DAYS_OF_WEEK order like the JSON file"""
+
+    def all(self):
+        entries = super().all()
+        day_rank = {day: i for i, day in enumerate(DAYS_OF_WEEK)}
+        ordered = sorted(entries.items(), key=lambda item: day_rank.get(item[1].get('day'), len(day_rank)))
+        return dict(ordered)
+
+def group_timetable_by_day(entries):
+    """Arrange timetable entries as {day: [entries]} for every day of the week"""
+    week = {day: [] for day in DAYS_OF_WEEK}
+    for entry in entries:
+        week.setdefault(entry.get('day'), []).append(entry)
+    return week
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+_database = None
+
+def get_database():
+    """Return the shared SQLite database handle"""
+    global _database
+    if _database is None:
+        _database = SqliteDatabase(SQLITE_DB_FILE)
+    return _database
+
+def get_repository(entity, backend=None):
+    """Return the repository for entity using the configured backend"""
+    backend = backend or STORAGE_BACKEND
+    with _repositories_lock:
+        repo = _repositories.get((entity, backend))
+        if repo is None:
+            if backend == 'sqlite':
+                repo_class = SqliteTimetableRepository if entity == 'timetable' else SqliteRepository
+                repo = repo_class(entity, get_database())
+            elif backend == 'json' and entity == 'timetable':
+                repo = ShardedJsonTimetableRepository(entity, TIMETABLE_SHARD_DIR, legacy_file=ENTITY_FILES[entity])
+            elif backend == 'json' and entity in JOURNAL_ENTITIES:
+                repo = JournaledJsonRepository(entity, ENTITY_FILES[entity])
+            elif backend == 'json':
+                repo = JsonRepository(entity, ENTITY_FILES[entity])
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'")
+            _repositories[(entity, backend)] = repo
+        return repo
+
+def backup_storage(folder, backend=None):
+    """Copy the entity stores into folder and return the created file names"""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'sqlite':
+        filename = os.path.basename(SQLITE_DB_FILE)
+        get_database().backup_to(os.path.join(folder, filename))
+        return [filename]
+    backed_up = []
+    for entity in ENTITY_FILES:
+        backed_up.extend(get_repository(entity, backend).backup_to(folder))
+    return backed_up
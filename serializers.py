@@ -0,0 +1,109 @@
+"""
+Data file serializers for EduPortal
+Encoders selected by DATA_SERIALIZER plus format auto-detection on load
+"""
+
+import json
+from config import DATA_SERIALIZER
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encode/decode
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: binary format
+    msgpack = None
+
+# Prefix written in front of msgpack payloads; JSON files can never start
+# with these bytes, so load_json can tell the formats apart.
+MSGPACK_MAGIC = b'\x00EDUMSGPACK1\n'
+
+class Serializer:
+    """Turns stored data into bytes and back"""
+    name = None
+
+    def encode(self, data):
+        raise NotImplementedError
+
+    def decode(self, payload):
+        raise NotImplementedError
+
+class JsonSerializer(Serializer):
+    """Stdlib JSON; compact by default, indent=2 for the legacy pretty files"""
+
+    def __init__(self, name='json', indent=None):
+        self.name = name
+        self.indent = indent
+
+    def encode(self, data):
+        separators = None if self.indent else (',', ':')
+        return json.dumps(data, indent=self.indent, separators=separators, ensure_ascii=False).encode('utf-8')
+
+    def decode(self, payload):
+        return json.loads(payload.decode('utf-8'))
+
+class OrjsonSerializer(Serializer):
+    """Compact JSON through orjson (same bytes on disk as 'json', faster)"""
+    name = 'orjson'
+
+    def encode(self, data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, payload):
+        return orjson.loads(payload)
+
+class MsgpackSerializer(Serializer):
+    """msgpack behind MSGPACK_MAGIC; not human-readable"""
+    name = 'msgpack'
+
+    def encode(self, data):
+        return MSGPACK_MAGIC + msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, payload):
+        try:
+            return msgpack.unpackb(payload[len(MSGPACK_MAGIC):], raw=False, strict_map_key=False)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as e:
+            raise ValueError(f'Corrupt msgpack data file: {e}') from e
+
+SERIALIZERS = {
+    'json': JsonSerializer(),
+    'json-pretty': JsonSerializer('json-pretty', indent=2)
+}
+if orjson is not None:
+    SERIALIZERS['orjson'] = OrjsonSerializer()
+if msgpack is not None:
+    SERIALIZERS['msgpack'] = MsgpackSerializer()
+
+def get_serializer(name=None):
+    """Return the serializer for name (default DATA_SERIALIZER).
+
+    'orjson' and 'msgpack' fall back to compact stdlib JSON when the library
+    is not installed, so the setting is safe to ship on any machine.
+    """
+    name = name or DATA_SERIALIZER
+    if name in SERIALIZERS:
+        return SERIALIZERS[name]
+    if name in ('orjson', 'msgpack'):
+        return SERIALIZERS['json']
+    raise ValueError(f"Unknown DATA_SERIALIZER '{name}'")
+
+def detect_format(payload):
+    """Return 'msgpack' or 'json' for the raw bytes of a data file"""
+    return 'msgpack' if payload.startswith(MSGPACK_MAGIC) else 'json'
+
+def decode(payload):
+    """Decode a data file written by any serializer (or by older versions)"""
+    if detect_format(payload) == 'msgpack':
+        if msgpack is None:
+            raise ValueError('Data file is in msgpack format but msgpack is not installed')
+        return SERIALIZERS['msgpack'].decode(payload)
+    reader = get_serializer()
+    if reader.name == 'msgpack':
+        reader = SERIALIZERS['json']  # files not yet rewritten since switching to msgpack
+    return reader.decode(payload)
+
+def encode(data):
+    """Encode data with the configured serializer"""
+    return get_serializer().encode(data)
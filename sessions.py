@@ -0,0 +1,191 @@
+"""
+Session storage for EduPortal
+Login sessions kept in memory (per process) or in SQLite (shared by workers)
+"""
+
+import heapq
+import threading
+import time
+from datetime import datetime
+from config import SESSION_TIMEOUT_SECONDS, SESSION_STORE, SESSION_DB_FILE
+from repository import SqliteDatabase
+from utils import generate_session_token
+
+# How stale last_activity may get before the SQLite store writes it back
+LAST_ACTIVITY_WRITE_SECONDS = 60
+
+def _session_dict(username, role, created_at, last_activity, expires_at):
+    return {
+        'username': username,
+        'role': role,
+        'created_at': datetime.fromtimestamp(created_at),
+        'last_activity': datetime.fromtimestamp(last_activity),
+        'expires_at': datetime.fromtimestamp(expires_at)
+    }
+
+class SessionStore:
+    """Fixed-lifetime login sessions keyed by token"""
+
+    def __init__(self, timeout_seconds=SESSION_TIMEOUT_SECONDS):
+        self.timeout = timeout_seconds
+
+    def create(self, username, role):
+        """Start a session and return its token"""
+        raise NotImplementedError
+
+    def get(self, token):
+        """Return the live session for token (touching last_activity), or None"""
+        raise NotImplementedError
+
+    def destroy(self, token):
+        raise NotImplementedError
+
+    def count_active(self):
+        """Number of unexpired sessions"""
+        raise NotImplementedError
+
+    def sweep(self):
+        """Remove expired sessions; return how many were removed"""
+        raise NotImplementedError
+
+class MemorySessionStore(SessionStore):
+    """Sessions in a dict, with a min-heap of (expires_at, token) for sweeping.
+
+    Every call first pops the expired heap entries, so each session is
+    removed once in O(log n) instead of lingering until its token is used
+    again. Destroyed sessions leave a stale heap entry that is skipped when
+    it surfaces.
+    """
+
+    def __init__(self, timeout_seconds=SESSION_TIMEOUT_SECONDS):
+        super().__init__(timeout_seconds)
+        self._sessions = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+
+    def _sweep_locked(self, now):
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, token = heapq.heappop(self._expiry_heap)
+            session = self._sessions.get(token)
+            if session is not None and session['expires_ts'] == expires_at:
+                del self._sessions[token]
+                removed += 1
+        return removed
+
+    def create(self, username, role):
+        token = generate_session_token()
+        now = time.time()
+        expires_at = now + self.timeout
+        with self._lock:
+            self._sweep_locked(now)
+            self._sessions[token] = {
+                'username': username,
+                'role': role,
+                'created_at': datetime.fromtimestamp(now),
+                'last_activity': datetime.fromtimestamp(now),
+                'expires_at': datetime.fromtimestamp(expires_at),
+                'expires_ts': expires_at
+            }
+            heapq.heappush(self._expiry_heap, (expires_at, token))
+        return token
+
+    def get(self, token):
+        now = time.time()
+        with self._lock:
+            self._sweep_locked(now)
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            session['last_activity'] = datetime.fromtimestamp(now)
+            return session
+
+    def destroy(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def count_active(self):
+        with self._lock:
+            self._sweep_locked(time.time())
+            return len(self._sessions)
+
+    def sweep(self):
+        with self._lock:
+            return self._sweep_locked(time.time())
+
+def _create_session_schema(conn):
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS sessions ('
+        'token TEXT PRIMARY KEY, username TEXT NOT NULL, role TEXT NOT NULL, '
+        'created_at REAL NOT NULL, last_activity REAL NOT NULL, expires_at REAL NOT NULL)'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)')
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a SQLite table shared by every worker process.
+
+    Lookups only match unexpired rows, and expired rows are deleted through
+    the expires_at index on each create plus every sweep_interval seconds.
+    last_activity is written back at most once per
+    LAST_ACTIVITY_WRITE_SECONDS so plain requests stay read-only.
+    """
+
+    def __init__(self, path, timeout_seconds=SESSION_TIMEOUT_SECONDS, sweep_interval=60):
+        super().__init__(timeout_seconds)
+        self.db = SqliteDatabase(path, schema=_create_session_schema)
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+
+    def _maybe_sweep(self, now):
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep()
+
+    def create(self, username, role):
+        token = generate_session_token()
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+            conn.execute(
+                'INSERT INTO sessions (token, username, role, created_at, last_activity, expires_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (token, username, role, now, now, now + self.timeout)
+            )
+        return token
+
+    def get(self, token):
+        if not token:
+            return None
+        now = time.time()
+        self._maybe_sweep(now)
+        row = self.db.connection().execute(
+            'SELECT username, role, created_at, last_activity, expires_at FROM sessions WHERE token = ? AND expires_at > ?',
+            (token, now)
+        ).fetchone()
+        if row is None:
+            return None
+        username, role, created_at, last_activity, expires_at = row
+        if now - last_activity >= LAST_ACTIVITY_WRITE_SECONDS:
+            with self.db.transaction() as conn:
+                conn.execute('UPDATE sessions SET last_activity = ? WHERE token = ?', (now, token))
+            last_activity = now
+        return _session_dict(username, role, created_at, last_activity, expires_at)
+
+    def destroy(self, token):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM sessions WHERE token = ?', (token,))
+
+    def count_active(self):
+        return self.db.connection().execute('SELECT COUNT(*) FROM sessions WHERE expires_at > ?', (time.time(),)).fetchone()[0]
+
+    def sweep(self):
+        with self.db.transaction() as conn:
+            return conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),)).rowcount
+
+def get_session_store(kind=None):
+    """Build the session store selected by SESSION_STORE"""
+    kind = kind or SESSION_STORE
+    if kind == 'memory':
+        return MemorySessionStore()
+    if kind == 'sqlite':
+        return SqliteSessionStore(SESSION_DB_FILE)
+    raise ValueError(f"Unknown SESSION_STORE '{kind}'")
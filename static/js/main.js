@@ -10,6 +10,11 @@ const App = {
     sessionCountdown: null,
     remainingSeconds: 900, // 15 minutes in seconds
     currentPage: 'dashboard',
+    pageSize: 25, // rows fetched per list request (server DEFAULT_PAGE_SIZE)
+    pagedLists: {},
+    searchTimer: null,
+    searchSeq: 0, // drops typeahead responses that arrive out of order
+    registrationPages: null,
     
     /**
      * Initialize the application
@@ -142,6 +147,20 @@ const App = {
             themeToggle.addEventListener('click', () => this.toggleTheme());
         }
         
+        // Global search (typeahead)
+        const globalSearch = document.getElementById('globalSearch');
+        if (globalSearch) {
+            globalSearch.addEventListener('input', () => {
+                clearTimeout(this.searchTimer);
+                this.searchTimer = setTimeout(() => this.runSearch(globalSearch.value), 150);
+            });
+            document.addEventListener('click', (e) => {
+                if (!e.target.closest('.global-search')) {
+                    this.hideSearchResults();
+                }
+            });
+        }
+        
         // Data management link (Admin only)
         const dataManagementLink = document.getElementById('dataManagementLink');
         if (dataManagementLink && this.user.role === 'Admin') {
@@ -908,6 +927,7 @@ const App = {
                         </tbody>
                     </table>
                 </div>
+                <div id="academicsPager" class="list-pager"></div>
             </div>
         `;
         
@@ -925,11 +945,11 @@ const App = {
     /**
      * Load academics list
      */
-    loadAcademicsList: async function() {
+    loadAcademicsList: async function(append = false) {
         try {
-            const response = await this.apiCall('/api/academics/list', 'GET');
-            if (response.success) {
-                this.renderAcademicsTable(response.data);
+            const academics = await this.loadPagedList('academics', '/api/academics/list', {}, append);
+            if (academics) {
+                this.renderAcademicsTable(academics);
             }
         } catch (error) {
             this.showToast('Failed to load academics', 'error');
@@ -1275,6 +1295,7 @@ const App = {
                         </tbody>
                     </table>
                 </div>
+                <div id="studentsPager" class="list-pager"></div>
             </div>
         `;
         
@@ -1293,11 +1314,11 @@ const App = {
     /**
      * Load students list
      */
-    loadStudentsList: async function() {
+    loadStudentsList: async function(append = false) {
         try {
-            const response = await this.apiCall('/api/students/list', 'GET');
-            if (response.success) {
-                this.renderStudentsTable(response.data);
+            const students = await this.loadPagedList('students', '/api/students/list', {}, append);
+            if (students) {
+                this.renderStudentsTable(students);
             }
         } catch (error) {
             this.showToast('Failed to load students', 'error');
@@ -1632,9 +1653,18 @@ const App = {
             </div>
             
             <div class="card">
+                <div style="margin-bottom: 16px;">
+                    <label style="margin-right: 12px;">Show:</label>
+                    <select id="eventsPartition" onchange="App.loadEventsList()" style="padding: 6px 12px; border-radius: 6px;">
+                        <option value="upcoming">Upcoming Events</option>
+                        <option value="past">Past Events</option>
+                        <option value="all">All Events</option>
+                    </select>
+                </div>
                 <div id="eventsList">
                     <div class="text-center">Loading...</div>
                 </div>
+                <div id="eventsPager" class="list-pager"></div>
             </div>
         `;
         
@@ -1650,13 +1680,15 @@ const App = {
     },
     
     /**
-     * Load events list
+     * Load events list (upcoming, past or all, by date)
      */
-    loadEventsList: async function() {
+    loadEventsList: async function(append = false) {
+        const partition = document.getElementById('eventsPartition');
+        const params = { partition: partition ? partition.value : 'upcoming' };
         try {
-            const response = await this.apiCall('/api/events/list', 'GET');
-            if (response.success) {
-                this.renderEventsList(response.data);
+            const events = await this.loadPagedList('events', '/api/events/range', params, append);
+            if (events) {
+                this.renderEventsList(events);
             }
         } catch (error) {
             this.showToast('Failed to load events', 'error');
@@ -1685,11 +1717,11 @@ const App = {
                     <p><strong>Date:</strong> ${event.date} at ${event.time_12}</p>
                     <p><strong>Organizer:</strong> ${this.escapeHtml(event.organizer_name)}</p>
                     <p><strong>Club:</strong> ${this.escapeHtml(event.club_name)}</p>
-                    <p><strong>Capacity:</strong> ${event.registered_count}/${event.capacity}</p>
+                    <p><strong>Capacity:</strong> ${event.registered_count}/${event.capacity}${event.waitlist_enabled ? ` (waitlist: ${event.waitlisted_count})` : ''}</p>
                     ${event.venue ? `<p><strong>Venue:</strong> ${this.escapeHtml(event.venue)}</p>` : ''}
                     ${event.description ? `<p>${this.escapeHtml(event.description)}</p>` : ''}
                     <div style="margin-top: 12px;">
-                        ${this.user.role === 'Student' ? `<button class="btn btn-sm btn-primary" onclick="App.registerEvent('${event.id}')">Register</button>` : ''}
+                        ${this.user.role === 'Student' ? this.getRegistrationButton(event) : ''}
                         <button class="btn btn-sm btn-secondary" onclick="App.viewEventRegistrations('${event.id}')">View Registrations (${event.registered_count})</button>
                     </div>
                 </div>
@@ -1697,6 +1729,37 @@ const App = {
         `).join('');
     },
     
+    /**
+     * Register / join waitlist / cancel button for the current student
+     */
+    getRegistrationButton: function(event) {
+        const mine = event.my_registration || {};
+        if (mine.status === 'registered') {
+            return `<button class="btn btn-sm btn-danger" onclick="App.cancelEventRegistration('${event.id}')">Cancel Registration</button>`;
+        }
+        if (mine.status === 'waitlisted') {
+            return `<button class="btn btn-sm btn-danger" onclick="App.cancelEventRegistration('${event.id}')">Leave Waitlist (#${mine.position})</button>`;
+        }
+        const full = event.registered_count >= event.capacity;
+        const label = full && event.waitlist_enabled ? 'Join Waitlist' : 'Register';
+        return `<button class="btn btn-sm btn-primary" onclick="App.registerEvent('${event.id}')">${label}</button>`;
+    },
+    
+    /**
+     * Cancel own registration or waitlist place
+     */
+    cancelEventRegistration: async function(evtId) {
+        try {
+            const response = await this.apiCall(`/api/events/${evtId}/register`, 'DELETE');
+            this.showToast(response.message, response.success ? 'success' : 'error');
+            if (response.success) {
+                await this.loadEventsList();
+            }
+        } catch (error) {
+            this.showToast('Failed to cancel registration', 'error');
+        }
+    },
+    
     /**
      * Register for event
      */
@@ -1719,11 +1782,15 @@ const App = {
      */
     viewEventRegistrations: async function(evtId) {
         try {
-            const response = await this.apiCall(`/api/events/${evtId}/registrations`, 'GET');
-            if (response.success) {
-                this.showEventRegistrations(evtId, response.registrations, response.total, response.capacity);
+            const query = `page_size=${this.pageSize}`;
+            const [registered, waitlisted] = await Promise.all([
+                this.apiCall(`/api/events/${evtId}/registrations?${query}`, 'GET'),
+                this.apiCall(`/api/events/${evtId}/registrations?status=waitlisted&${query}`, 'GET')
+            ]);
+            if (registered.success && waitlisted.success) {
+                this.showEventRegistrations(evtId, registered, waitlisted);
             } else {
-                this.showToast(response.message, 'error');
+                this.showToast(registered.message || waitlisted.message, 'error');
             }
         } catch (error) {
             this.showToast('Failed to load registrations', 'error');
@@ -1731,44 +1798,62 @@ const App = {
     },
     
     /**
-     * Show event registrations modal
+     * Table rows for one page of registrations, numbered from offset
      */
-    showEventRegistrations: function(evtId, registrations, total, capacity) {
-        const registrationsList = registrations.length === 0 
-            ? '<p class="text-center">No registrations yet</p>'
+    renderRegistrationRows: function(registrations, offset) {
+        return registrations.map((reg, index) => `
+            <tr>
+                <td>${offset + index + 1}</td>
+                <td>${this.escapeHtml(reg.student_name)}</td>
+                <td>${this.escapeHtml(reg.section)}</td>
+                <td>${this.escapeHtml(reg.username)}</td>
+                <td>${new Date(reg.registered_at).toLocaleString()}</td>
+            </tr>
+        `).join('');
+    },
+    
+    /**
+     * Show event registrations modal (first page of each list)
+     */
+    showEventRegistrations: function(evtId, registered, waitlisted) {
+        this.registrationPages = {
+            registered: { shown: registered.registrations.length, cursor: registered.next_cursor },
+            waitlisted: { shown: waitlisted.registrations.length, cursor: waitlisted.next_cursor }
+        };
+        const table = (status, page) => page.total === 0
+            ? `<p class="text-center">${status === 'registered' ? 'No registrations yet' : 'Nobody is waiting'}</p>`
             : `
                 <div class="table-container">
                     <table>
                         <thead>
                             <tr>
-                                <th>S.No</th>
+                                <th>${status === 'registered' ? 'S.No' : 'Position'}</th>
                                 <th>Student Name</th>
                                 <th>Section</th>
                                 <th>Username</th>
                                 <th>Registered At</th>
                             </tr>
                         </thead>
-                        <tbody>
-                            ${registrations.map((reg, index) => `
-                                <tr>
-                                    <td>${index + 1}</td>
-                                    <td>${this.escapeHtml(reg.student_name)}</td>
-                                    <td>${this.escapeHtml(reg.section)}</td>
-                                    <td>${this.escapeHtml(reg.username)}</td>
-                                    <td>${new Date(reg.registered_at).toLocaleString()}</td>
-                                </tr>
-                            `).join('')}
-                        </tbody>
+                        <tbody id="${status}Rows">${this.renderRegistrationRows(page.registrations, 0)}</tbody>
                     </table>
                 </div>
+                <button class="btn btn-sm btn-secondary" id="${status}More" style="margin-top: 8px; ${page.next_cursor ? '' : 'display: none;'}"
+                    onclick="App.loadMoreRegistrations('${evtId}', '${status}')">Load more</button>
             `;
+        const canExport = ['Admin', 'Faculty'].includes(this.user.role);
         
         const modal = this.createModal(
-            `Event Registrations (${total}/${capacity})`,
+            `Event Registrations (${registered.total}/${registered.capacity})`,
             `
                 <div>
-                    <p><strong>Total Registered:</strong> ${total} / ${capacity}</p>
-                    ${registrationsList}
+                    <p><strong>Total Registered:</strong> ${registered.total} / ${registered.capacity}
+                        ${canExport ? `<button class="btn btn-sm btn-secondary" style="margin-left: 12px;" onclick="App.downloadRegistrationsCsv('${evtId}', 'registered')">Download CSV</button>` : ''}
+                    </p>
+                    ${table('registered', registered)}
+                    ${waitlisted.total ? `
+                        <p style="margin-top: 16px;"><strong>Waitlist:</strong> ${waitlisted.total}</p>
+                        ${table('waitlisted', waitlisted)}
+                    ` : ''}
                 </div>
             `,
             [
@@ -1779,6 +1864,49 @@ const App = {
         document.body.appendChild(modal);
     },
     
+    /**
+     * Append the next page of registrations (or waitlist) to the open modal
+     */
+    loadMoreRegistrations: async function(evtId, status) {
+        const state = this.registrationPages && this.registrationPages[status];
+        if (!state || !state.cursor) return;
+        const query = new URLSearchParams({ status, page_size: this.pageSize, cursor: state.cursor });
+        const response = await this.apiCall(`/api/events/${evtId}/registrations?${query.toString()}`, 'GET');
+        if (!response.success) {
+            this.showToast(response.message, 'error');
+            return;
+        }
+        document.getElementById(`${status}Rows`).insertAdjacentHTML('beforeend', this.renderRegistrationRows(response.registrations, state.shown));
+        state.shown += response.registrations.length;
+        state.cursor = response.next_cursor;
+        if (!state.cursor) {
+            document.getElementById(`${status}More`).style.display = 'none';
+        }
+    },
+    
+    /**
+     * Download every registration of an event as CSV (streamed by the server)
+     */
+    downloadRegistrationsCsv: async function(evtId, status) {
+        try {
+            const response = await fetch(`/api/events/${evtId}/registrations?format=csv&status=${status}`, {
+                headers: { 'Authorization': `Bearer ${this.sessionToken}` }
+            });
+            if (!response.ok) {
+                this.showToast('Failed to export registrations', 'error');
+                return;
+            }
+            const url = URL.createObjectURL(await response.blob());
+            const link = document.createElement('a');
+            link.href = url;
+            link.download = `registrations_${evtId}_${status}.csv`;
+            link.click();
+            URL.revokeObjectURL(url);
+        } catch (error) {
+            this.showToast('Failed to export registrations', 'error');
+        }
+    },
+    
     /**
      * Show add event modal
      */
@@ -1815,6 +1943,9 @@ const App = {
                         <label>Capacity *</label>
                         <input type="number" id="evtCapacity" required min="1" max="10000">
                     </div>
+                    <div class="form-group">
+                        <label><input type="checkbox" id="evtWaitlist"> Keep a waitlist once the event is full</label>
+                    </div>
                     <div class="form-group">
                         <label>Chief Guest</label>
                         <input type="text" id="evtGuest">
@@ -1863,7 +1994,8 @@ const App = {
             capacity: document.getElementById('evtCapacity').value,
             chief_guest: document.getElementById('evtGuest').value.trim(),
             venue: document.getElementById('evtVenue').value.trim(),
-            description: document.getElementById('evtDesc').value.trim()
+            description: document.getElementById('evtDesc').value.trim(),
+            waitlist_enabled: document.getElementById('evtWaitlist').checked
         };
         
         try {
@@ -1891,6 +2023,8 @@ const App = {
             actionButtons.push(`<button class="btn btn-secondary" onclick="App.exportData('timetable', 'pdf')">📄 Export PDF</button>`);
         }
         if (canManageTimetable) {
+            actionButtons.push(`<button class="btn btn-secondary" onclick="App.showTimetableConflicts()">⚠ Check Conflicts</button>`);
+            actionButtons.push(`<button class="btn btn-secondary" onclick="App.showImportTimetableModal()">📤 Import</button>`);
             actionButtons.push(`<button class="btn btn-primary" id="addClassBtn">+ Add Class</button>`);
         }
         const actionsMarkup = actionButtons.length
@@ -2111,6 +2245,116 @@ const App = {
         }
     },
     
+    /**
+     * Show bulk timetable import modal
+     */
+    showImportTimetableModal: function() {
+        const modal = this.createModal(
+            'Import Timetable',
+            `
+                <form id="importTimetableForm">
+                    <div class="form-group">
+                        <label>CSV, XLSX or JSON file *</label>
+                        <input type="file" id="timetableImportFile" accept=".csv,.xlsx,.json" required>
+                        <small>Columns: Day, Section, Start Time, End Time, Class Name, Faculty, Subject, Topic, Classroom, Building (as in the CSV export)</small>
+                    </div>
+                    <div class="form-group">
+                        <label><input type="checkbox" id="timetableImportDryRun"> Check only (do not save)</label>
+                    </div>
+                </form>
+                <div id="timetableImportResult"></div>
+            `,
+            [
+                { text: 'Close', class: 'btn-secondary', action: 'close' },
+                { text: 'Import', class: 'btn-primary', action: () => this.importTimetable() }
+            ]
+        );
+        
+        document.body.appendChild(modal);
+    },
+    
+    /**
+     * Upload a timetable file and list the rows that were rejected
+     */
+    importTimetable: async function() {
+        const form = document.getElementById('importTimetableForm');
+        if (!form.checkValidity()) {
+            form.reportValidity();
+            return;
+        }
+        
+        const body = new FormData();
+        body.append('file', document.getElementById('timetableImportFile').files[0]);
+        body.append('dry_run', document.getElementById('timetableImportDryRun').checked ? 'true' : 'false');
+        
+        try {
+            const response = await fetch('/api/timetable/import', {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${this.sessionToken}` },
+                body
+            });
+            const result = await response.json();
+            if (!result.success) {
+                this.showToast(result.message, 'error');
+                return;
+            }
+            this.showToast(result.message, result.rejected ? 'warning' : 'success');
+            const rows = result.errors.map(error => `
+                <tr><td>${error.row}</td><td>${this.escapeHtml(error.message)}</td></tr>
+            `).join('');
+            document.getElementById('timetableImportResult').innerHTML = result.errors.length
+                ? `<div class="table-container"><table><thead><tr><th>Row</th><th>Problem</th></tr></thead><tbody>${rows}</tbody></table></div>`
+                : '';
+            if (result.imported) {
+                await this.loadTimetableData();
+            }
+        } catch (error) {
+            this.showToast('Failed to import timetable', 'error');
+        }
+    },
+    
+    /**
+     * Show every section / faculty / room double booking in the week
+     */
+    showTimetableConflicts: async function() {
+        try {
+            const response = await this.apiCall('/api/timetable/conflicts', 'GET');
+            if (!response.success) {
+                this.showToast(response.message, 'error');
+                return;
+            }
+            const labels = { section: 'Section', faculty: 'Faculty', room: 'Room' };
+            const describe = entry => `${this.escapeHtml(entry.class_name)} (section ${this.escapeHtml(entry.section || '-')}, ${entry.time})`;
+            const rows = response.conflicts.map(conflict => {
+                const [first, second] = conflict.classes;
+                const what = conflict.dimension === 'faculty' ? first.faculty_name
+                    : conflict.dimension === 'room' ? [first.building, first.classroom].filter(Boolean).join(' ') : first.section;
+                return `
+                    <tr>
+                        <td>${labels[conflict.dimension]}: ${this.escapeHtml(what || '-')}</td>
+                        <td>${conflict.day}</td>
+                        <td>${describe(first)}</td>
+                        <td>${describe(second)}</td>
+                    </tr>
+                `;
+            }).join('');
+            const content = response.total === 0
+                ? '<div class="text-center">No double bookings found</div>'
+                : `<div class="table-container"><table>
+                        <thead><tr><th>Booked twice</th><th>Day</th><th>Class</th><th>Overlaps with</th></tr></thead>
+                        <tbody>${rows}</tbody>
+                   </table></div>`;
+            const modal = this.createModal(
+                `Timetable Conflicts (${response.total})`,
+                content,
+                [{ text: 'Close', class: 'btn-secondary', action: 'close' }]
+            );
+            document.body.appendChild(modal);
+        } catch (error) {
+            this.showToast('Failed to check conflicts', 'error');
+        }
+    },
+    
     /**
      * Delete timetable entry
      */
@@ -2526,6 +2770,7 @@ const App = {
                         </tbody>
                     </table>
                 </div>
+                <div id="usersPager" class="list-pager"></div>
             </div>
         `;
         
@@ -2542,36 +2787,22 @@ const App = {
      * Filter users by profile status
      */
     filterUsersByProfile: function() {
-        const filter = document.getElementById('profileFilter').value;
-        const rows = document.querySelectorAll('#usersTableBody tr');
-        
-        rows.forEach(row => {
-            if (filter === 'all') {
-                row.style.display = '';
-            } else {
-                const statusCell = row.querySelector('td:nth-child(6)');
-                if (statusCell) {
-                    const status = statusCell.textContent.trim().toLowerCase();
-                    if (filter === 'completed' && status === 'completed') {
-                        row.style.display = '';
-                    } else if (filter === 'incomplete' && status === 'incomplete') {
-                        row.style.display = '';
-                    } else {
-                        row.style.display = 'none';
-                    }
-                }
-            }
-        });
+        this.loadUsersList();
     },
     
     /**
-     * Load users list
+     * Load users list (profile status filter is applied by the server)
      */
-    loadUsersList: async function() {
+    loadUsersList: async function(append = false) {
+        const filter = document.getElementById('profileFilter');
+        const params = {};
+        if (filter && filter.value !== 'all') {
+            params.profile_completed = filter.value === 'completed' ? 'true' : 'false';
+        }
         try {
-            const response = await this.apiCall('/api/users/list', 'GET');
-            if (response.success) {
-                this.renderUsersTable(response.data);
+            const users = await this.loadPagedList('users', '/api/users/list', params, append);
+            if (users) {
+                this.renderUsersTable(users);
             }
         } catch (error) {
             this.showToast('Failed to load users', 'error');
@@ -2823,6 +3054,111 @@ const App = {
         }).join('');
     },
     
+    /**
+     * Fetch the first (or, with append, the next) page of a list endpoint.
+     * Returns every row loaded so far for the list, or null on failure.
+     */
+    loadPagedList: async function(name, endpoint, params = {}, append = false) {
+        const previous = this.pagedLists[name];
+        const state = append && previous
+            ? previous
+            : { endpoint, params, items: [], nextCursor: null, total: 0 };
+        const query = new URLSearchParams({ ...state.params, page_size: this.pageSize });
+        if (append && state.nextCursor) {
+            query.set('cursor', state.nextCursor);
+        }
+        
+        const response = await this.apiCall(`${state.endpoint}?${query.toString()}`, 'GET');
+        if (!response.success) {
+            return null;
+        }
+        state.items = state.items.concat(response.data);
+        state.nextCursor = response.next_cursor;
+        state.total = response.total;
+        this.pagedLists[name] = state;
+        this.renderPager(name);
+        return state.items;
+    },
+    
+    /**
+     * Render the "Showing X of Y" line and Load more button under a list
+     */
+    renderPager: function(name) {
+        const pager = document.getElementById(`${name}Pager`);
+        const state = this.pagedLists[name];
+        if (!pager || !state) return;
+        
+        pager.style.cssText = 'display: flex; gap: 12px; align-items: center; margin-top: 12px;';
+        pager.innerHTML = `
+            <span>Showing ${state.items.length} of ${state.total}</span>
+            ${state.nextCursor ? `<button class="btn btn-sm btn-secondary" onclick="App.loadMore('${name}')">Load more</button>` : ''}
+        `;
+    },
+    
+    /**
+     * Append the next page to a paged list
+     */
+    loadMore: function(name) {
+        const loaders = {
+            academics: () => this.loadAcademicsList(true),
+            students: () => this.loadStudentsList(true),
+            events: () => this.loadEventsList(true),
+            users: () => this.loadUsersList(true)
+        };
+        if (loaders[name]) {
+            loaders[name]();
+        }
+    },
+    
+    /**
+     * Query /api/search and show the hits under the header search box
+     */
+    runSearch: async function(query) {
+        const seq = ++this.searchSeq;
+        if (!query.trim()) {
+            this.hideSearchResults();
+            return;
+        }
+        const response = await this.apiCall(`/api/search?${new URLSearchParams({ q: query, limit: 8 })}`, 'GET');
+        if (seq !== this.searchSeq || !response.success) return;
+        
+        const box = document.getElementById('globalSearchResults');
+        const labels = { students: 'Student', academics: 'Academic', users: 'User', events: 'Event' };
+        box.innerHTML = response.data.length
+            ? response.data.map((hit, i) => `
+                <div class="global-search-hit" data-index="${i}">
+                    <span class="badge">${labels[hit.type]}</span>
+                    <strong>${this.escapeHtml(hit.title || hit.id)}</strong>
+                    <small>${this.escapeHtml(hit.subtitle || '')}</small>
+                </div>`).join('')
+            : '<div class="global-search-empty">No matches</div>';
+        box.querySelectorAll('.global-search-hit').forEach(el => {
+            el.addEventListener('click', () => this.openSearchHit(response.data[el.dataset.index]));
+        });
+        box.style.display = 'block';
+    },
+    
+    hideSearchResults: function() {
+        const box = document.getElementById('globalSearchResults');
+        if (box) box.style.display = 'none';
+    },
+    
+    /**
+     * Open the record behind a search hit
+     */
+    openSearchHit: function(hit) {
+        this.hideSearchResults();
+        if (hit.type === 'students') {
+            this.viewStudent(hit.id);
+        } else if (hit.type === 'academics') {
+            this.viewAcademic(hit.id);
+        } else if (hit.type === 'users') {
+            this.viewUserDetails(hit.id);
+        } else if (hit.type === 'events') {
+            this.navigateToPage('events');
+        }
+    },
+    
     /**
      * API call helper
      */
@@ -0,0 +1,478 @@
+"""
+Timetable generator for EduPortal
+Builds a clash-free weekly timetable from subjects, weekly hours, faculty
+availability, sections and rooms on the TIME_SLOTS x DAYS_OF_WEEK grid,
+searching in a worker process so requests never wait for it
+"""
+
+import atexit
+import json
+import math
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import (
+    TIME_SLOTS, DAYS_OF_WEEK, TIMETABLE_JOBS_DIR, TIMETABLE_GENERATOR_WORKERS,
+    TIMETABLE_GENERATOR_TIME_LIMIT_SECONDS, TIMETABLE_GENERATOR_MAX_TIME_LIMIT_SECONDS,
+    TIMETABLE_JOB_RETENTION_HOURS
+)
+from utils import atomic_write, convert_24_to_12, time_to_minutes
+
+SLOT_STARTS = [time_to_minutes(label) for label in TIME_SLOTS]
+SLOT_MINUTES = SLOT_STARTS[1] - SLOT_STARTS[0]
+SLOTS_PER_DAY = len(TIME_SLOTS)
+
+# Repairs tried per session that found no free slot before giving up on it
+# for this attempt
+REPAIR_CANDIDATES = 40
+
+_JOB_ID_RE = re.compile(r'[0-9a-f]{16}')
+
+def _slot(value, name):
+    minute = time_to_minutes(str(value or ''))
+    if minute is None or minute % SLOT_MINUTES or minute // SLOT_MINUTES > SLOTS_PER_DAY:
+        raise ValueError(f"Invalid {name} '{value}' (use a time from TIME_SLOTS)")
+    return minute // SLOT_MINUTES
+
+def _span_mask(day_index, first, last):
+    """Bits for slots [first, last) of one day"""
+    return ((1 << (last - first)) - 1) << (day_index * SLOTS_PER_DAY + first)
+
+def _busy_mask(entries):
+    """Week bitset of every slot the given timetable entries touch"""
+    mask = 0
+    for entry in entries:
+        start, end = time_to_minutes(entry.get('start_time')), time_to_minutes(entry.get('end_time'))
+        if entry.get('day') in DAYS_OF_WEEK and start is not None and end is not None and end > start:
+            mask |= _span_mask(DAYS_OF_WEEK.index(entry['day']), start // SLOT_MINUTES, -(-end // SLOT_MINUTES))
+    return mask
+
+def _room_key(building, classroom):
+    return ((building or '').strip().lower(), (classroom or '').strip().lower())
+
+def parse_problem(payload, existing_entries=()):
+    """Validate a generate request into the picklable problem solve() takes.
+
+    payload: subjects [{section, subject, faculty, hours, class_name?,
+    room?}], optional faculty [{name, available: {day: ["9:00 AM - 1:00 PM"]}}]
+    (faculty not listed are available all day), rooms [{classroom,
+    building}] or names, days, day_start / day_end, session_minutes
+    (default 60) and max_per_day (sessions of one subject per section and
+    day; by default spread evenly over the days the faculty teaches).
+    Existing entries keep their sections, faculty and rooms busy.
+    Raises ValueError on bad input.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Expected a JSON object')
+    days = payload.get('days') or DAYS_OF_WEEK
+    if not isinstance(days, list) or any(day not in DAYS_OF_WEEK for day in days):
+        raise ValueError(f"days must be a list drawn from {', '.join(DAYS_OF_WEEK)}")
+    day_start = _slot(payload.get('day_start', '9:00 AM'), 'day_start')
+    day_end = _slot(payload.get('day_end', '5:00 PM'), 'day_end')
+    if day_end <= day_start:
+        raise ValueError('day_end must be after day_start')
+    window = 0
+    for day in days:
+        window |= _span_mask(DAYS_OF_WEEK.index(day), day_start, day_end)
+
+    try:
+        session_minutes = int(payload.get('session_minutes', 60))
+    except (TypeError, ValueError):
+        raise ValueError('session_minutes must be a number') from None
+    if session_minutes < SLOT_MINUTES or session_minutes % SLOT_MINUTES:
+        raise ValueError(f'session_minutes must be a multiple of {SLOT_MINUTES}')
+    length = session_minutes // SLOT_MINUTES
+    if length > day_end - day_start:
+        raise ValueError('session_minutes is longer than the teaching day')
+
+    if not isinstance(payload.get('faculty') or [], list) or not isinstance(payload.get('rooms') or [], list):
+        raise ValueError('faculty and rooms must be lists')
+    availability = {}
+    for faculty in payload.get('faculty') or []:
+        name = str(faculty.get('name') or '').strip() if isinstance(faculty, dict) else ''
+        if not name:
+            raise ValueError('Every faculty entry needs a name')
+        available = faculty.get('available') or {}
+        if not isinstance(available, dict):
+            raise ValueError(f'Availability of {name} must map days to time ranges')
+        mask = 0
+        for day, ranges in available.items():
+            if day not in DAYS_OF_WEEK:
+                raise ValueError(f"Invalid day '{day}' in availability of {name}")
+            if not isinstance(ranges, list):
+                raise ValueError(f'Availability of {name} on {day} must be a list of time ranges')
+            for text in ranges:
+                first, _, last = str(text).partition('-')
+                start, end = _slot(first, 'availability start'), _slot(last, 'availability end')
+                if end <= start:
+                    raise ValueError(f"Invalid availability '{text}' for {name}")
+                mask |= _span_mask(DAYS_OF_WEEK.index(day), start, end)
+        availability[name.lower()] = mask & window
+
+    rooms = []
+    for room in payload.get('rooms') or []:
+        room = room if isinstance(room, dict) else {'classroom': room}
+        if not str(room.get('classroom') or '').strip():
+            raise ValueError('Every room needs a classroom')
+        rooms.append({'classroom': str(room['classroom']).strip(), 'building': str(room.get('building') or '').strip()})
+
+    subjects = payload.get('subjects')
+    if not isinstance(subjects, list) or not subjects:
+        raise ValueError('subjects must be a non-empty list')
+    sessions = []
+    for number, spec in enumerate(subjects, start=1):
+        if not isinstance(spec, dict):
+            raise ValueError(f'Subject {number}: expected an object')
+        missing = [field for field in ('section', 'subject', 'faculty', 'hours') if not str(spec.get(field) or '').strip()]
+        if missing:
+            raise ValueError(f"Subject {number}: missing {', '.join(missing)}")
+        try:
+            hours = float(spec['hours'])
+        except (TypeError, ValueError):
+            raise ValueError(f'Subject {number}: hours must be a number') from None
+        count = math.ceil(hours * 60 / session_minutes)
+        if count < 1:
+            raise ValueError(f'Subject {number}: hours must be positive')
+        room = None
+        if spec.get('room'):
+            room = {'classroom': str(spec['room']).strip(), 'building': str(spec.get('building') or '').strip()}
+        allowed = availability.get(str(spec['faculty']).strip().lower(), window)
+        teaching_days = sum(1 for day in days if allowed & _span_mask(DAYS_OF_WEEK.index(day), 0, SLOTS_PER_DAY)) or 1
+        max_per_day = int(payload.get('max_per_day') or math.ceil(count / teaching_days))
+        session = {
+            'section': str(spec['section']).strip().upper(),
+            'subject': str(spec['subject']).strip(),
+            'class_name': str(spec.get('class_name') or spec['subject']).strip(),
+            'faculty_name': str(spec['faculty']).strip(),
+            'room': room,
+            'max_per_day': max_per_day,
+            'subject_number': number
+        }
+        sessions.extend(dict(session) for _ in range(count))
+
+    busy = {'section': {}, 'faculty': {}, 'room': {}}
+    by_group = {'section': {}, 'faculty': {}, 'room': {}}
+    for entry in existing_entries:
+        by_group['section'].setdefault((entry.get('section') or '').strip().upper(), []).append(entry)
+        by_group['faculty'].setdefault((entry.get('faculty_name') or '').strip().lower(), []).append(entry)
+        if (entry.get('classroom') or '').strip():
+            by_group['room'].setdefault(_room_key(entry.get('building'), entry.get('classroom')), []).append(entry)
+    for dimension, groups in by_group.items():
+        for group, entries in groups.items():
+            busy[dimension][group] = _busy_mask(entries)
+
+    return {
+        'days': days,
+        'window': window,
+        'length': length,
+        'availability': availability,
+        'rooms': rooms,
+        'sessions': sessions,
+        'busy': busy
+    }
+
+class _Search:
+    """One solve() run: bitset occupancy per section, faculty and room"""
+
+    def __init__(self, problem, rng):
+        self.problem = problem
+        self.rng = rng
+        self.length = problem['length']
+        sessions = problem['sessions']
+        self.section = [s['section'] for s in sessions]
+        self.faculty = [s['faculty_name'].lower() for s in sessions]
+        self.subject = [(s['section'], s['subject_number']) for s in sessions]
+        self.max_per_day = [s['max_per_day'] for s in sessions]
+        room_keys = [_room_key(room['building'], room['classroom']) for room in problem['rooms']]
+        self.room_keys = room_keys
+        self.rooms = []  # allowed room indexes per session ([None] without rooms)
+        for s in sessions:
+            if s['room'] is not None:
+                key = _room_key(s['room']['building'], s['room']['classroom'])
+                if key not in room_keys:
+                    room_keys.append(key)
+                self.rooms.append([room_keys.index(key)])
+            else:
+                self.rooms.append(list(range(len(problem['rooms']))) or [None])
+        # Static domain: placements inside the window and the faculty's
+        # availability, not already taken by existing classes
+        self.candidates = []
+        busy = problem['busy']
+        for i, s in enumerate(sessions):
+            allowed = problem['availability'].get(self.faculty[i], problem['window'])
+            taken = busy['section'].get(self.section[i], 0) | busy['faculty'].get(self.faculty[i], 0)
+            options = []
+            for day in problem['days']:
+                day_index = DAYS_OF_WEEK.index(day)
+                for first in range(SLOTS_PER_DAY - self.length + 1):
+                    mask = _span_mask(day_index, first, first + self.length)
+                    if allowed & mask == mask and not taken & mask:
+                        options.append((day_index, first, mask))
+            self.candidates.append(options)
+
+    def reset(self):
+        busy = self.problem['busy']
+        self.section_busy = {section: busy['section'].get(section, 0) for section in set(self.section)}
+        self.faculty_busy = {faculty: busy['faculty'].get(faculty, 0) for faculty in set(self.faculty)}
+        self.room_busy = [busy['room'].get(key, 0) for key in self.room_keys]
+        self.placed = {}         # session -> (day index, first slot, mask, room)
+        self.per_day = {}        # (section, subject, day index) -> sessions
+        self.day_load = {}       # (section, day index) -> sessions
+        self.by_section = {section: set() for section in self.section_busy}
+        self.by_faculty = {faculty: set() for faculty in self.faculty_busy}
+
+    def _free_room(self, i, mask):
+        for room in self.rooms[i]:
+            if room is None or not self.room_busy[room] & mask:
+                return room
+        return -1
+
+    def best(self, i, jitter):
+        """Best free placement for session i, or None"""
+        taken = self.section_busy[self.section[i]] | self.faculty_busy[self.faculty[i]]
+        best = best_key = None
+        for day_index, first, mask in self.candidates[i]:
+            if taken & mask:
+                continue
+            same_day = self.per_day.get(self.subject[i] + (day_index,), 0)
+            if same_day >= self.max_per_day[i]:
+                continue
+            room = self._free_room(i, mask)
+            if room == -1:
+                continue
+            # Spread a subject over the week, balance the section's days,
+            # then prefer earlier slots (jitter varies it between attempts)
+            key = (same_day, self.day_load.get((self.section[i], day_index), 0) + self.rng.random() * jitter, first)
+            if best_key is None or key < best_key:
+                best, best_key = (day_index, first, mask, room), key
+        return best
+
+    def place(self, i, placement):
+        day_index, _, mask, room = placement
+        self.section_busy[self.section[i]] |= mask
+        self.faculty_busy[self.faculty[i]] |= mask
+        if room is not None:
+            self.room_busy[room] |= mask
+        self.placed[i] = placement
+        self.per_day[self.subject[i] + (day_index,)] = self.per_day.get(self.subject[i] + (day_index,), 0) + 1
+        self.day_load[(self.section[i], day_index)] = self.day_load.get((self.section[i], day_index), 0) + 1
+        self.by_section[self.section[i]].add(i)
+        self.by_faculty[self.faculty[i]].add(i)
+
+    def unplace(self, i):
+        day_index, _, mask, room = self.placed.pop(i)
+        self.section_busy[self.section[i]] &= ~mask
+        self.faculty_busy[self.faculty[i]] &= ~mask
+        if room is not None:
+            self.room_busy[room] &= ~mask
+        self.per_day[self.subject[i] + (day_index,)] -= 1
+        self.day_load[(self.section[i], day_index)] -= 1
+        self.by_section[self.section[i]].discard(i)
+        self.by_faculty[self.faculty[i]].discard(i)
+
+    def repair(self, i, jitter):
+        """Place session i by moving one placed session out of its way"""
+        options = self.candidates[i][:]
+        self.rng.shuffle(options)
+        tried = 0
+        for day_index, first, mask in options:
+            if self.per_day.get(self.subject[i] + (day_index,), 0) >= self.max_per_day[i]:
+                continue
+            blockers = {j for j in self.by_section[self.section[i]] | self.by_faculty[self.faculty[i]] if self.placed[j][2] & mask}
+            if len(blockers) != 1:
+                continue
+            tried += 1
+            if tried > REPAIR_CANDIDATES:
+                return False
+            j = blockers.pop()
+            old = self.placed[j]
+            self.unplace(j)
+            room = self._free_room(i, mask)
+            if room != -1 and not (self.section_busy[self.section[i]] | self.faculty_busy[self.faculty[i]]) & mask:
+                self.place(i, (day_index, first, mask, room))
+                moved = self.best(j, jitter)
+                if moved is not None:
+                    self.place(j, moved)
+                    return True
+                self.unplace(i)
+            self.place(j, old)
+        return False
+
+    def run(self, order, jitter, deadline):
+        """Place sessions in order; returns the sessions left unplaced"""
+        self.reset()
+        failed = []
+        for i in order:
+            placement = self.best(i, jitter)
+            if placement is not None:
+                self.place(i, placement)
+            elif not self.repair(i, jitter):
+                failed.append(i)
+            if time.monotonic() > deadline:
+                placed = set(self.placed)
+                return failed + [j for j in order if j not in placed and j not in failed]
+        return failed
+
+def solve(problem, time_limit=TIMETABLE_GENERATOR_TIME_LIMIT_SECONDS, seed=0):
+    """Search for a complete timetable within time_limit seconds.
+
+    Sessions are placed most-constrained first (fewest possible slots,
+    busiest faculty) with slot occupancy as one bitset per section,
+    faculty member and room, so each check is an AND. A session with no
+    free slot may displace one placed session that can move elsewhere.
+    Sessions still unplaced go to the front of the order for the next
+    attempt (squeaky wheel), until everything fits or time runs out.
+    Returns {status: solved|partial, entries, unplaced, stats}.
+    """
+    started = time.monotonic()
+    deadline = started + time_limit
+    rng = random.Random(seed)
+    search = _Search(problem, rng)
+    load = {}
+    for faculty in search.faculty:
+        load[faculty] = load.get(faculty, 0) + 1
+    order = sorted(range(len(search.candidates)), key=lambda i: (len(search.candidates[i]) - load[search.faculty[i]], i))
+
+    best_failed = best_placed = None
+    attempts = 0
+    while True:
+        attempts += 1
+        failed = search.run(order, jitter=0.0 if attempts == 1 else 0.9, deadline=deadline)
+        if best_failed is None or len(failed) < len(best_failed):
+            best_failed, best_placed = failed, dict(search.placed)
+        if not failed or time.monotonic() > deadline:
+            break
+        failed_set = set(failed)
+        rest = [i for i in order if i not in failed_set]
+        rng.shuffle(failed)
+        order = failed + rest
+
+    sessions = problem['sessions']
+    rooms = problem['rooms']
+    room_lookup = {_room_key(room['building'], room['classroom']): room for room in rooms}
+    entries = []
+    for i, (day_index, first, _, room) in sorted(best_placed.items(), key=lambda item: (item[1][0], sessions[item[0]]['section'], item[1][1])):
+        session = sessions[i]
+        if room is not None:
+            room = room_lookup.get(search.room_keys[room]) or session['room']
+        start, end = SLOT_STARTS[first], SLOT_STARTS[first] + problem['length'] * SLOT_MINUTES
+        start_24, end_24 = f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}"
+        entries.append({
+            'day': DAYS_OF_WEEK[day_index],
+            'section': session['section'],
+            'start_time': start_24,
+            'start_time_12': convert_24_to_12(start_24),
+            'end_time': end_24,
+            'end_time_12': convert_24_to_12(end_24),
+            'class_name': session['class_name'],
+            'faculty_name': session['faculty_name'],
+            'subject': session['subject'],
+            'topic_covered': '',
+            'classroom': room['classroom'] if room else '',
+            'building': room['building'] if room else ''
+        })
+    unplaced = {}
+    for i in best_failed:
+        session = sessions[i]
+        row = unplaced.setdefault(session['subject_number'], {
+            'section': session['section'], 'subject': session['subject'], 'faculty_name': session['faculty_name'], 'sessions': 0
+        })
+        row['sessions'] += 1
+    return {
+        'status': 'partial' if best_failed else 'solved',
+        'entries': entries,
+        'unplaced': list(unplaced.values()),
+        'stats': {
+            'sessions': len(sessions),
+            'placed': len(best_placed),
+            'attempts': attempts,
+            'seconds': round(time.monotonic() - started, 3)
+        }
+    }
+
+def _run_job(path, problem, time_limit):
+    # Runs in the generator's worker process
+    result = solve(problem, time_limit)
+    atomic_write(path, json.dumps(dict(result, finished_at=time.time())).encode('utf-8'))
+
+class TimetableGenerator:
+    """Runs solve() jobs in a process pool; each job's state lives in
+    TIMETABLE_JOBS_DIR/<job id>.json so every web worker can report it"""
+
+    def __init__(self, directory=TIMETABLE_JOBS_DIR, workers=TIMETABLE_GENERATOR_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _expire(self):
+        cutoff = time.time() - TIMETABLE_JOB_RETENTION_HOURS * 3600
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.json') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass  # removed by another worker
+
+    def submit(self, problem, time_limit=None):
+        """Queue a solve; returns the job id"""
+        self._expire()
+        time_limit = min(float(time_limit or TIMETABLE_GENERATOR_TIME_LIMIT_SECONDS), TIMETABLE_GENERATOR_MAX_TIME_LIMIT_SECONDS)
+        job_id = secrets.token_hex(8)
+        path = self._path(job_id)
+        atomic_write(path, json.dumps({'status': 'running', 'started_at': time.time(), 'time_limit': time_limit}).encode('utf-8'))
+        executor = self._executor()
+        try:
+            future = executor.submit(_run_job, path, problem, time_limit)
+        except BrokenProcessPool:
+            # A worker died (OOM killer, ...): start a fresh pool once
+            with self._pool_lock:
+                if self._pool is executor:
+                    self._pool = None
+            future = self._executor().submit(_run_job, path, problem, time_limit)
+
+        def failed(done):
+            if not done.cancelled() and done.exception() is not None:
+                atomic_write(path, json.dumps({'status': 'failed', 'message': str(done.exception()), 'finished_at': time.time()}).encode('utf-8'))
+        future.add_done_callback(failed)
+        return job_id
+
+    def job(self, job_id):
+        """The job's state ({status, ...}), or None for an unknown id"""
+        if not _JOB_ID_RE.fullmatch(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+timetable_generator = TimetableGenerator()
+atexit.register(timetable_generator.close)
@@ -0,0 +1,136 @@
+"""
+Timetable import for EduPortal
+Reads timetable rows from CSV, XLSX or a JSON array and normalizes each
+one into the fields of a timetable entry, collecting per-row errors
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, time
+from config import DAYS_OF_WEEK
+from utils import convert_24_to_12, sanitize_input, time_to_minutes
+
+try:
+    import openpyxl
+except ImportError:  # optional: only needed for .xlsx uploads
+    openpyxl = None
+
+# Column headers (lowercased, spaces as underscores) -> entry field; the
+# headers of the timetable CSV export and the entry field names both work
+IMPORT_COLUMNS = {
+    'day': 'day',
+    'section': 'section',
+    'start_time': 'start_time',
+    'start': 'start_time',
+    'end_time': 'end_time',
+    'end': 'end_time',
+    'class_name': 'class_name',
+    'class': 'class_name',
+    'faculty_name': 'faculty_name',
+    'faculty': 'faculty_name',
+    'subject': 'subject',
+    'topic_covered': 'topic_covered',
+    'topic': 'topic_covered',
+    'classroom': 'classroom',
+    'room': 'classroom',
+    'building': 'building'
+}
+
+REQUIRED_FIELDS = ('day', 'section', 'start_time', 'end_time', 'class_name', 'faculty_name', 'subject')
+
+_DAYS = {day.lower(): day for day in DAYS_OF_WEEK}
+_DAYS.update({day[:3].lower(): day for day in DAYS_OF_WEEK})
+
+def _column(header):
+    return IMPORT_COLUMNS.get(str(header or '').strip().lower().replace(' ', '_'))
+
+def _rows_from_table(header, rows, first_row):
+    columns = [_column(name) for name in header]
+    if not any(columns):
+        raise ValueError('No known columns in the header row')
+    for number, values in enumerate(rows, start=first_row):
+        if not any(value not in (None, '') for value in values):
+            continue  # blank line
+        yield number, {column: value for column, value in zip(columns, values) if column}
+
+def read_import_rows(upload=None, payload=None):
+    """[(row number, {field: raw value})] from an uploaded .csv/.xlsx file
+    (row numbers as in the sheet, header = 1) or a JSON array of objects
+    (numbered from 1); ValueError if the input cannot be read"""
+    if upload is None:
+        rows = payload.get('rows') if isinstance(payload, dict) else payload
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('Expected a JSON array of timetable rows')
+        return [(number, {_column(key): value for key, value in row.items() if _column(key)}) for number, row in enumerate(rows, start=1)]
+
+    filename = (upload.filename or '').lower()
+    if filename.endswith('.xlsx'):
+        if openpyxl is None:
+            raise ValueError('XLSX import needs the openpyxl package')
+        try:
+            sheet = openpyxl.load_workbook(upload.stream, read_only=True, data_only=True).active
+            values = sheet.iter_rows(values_only=True)
+            header = next(values, None) or ()
+            return list(_rows_from_table(header, values, 2))
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f'Could not read the XLSX file: {e}') from e
+    if filename.endswith('.csv'):
+        try:
+            text = upload.stream.read().decode('utf-8-sig')
+        except UnicodeDecodeError as e:
+            raise ValueError('CSV file must be UTF-8') from e
+        reader = csv.reader(io.StringIO(text))
+        return list(_rows_from_table(next(reader, []), reader, 2))
+    if filename.endswith('.json'):
+        try:
+            return read_import_rows(payload=json.load(upload.stream))
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON: {e}') from e
+    raise ValueError('Upload a .csv, .xlsx or .json file')
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+def _minutes(value):
+    # Spreadsheet cells may hold times (or datetimes) rather than text
+    if isinstance(value, (time, datetime)):
+        return value.hour * 60 + value.minute
+    return time_to_minutes(_text(value))
+
+def normalize_timetable_row(row):
+    """Validate one imported row; returns (fields, start minute, end minute)
+    with the fields of a timetable entry, or raises ValueError listing
+    every problem with the row"""
+    problems = [f"Missing {field.replace('_', ' ')}" for field in REQUIRED_FIELDS if not _text(row.get(field))]
+    day = _DAYS.get(_text(row.get('day')).lower())
+    if _text(row.get('day')) and day is None:
+        problems.append(f"Invalid day '{_text(row.get('day'))}'")
+    start, end = _minutes(row.get('start_time')), _minutes(row.get('end_time'))
+    if _text(row.get('start_time')) and start is None:
+        problems.append(f"Invalid start time '{_text(row.get('start_time'))}'")
+    if _text(row.get('end_time')) and end is None:
+        problems.append(f"Invalid end time '{_text(row.get('end_time'))}'")
+    if start is not None and end is not None and end <= start:
+        problems.append('End time must be after start time')
+    if problems:
+        raise ValueError('; '.join(problems))
+
+    start_24, end_24 = f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}"
+    fields = {
+        "day": day,
+        "section": _text(row.get('section')).upper(),
+        "start_time": start_24,
+        "start_time_12": convert_24_to_12(start_24),
+        "end_time": end_24,
+        "end_time_12": convert_24_to_12(end_24),
+        "class_name": sanitize_input(_text(row.get('class_name'))),
+        "faculty_name": sanitize_input(_text(row.get('faculty_name'))),
+        "subject": sanitize_input(_text(row.get('subject'))),
+        "topic_covered": sanitize_input(_text(row.get('topic_covered'))),
+        "classroom": sanitize_input(_text(row.get('classroom'))),
+        "building": sanitize_input(_text(row.get('building')))
+    }
+    return fields, start, end
@@ -3,53 +3,240 @@ Utility functions for EduPortal
 Helper functions for data manipulation, validation, and formatting
 """
 
-import json
 import os
 import hashlib
+import pickle
 import secrets
+import shutil
 import string
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
-from config import DATA_DIR
+from config import (
+    DATA_DIR, JSON_CACHE_ENABLED,
+    BACKUP_GENERATIONS, BACKUP_EVERY_N_WRITES, BACKUP_INTERVAL_SECONDS
+)
+from locks import lock_manager
+from passwords import password_hasher
+import serializers
 
-def load_json(filepath):
-    """Load JSON data from file"""
-    if not os.path.exists(filepath):
+def _readonly(self, *args, **kwargs):
+    raise TypeError('Cached JSON data is read-only; call load_json() without readonly=True for a mutable copy')
+
+class FrozenDict(dict):
+    """Read-only dict handed out by load_json(readonly=True)"""
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+class FrozenList(list):
+    """Read-only list handed out by load_json(readonly=True)"""
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+def freeze(value):
+    """Recursively convert parsed JSON into FrozenDict/FrozenList"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+def thaw(value):
+    """Return a mutable deep copy of (possibly frozen) JSON data"""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
+
+# In-process cache of parsed JSON files, keyed on path and validated against
+# the file's (mtime_ns, size, inode) so edits by other processes are noticed.
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+_json_cache_stats = {'hits': 0, 'misses': 0}
+
+def _file_signature(stat_result):
+    return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+def file_signature(filepath):
+    """Return (mtime_ns, size, inode) for filepath, or None if it is missing"""
+    try:
+        return _file_signature(os.stat(filepath))
+    except OSError:
+        return None
+
+def _read_json_file(filepath):
+    """Parse a data file (any serializer format) and return (data, signature of the file actually read)"""
+    with open(filepath, 'rb') as f:
+        payload = f.read()
+        signature = _file_signature(os.fstat(f.fileno()))
+    return serializers.decode(payload), signature
+
+def load_json(filepath, readonly=False):
+    """Load JSON data from file (cached while the file is unchanged).
+
+    By default a private copy is returned that the caller may mutate freely.
+    With readonly=True the shared cached object is returned as FrozenDict /
+    FrozenList, which avoids the copy but raises TypeError on mutation.
+    """
+    try:
+        signature = _file_signature(os.stat(filepath))
+    except OSError:
+        invalidate_json_cache(filepath)
         return {}
+
+    if JSON_CACHE_ENABLED:
+        with _json_cache_lock:
+            entry = _json_cache.get(filepath)
+            if entry and entry['signature'] == signature:
+                _json_cache_stats['hits'] += 1
+                if not readonly:
+                    return pickle.loads(entry['blob'])
+                if entry['frozen'] is None:
+                    entry['frozen'] = freeze(pickle.loads(entry['blob']))
+                return entry['frozen']
+
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
+        with lock_manager.shared(filepath):
+            data, signature = _read_json_file(filepath)
+    except (ValueError, IOError):
         return {}
 
-def save_json(filepath, data):
-    """Save data to JSON file with backup"""
+    if not JSON_CACHE_ENABLED:
+        return data
+
+    entry = {
+        'signature': signature,
+        'blob': pickle.dumps(data, pickle.HIGHEST_PROTOCOL),
+        'frozen': freeze(data) if readonly else None
+    }
+    with _json_cache_lock:
+        _json_cache_stats['misses'] += 1
+        _json_cache[filepath] = entry
+    return entry['frozen'] if readonly else data
+
+def invalidate_json_cache(filepath=None):
+    """Drop one cached file (or the whole cache when filepath is None)"""
+    with _json_cache_lock:
+        if filepath is None:
+            _json_cache.clear()
+        else:
+            _json_cache.pop(filepath, None)
+
+def get_json_cache_stats():
+    """Return hit/miss counters for the load_json cache"""
+    with _json_cache_lock:
+        hits = _json_cache_stats['hits']
+        misses = _json_cache_stats['misses']
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'entries': len(_json_cache)
+        }
+
+# Per-file backup bookkeeping: writes since the last backup and its timestamp
+_backup_state = {}
+_backup_state_lock = threading.Lock()
+
+def _fsync_directory(dirpath):
+    """Persist a rename in dirpath (no-op where directories can't be opened)"""
     try:
-        # Create backup if file exists
-        if os.path.exists(filepath):
-            backup_path = f"{filepath}.backup"
-            with open(filepath, 'r', encoding='utf-8') as f:
-                backup_data = f.read()
-            with open(backup_path, 'w', encoding='utf-8') as f:
-                f.write(backup_data)
-        
-        # Save new data
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        return True
-    except IOError:
+        fd = os.open(dirpath, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write(filepath, payload):
+    """Write bytes to filepath via temp file + fsync + os.replace"""
+    dirpath = os.path.dirname(filepath) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filepath)}.", suffix='.tmp', dir=dirpath)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(dirpath)
+
+def _backup_due(filepath):
+    """Decide whether this write should snapshot the current file first"""
+    now = time.time()
+    with _backup_state_lock:
+        state = _backup_state.get(filepath)
+        if state is None:
+            try:
+                last_backup = os.stat(f"{filepath}.backup").st_mtime
+            except OSError:
+                last_backup = 0
+            state = _backup_state[filepath] = {'writes': 0, 'last_backup': last_backup}
+        state['writes'] += 1
+        due_by_count = BACKUP_EVERY_N_WRITES > 0 and state['writes'] >= BACKUP_EVERY_N_WRITES
+        due_by_time = BACKUP_INTERVAL_SECONDS > 0 and now - state['last_backup'] >= BACKUP_INTERVAL_SECONDS
+        if due_by_count or due_by_time:
+            state['writes'] = 0
+            state['last_backup'] = now
+            return True
         return False
 
+def _rotate_backups(filepath):
+    """Shift <file>.backup -> .backup.1 -> ... and link the current file in as <file>.backup"""
+    backup_path = f"{filepath}.backup"
+    for generation in range(BACKUP_GENERATIONS - 1, 0, -1):
+        older = backup_path if generation == 1 else f"{backup_path}.{generation - 1}"
+        if os.path.exists(older):
+            os.replace(older, f"{backup_path}.{generation}")
+    try:
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
+        # The live file is only ever replaced, never rewritten in place, so a
+        # hard link keeps the old bytes alive without copying them.
+        os.link(filepath, backup_path)
+    except OSError:
+        shutil.copy2(filepath, backup_path)
+
+def save_json(filepath, data):
+    """Atomically save data in the DATA_SERIALIZER format, taking periodic backup generations.
+
+    Holds the file's exclusive lock; callers doing load-modify-save should
+    wrap the whole sequence in lock_manager.exclusive(filepath) themselves.
+    """
+    payload = serializers.encode(data)
+    with lock_manager.exclusive(filepath):
+        try:
+            if BACKUP_GENERATIONS > 0 and os.path.exists(filepath) and _backup_due(filepath):
+                _rotate_backups(filepath)
+            atomic_write(filepath, payload)
+            return True
+        except (IOError, OSError):
+            return False
+        finally:
+            invalidate_json_cache(filepath)
+
 def hash_password(password):
-    """Hash password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password with salted PBKDF2 (see passwords.PasswordHasher)"""
+    return password_hasher.hash(password)
 
 def verify_password(password, hashed):
-    """Verify password against hash"""
-    return hash_password(password) == hashed
+    """Verify password against a PBKDF2 or legacy SHA256 hash"""
+    return password_hasher.verify(password, hashed)
 
 def encrypt_password(password):
-    """Encrypt password using SHA256 (same as hash_password for consistency)"""
-    return hash_password(password)
+    """Unsalted SHA256 digest kept alongside the hash for admin viewing"""
+    return hashlib.sha256(password.encode()).hexdigest()
 
 def decrypt_password(encrypted_password):
     """Passwords are hashed, not encrypted - this returns the hash as-is"""
@@ -117,6 +304,19 @@ def convert_12_to_24(time_12):
     except:
         return time_12
 
+def time_to_minutes(value):
+    """Minutes since midnight for 'HH:MM' or 'H:MM AM/PM'; None if unparsable"""
+    try:
+        text = value.strip()
+        if text[-2:].upper() in ('AM', 'PM'):
+            text = convert_12_to_24(text)
+        hour, minute = map(int, text.split(':'))
+    except (AttributeError, ValueError):
+        return None
+    if 0 <= hour < 24 and 0 <= minute < 60:
+        return hour * 60 + minute
+    return None
+
 def validate_email(email):
     """Validate email format"""
     import re
@@ -139,53 +339,6 @@ def sanitize_input(text):
     text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
     return text
 
-def check_time_clash(day, start_time, end_time, timetable_data, exclude_id=None, section=None):
-    """Check if time slot clashes with existing entries (for same section)"""
-    if day not in timetable_data:
-        return None
-    
-    start_24 = convert_12_to_24(start_time) if ':' in start_time and ('AM' in start_time or 'PM' in start_time) else start_time
-    end_24 = convert_12_to_24(end_time) if ':' in end_time and ('AM' in end_time or 'PM' in end_time) else end_time
-    
-    start_hour, start_min = map(int, start_24.split(':'))
-    end_hour, end_min = map(int, end_24.split(':'))
-    
-    start_total = start_hour * 60 + start_min
-    end_total = end_hour * 60 + end_min
-    
-    for entry in timetable_data[day]:
-        if exclude_id and entry.get('id') == exclude_id:
-            continue
-        
-        # Check section match if section is provided
-        if section and entry.get('section', '').upper() != section.upper():
-            continue
-        
-        entry_start = entry.get('start_time', '')
-        entry_end = entry.get('end_time', '')
-        
-        entry_start_24 = convert_12_to_24(entry_start) if ':' in entry_start and ('AM' in entry_start or 'PM' in entry_start) else entry_start
-        entry_end_24 = convert_12_to_24(entry_end) if ':' in entry_end and ('AM' in entry_end or 'PM' in entry_end) else entry_end
-        
-        try:
-            e_start_hour, e_start_min = map(int, entry_start_24.split(':'))
-            e_end_hour, e_end_min = map(int, entry_end_24.split(':'))
-            
-            e_start_total = e_start_hour * 60 + e_start_min
-            e_end_total = e_end_hour * 60 + e_end_min
-            
-            # Check overlap: new_start < existing_end AND new_end > existing_start
-            if start_total < e_end_total and end_total > e_start_total:
-                return {
-                    'clash': True,
-                    'conflicting_class': entry.get('class_name', 'Unknown'),
-                    'conflicting_time': f"{entry.get('start_time_12', entry_start)} - {entry.get('end_time_12', entry_end)}"
-                }
-        except:
-            continue
-    
-    return None
-
 def get_current_timestamp():
     """Get current timestamp in ISO format"""
     return datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -197,27 +350,3 @@ def format_datetime(dt_string):
         return dt.strftime("%Y-%m-%d %H:%M:%S")
     except:
         return dt_string
-
-def is_expired_timetable_entry(entry):
-    """Check if timetable entry is expired (end time < current time)"""
-    try:
-        day = entry.get('day', '')
-        end_time = entry.get('end_time', '')
-        
-        # Convert to 24-hour if needed
-        end_24 = convert_12_to_24(end_time) if ':' in end_time and ('AM' in end_time or 'PM' in end_time) else end_time
-        end_hour, end_min = map(int, end_24.split(':'))
-        
-        now = datetime.now()
-        current_day = now.strftime("%A")
-        
-        # Only check if it's the same day
-        if day == current_day:
-            current_total = now.hour * 60 + now.minute
-            end_total = end_hour * 60 + end_min
-            return end_total < current_total
-        
-        return False
-    except:
-        return False
-